@@ -0,0 +1,118 @@
+"""
+Bounded cache for per-student QA agents.
+
+Each (student_id, skill_prompt) pair gets its own RetrievalQA chain. The cache keeps
+at most `maxsize` agents, expires them after `ttl` seconds, evicts the least recently
+used one when full and can be invalidated by student or by prompt hash.
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def prompt_hash(skill_prompt):
+    return hashlib.md5((skill_prompt or "").encode()).hexdigest()
+
+
+class AgentCache:
+    def __init__(self, maxsize=100, ttl=3600):
+        """
+        Args:
+            maxsize (int): Maximum number of cached agents
+            ttl (float): Seconds an agent stays valid; 0 or None disables expiry
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # (student_id, prompt_hash) -> (agent, created_at)
+        self._lock = threading.Lock()
+        self._build_locks = {}
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def _expired(self, created_at):
+        return bool(self.ttl) and time.time() - created_at > self.ttl
+
+    def _lookup(self, key):
+        """Return the cached agent or None. Must be called with self._lock held."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        agent, created_at = entry
+        if self._expired(created_at):
+            del self._entries[key]
+            self._stats["expirations"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return agent
+
+    def get_or_create(self, student_id, skill_prompt, factory):
+        """
+        Return the agent for (student_id, skill_prompt), building it with factory() on a miss
+        Args:
+            student_id (str): Student the agent belongs to
+            skill_prompt (str): Skill prompt the agent was built with
+            factory (callable): Builds a new agent, called without arguments
+        Returns:
+            The cached or newly built agent
+        """
+        key = (student_id, prompt_hash(skill_prompt))
+        with self._lock:
+            agent = self._lookup(key)
+            if agent is not None:
+                self._stats["hits"] += 1
+                return agent
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+
+        # Concurrent requests for the same key wait for a single build
+        with build_lock:
+            with self._lock:
+                agent = self._lookup(key)
+                if agent is not None:
+                    self._stats["hits"] += 1
+                    return agent
+                self._stats["misses"] += 1
+
+            try:
+                agent = factory()
+                with self._lock:
+                    self._entries[key] = (agent, time.time())
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.maxsize:
+                        evicted_key, _ = self._entries.popitem(last=False)
+                        self._stats["evictions"] += 1
+                        logger.info(f"Evicted QA agent for student {evicted_key[0]}")
+            finally:
+                # Also after a failed build, so failures don't leave a lock per key behind
+                with self._lock:
+                    self._build_locks.pop(key, None)
+            return agent
+
+    def invalidate(self, student_id=None, skill_prompt_hash=None):
+        """
+        Drop cached agents matching the given student and/or prompt hash
+        Args:
+            student_id (str, optional): Only drop agents of this student
+            skill_prompt_hash (str, optional): Only drop agents built with this prompt hash
+        Returns:
+            int: Number of dropped agents
+        """
+        with self._lock:
+            keys = [
+                key for key in self._entries
+                if (student_id is None or key[0] == student_id)
+                and (skill_prompt_hash is None or key[1] == skill_prompt_hash)
+            ]
+            for key in keys:
+                del self._entries[key]
+            self._stats["invalidations"] += len(keys)
+        return len(keys)
+
+    def clear(self):
+        return self.invalidate()
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "size": len(self._entries), "maxsize": self.maxsize, "ttl": self.ttl}
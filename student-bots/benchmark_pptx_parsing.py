@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark PPTX loaders on a folder of slide decks (e.g. the kinhtevimo lectures).
+
+Compares the python-pptx loader of pptx_parsing.py (with and without the Unstructured
+fallback for slides without text) against the previous ingest path, UnstructuredPowerPointLoader,
+and optionally against converting to PDF with pptx-to-pdf.py and parsing it with pdf_parsing.py.
+Reports wall time, documents and extracted characters per loader; loaders whose
+dependencies are missing are reported as unavailable.
+
+Usage:
+    python benchmark_pptx_parsing.py <folder> [--pdf] [--repeat N]
+"""
+import argparse
+import glob
+import importlib.util
+import os
+import tempfile
+import time
+
+from pptx_parsing import load_pptx
+
+
+def load_unstructured(file_path):
+    from langchain_community.document_loaders import UnstructuredPowerPointLoader
+    return UnstructuredPowerPointLoader(file_path).load()
+
+
+def load_via_pdf(file_path):
+    from pdf_parsing import load_pdf
+
+    spec = importlib.util.spec_from_file_location(
+        "pptx_to_pdf", os.path.join(os.path.dirname(os.path.abspath(__file__)), "pptx-to-pdf.py"))
+    pptx_to_pdf = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(pptx_to_pdf)
+    with tempfile.TemporaryDirectory() as output_dir:
+        output_file = os.path.join(output_dir, os.path.splitext(os.path.basename(file_path))[0] + ".pdf")
+        if not pptx_to_pdf.convert_with_libreoffice(file_path, output_file, timeout=600):
+            raise RuntimeError("PDF conversion failed")
+        return load_pdf(output_file)
+
+
+LOADERS = {
+    "python-pptx": lambda file_path: load_pptx(file_path, "local"),
+    "python-pptx+fallback": lambda file_path: load_pptx(file_path, "auto"),
+    "unstructured": load_unstructured,
+}
+
+
+def run_loader(loader, files, repeat):
+    """
+    Returns:
+        dict: seconds, docs, chars, failed and the first error, over every file (timing is the best of `repeat`)
+    """
+    stats = {"seconds": 0.0, "docs": 0, "chars": 0, "failed": 0, "error": None}
+    for file_path in files:
+        best = None
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            try:
+                docs = loader(file_path)
+            except Exception as e:
+                stats["failed"] += 1
+                stats["error"] = stats["error"] or f"{type(e).__name__}: {e}"
+                break
+            elapsed = time.perf_counter() - start_time
+            best = elapsed if best is None else min(best, elapsed)
+        else:
+            stats["seconds"] += best
+            stats["docs"] += len(docs)
+            stats["chars"] += sum(len(doc.page_content) for doc in docs)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PPTX loaders on a folder of slide decks.")
+    parser.add_argument("folder", help="Folder with .pptx files")
+    parser.add_argument("--pdf", action="store_true", help="Also time PPTX -> PDF (LibreOffice) -> pdf_parsing")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per file; the fastest is kept")
+    args = parser.parse_args()
+
+    files = sorted(glob.glob(os.path.join(args.folder, "**", "*.pptx"), recursive=True))
+    if not files:
+        print(f"No PPTX files found in '{args.folder}'.")
+        return
+    loaders = dict(LOADERS)
+    if args.pdf:
+        loaders["pdf (libreoffice)"] = load_via_pdf
+    print(f"Benchmarking {len(loaders)} loaders on {len(files)} decks...")
+
+    results = {}
+    for name, loader in loaders.items():
+        # The PDF path is far too slow to repeat
+        results[name] = run_loader(loader, files, 1 if name.startswith("pdf") else args.repeat)
+        print(f"  {name}: done")
+
+    baseline = results["unstructured"] if not results["unstructured"]["failed"] else None
+    print(f"\n{'loader':<22} {'seconds':>9} {'s/deck':>8} {'docs':>6} {'chars':>9} {'vs unstr.':>10} {'failed':>7}")
+    for name, stats in results.items():
+        decks = len(files) - stats["failed"]
+        if decks == 0:
+            print(f"{name:<22} unavailable: {stats['error']}")
+            continue
+        coverage = f"{stats['chars'] / baseline['chars'] * 100:.0f}%" if baseline and baseline["chars"] else "-"
+        print(f"{name:<22} {stats['seconds']:>9.2f} {stats['seconds'] / decks:>8.3f} {stats['docs']:>6} "
+              f"{stats['chars']:>9} {coverage:>10} {stats['failed']:>7}")
+        if stats["failed"]:
+            print(f"{'':<22} first error: {stats['error']}")
+    if baseline and not results["python-pptx"]["failed"] and results["python-pptx"]["seconds"] > 0:
+        print(f"\npython-pptx is {baseline['seconds'] / results['python-pptx']['seconds']:.1f}x faster than Unstructured")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Section- and slide-aware chunking sized in embedding-model tokens.
+
+Every input document is one structural unit from the parsers (a PDF page, an LLMSherpa
+section, a slide). A unit that fits in CHUNK_MAX_TOKENS stays whole; a longer unit is split
+on paragraph, line, sentence and word boundaries into token-sized parts with a small
+overlap. Undersized chunks are then merged into their neighbours from the same file while
+the result still fits, so short slides and headings don't take a vector each. Every chunk
+records its lineage: the pages/slides and section it came from, which part of a split unit
+it is, and how many units were merged into it.
+"""
+import functools
+import logging
+import os
+import re
+
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "384"))
+CHUNK_MIN_TOKENS = int(os.getenv("CHUNK_MIN_TOKENS", "64"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+# tokens: this module's chunker; characters: the previous 2048/128-character recursive splitter
+CHUNKER = os.getenv("CHUNKER", "tokens")
+
+# Hugging Face tokenizers of the embedding models served through other providers
+TOKENIZER_NAMES = {
+    "nomic-embed-text": "nomic-ai/nomic-embed-text-v1.5",
+}
+SEPARATORS = ["\n\n", "\n", ". ", " "]
+# Fallback when no tokenizer can be loaded: words cut into word-piece sized runs, plus punctuation
+APPROXIMATE_TOKEN_PATTERN = re.compile(r"\w{1,5}|[^\w\s]")
+
+
+def approximate_token_count(text):
+    return len(APPROXIMATE_TOKEN_PATTERN.findall(text))
+
+
+@functools.lru_cache(maxsize=None)
+def get_token_counter(model_name):
+    """
+    Token counting function of an embedding model, loaded once per process
+    Args:
+        model_name (str): Embedding model name; CHUNK_TOKENIZER overrides the tokenizer used
+    Returns:
+        callable: text -> number of tokens (approximate if the tokenizer can't be loaded)
+    """
+    tokenizer_name = os.getenv("CHUNK_TOKENIZER") or TOKENIZER_NAMES.get(model_name, model_name)
+    try:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+    except Exception as e:
+        logger.warning(f"Tokenizer {tokenizer_name} unavailable ({str(e)}), using approximate token counts")
+        return approximate_token_count
+    return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+
+
+def _split_text(text, max_tokens, count_tokens, separators=SEPARATORS):
+    """
+    Split text into pieces of at most max_tokens, on the coarsest separator that works
+    Returns:
+        list: (piece, separator that followed it in the text)
+    """
+    if count_tokens(text) <= max_tokens:
+        return [(text, "")]
+    if not separators:
+        # No separator left: cut by characters, proportionally to the token count
+        size = max(1, len(text) * max_tokens // count_tokens(text))
+        return [(text[start:start + size], "") for start in range(0, len(text), size)]
+
+    separator, rest = separators[0], separators[1:]
+    pieces = []
+    parts = text.split(separator)
+    for index, part in enumerate(parts):
+        joiner = separator if index < len(parts) - 1 else ""
+        if count_tokens(part) > max_tokens:
+            sub_pieces = _split_text(part, max_tokens, count_tokens, rest)
+            sub_pieces[-1] = (sub_pieces[-1][0], sub_pieces[-1][1] + joiner)
+            pieces.extend(sub_pieces)
+        elif part.strip():
+            pieces.append((part, joiner))
+    return pieces
+
+
+def split_unit(text, max_tokens, overlap_tokens, count_tokens):
+    """
+    Pack a unit's text into parts of at most max_tokens, repeating up to overlap_tokens of
+    trailing pieces at the start of the next part.
+    """
+    # Separators are counted with their piece, so the joined part stays within max_tokens
+    pieces = [(piece, separator, count_tokens(piece + separator))
+              for piece, separator in _split_text(text, max_tokens, count_tokens)]
+
+    parts, current, current_tokens = [], [], 0
+    for piece, separator, tokens in pieces:
+        if current and current_tokens + tokens > max_tokens:
+            parts.append("".join(p + s for p, s, _ in current).strip())
+            # Carry the tail of the finished part over as overlap
+            overlap, overlap_size = [], 0
+            for previous in reversed(current):
+                if overlap_size + previous[2] > overlap_tokens:
+                    break
+                overlap.insert(0, previous)
+                overlap_size += previous[2]
+            current, current_tokens = overlap, overlap_size
+        current.append((piece, separator, tokens))
+        current_tokens += tokens
+    if current:
+        parts.append("".join(p + s for p, s, _ in current).strip())
+    return [part for part in parts if part]
+
+
+def _unit_lineage(metadata):
+    """Pages/slides and section a parsed document came from."""
+    lineage = {}
+    if metadata.get('slide_number') is not None:
+        lineage['slides'] = [metadata['slide_number']]
+    elif metadata.get('page') is not None:
+        lineage['pages'] = [metadata['page']]
+    elif metadata.get('page_range'):
+        lineage['pages'] = [metadata['page_range']]
+    section = metadata.get('section_title') or metadata.get('title')
+    if section:
+        lineage['sections'] = [section]
+    return lineage
+
+
+def _merge(first, second):
+    metadata = dict(first.metadata)
+    for key in ('slides', 'pages', 'sections'):
+        values = first.metadata.get(key, []) + [v for v in second.metadata.get(key, []) if v not in first.metadata.get(key, [])]
+        if values:
+            metadata[key] = values
+    metadata['merged_units'] = first.metadata['merged_units'] + second.metadata['merged_units']
+    metadata['token_count'] = first.metadata['token_count'] + second.metadata['token_count']
+    return Document(page_content=first.page_content + "\n\n" + second.page_content, metadata=metadata)
+
+
+def merge_small_chunks(chunks, min_tokens, max_tokens):
+    """Merge chunks under min_tokens into the following (or else preceding) chunk of the same source."""
+    merged = []
+    for chunk in chunks:
+        previous = merged[-1] if merged else None
+        if (previous is not None
+                and previous.metadata.get('source') == chunk.metadata.get('source')
+                and (previous.metadata['token_count'] < min_tokens or chunk.metadata['token_count'] < min_tokens)
+                and previous.metadata['token_count'] + chunk.metadata['token_count'] <= max_tokens):
+            merged[-1] = _merge(previous, chunk)
+        else:
+            merged.append(chunk)
+    return merged
+
+
+def split_characters(docs, chunk_size=2048, chunk_overlap=128):
+    """The character-count splitter both ingestion paths used before this module"""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap).split_documents(docs)
+
+
+def chunk_documents(docs, model_name=None, max_tokens=None, min_tokens=None, overlap_tokens=None, count_tokens=None,
+                    chunker=None):
+    """
+    Chunk parsed documents along their section/slide/page boundaries
+    Args:
+        docs (list): Documents from pdf_parsing or pptx_parsing, one per structural unit, in order
+        model_name (str, optional): Embedding model whose tokenizer sizes the chunks
+        max_tokens (int, optional): Largest chunk (CHUNK_MAX_TOKENS)
+        min_tokens (int, optional): Chunks below this are merged with a neighbour (CHUNK_MIN_TOKENS)
+        overlap_tokens (int, optional): Overlap between the parts of a split unit (CHUNK_OVERLAP_TOKENS)
+        count_tokens (callable, optional): text -> tokens; overrides model_name
+        chunker (str, optional): tokens or characters; follows CHUNKER if None
+    Returns:
+        list: Chunk documents with the unit's metadata plus lineage (pages/slides, sections,
+            part, parts, merged_units) and token_count
+    """
+    if (chunker or CHUNKER) == "characters":
+        return split_characters(docs)
+    max_tokens = max_tokens or CHUNK_MAX_TOKENS
+    min_tokens = CHUNK_MIN_TOKENS if min_tokens is None else min_tokens
+    overlap_tokens = CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+    count_tokens = count_tokens or (get_token_counter(model_name) if model_name else approximate_token_count)
+
+    chunks = []
+    for doc in docs:
+        text = doc.page_content.strip()
+        if not text:
+            continue
+        parts = split_unit(text, max_tokens, overlap_tokens, count_tokens)
+        for index, part in enumerate(parts):
+            chunks.append(Document(page_content=part, metadata={
+                **doc.metadata,
+                **_unit_lineage(doc.metadata),
+                'part': index + 1,
+                'parts': len(parts),
+                'merged_units': 1,
+                'token_count': count_tokens(part),
+            }))
+    return merge_small_chunks(chunks, min_tokens, max_tokens)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Offline report of the prompt tokens each exam question costs with the character splitter
+versus chunking.py.
+
+The lecture files are parsed once (pdf_parsing with the local parser, pptx_parsing) and
+chunked both ways. For every question of an exam file the top-k chunks are picked with BM25,
+an offline stand-in for the vector retriever and reranker, and the context the "stuff"
+chain would put into the prompt is counted in tokens. The prompt template is the same for
+both chunkers, so only context and question tokens are reported.
+
+Usage:
+    python chunking_report.py <lecture folder> [--exam exam/exam_ktqt.json] [--k 5] [--output report.csv]
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import re
+from collections import Counter
+
+from chunking import approximate_token_count, chunk_documents, get_token_counter, split_characters
+from pdf_parsing import load_pdf
+from pptx_parsing import load_pptx
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def get_prompt_token_counter():
+    """Tokens as the chat model counts them (gpt-4o's o200k_base), approximate without tiktoken"""
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("o200k_base")
+        return lambda text: len(encoding.encode(text))
+    except ImportError:
+        print("tiktoken not installed, prompt tokens are approximate")
+        return approximate_token_count
+
+
+class BM25:
+    def __init__(self, texts, k1=1.5, b=0.75):
+        self.k1, self.b = k1, b
+        self.docs = [Counter(WORD_PATTERN.findall(text.lower())) for text in texts]
+        self.lengths = [sum(doc.values()) for doc in self.docs]
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0
+        document_frequency = Counter(term for doc in self.docs for term in doc)
+        n = len(self.docs)
+        self.idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in document_frequency.items()}
+
+    def top(self, query, k):
+        terms = set(WORD_PATTERN.findall(query.lower()))
+        scores = []
+        for index, (doc, length) in enumerate(zip(self.docs, self.lengths)):
+            score = 0.0
+            for term in terms:
+                frequency = doc.get(term)
+                if frequency:
+                    score += self.idf[term] * frequency * (self.k1 + 1) / (
+                        frequency + self.k1 * (1 - self.b + self.b * length / self.average_length))
+            scores.append((score, index))
+        return [index for score, index in sorted(scores, reverse=True)[:k] if score > 0]
+
+
+def load_units(folder):
+    docs = []
+    for file_path in sorted(glob.glob(os.path.join(folder, "**", "*"), recursive=True)):
+        extension = os.path.splitext(file_path)[1].lower()
+        try:
+            if extension == ".pdf":
+                docs.extend(load_pdf(file_path, parser="local"))
+            elif extension == ".pptx":
+                docs.extend(load_pptx(file_path, parser="local"))
+        except Exception as e:
+            print(f"Skipping {file_path}: {e}")
+    return docs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt-token savings of chunking.py per exam question.")
+    parser.add_argument("folder", help="Folder with the lecture PDFs/PPTX files")
+    parser.add_argument("--exam", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "exam", "exam_ktqt.json"),
+                        help="Exam questions file")
+    parser.add_argument("--k", type=int, default=5, help="Chunks stuffed into the prompt per question")
+    parser.add_argument("--model", default="sentence-transformers/all-mpnet-base-v2",
+                        help="Embedding model whose tokenizer sizes the new chunks")
+    parser.add_argument("--output", help="Save the per-question table as CSV")
+    args = parser.parse_args()
+
+    units = load_units(args.folder)
+    if not units:
+        print(f"No parsable PDF/PPTX files found in '{args.folder}'.")
+        return
+    with open(args.exam, "r") as f:
+        questions = json.load(f).get("questions", [])
+
+    count_prompt_tokens = get_prompt_token_counter()
+    # The token path explicitly, whatever CHUNKER is set to
+    chunkings = {"characters": split_characters(units), "tokens": chunk_documents(units, args.model, chunker="tokens")}
+    count_embedding_tokens = get_token_counter(args.model)
+    print(f"{len(units)} parsed units from {args.folder}")
+    for name, chunks in chunkings.items():
+        if not chunks:
+            print(f"  {name:<10} {0:>5} chunks")
+            continue
+        sizes = sorted(count_embedding_tokens(chunk.page_content) for chunk in chunks)
+        over = sum(1 for size in sizes if size > 512)
+        print(f"  {name:<10} {len(chunks):>5} chunks, embedding tokens min {sizes[0]}, "
+              f"median {sizes[len(sizes) // 2]}, max {sizes[-1]}, {over} over 512 (truncated by the embedder)")
+
+    indexes = {name: (BM25([chunk.page_content for chunk in chunks]), chunks) for name, chunks in chunkings.items()}
+    rows = []
+    for i, question in enumerate(questions):
+        text = question.get("question", "")
+        row = {"position": question.get("metadata", {}).get("question_position", i + 1)}
+        for name, (index, chunks) in indexes.items():
+            context = "\n\n".join(chunks[j].page_content for j in index.top(text, args.k))
+            row[name] = count_prompt_tokens(context) + count_prompt_tokens(text)
+        row["saved"] = row["characters"] - row["tokens"]
+        row["saved_percent"] = round(row["saved"] / row["characters"] * 100, 1) if row["characters"] else 0.0
+        rows.append(row)
+
+    print(f"\n{'question':>8} {'characters':>11} {'tokens':>8} {'saved':>7} {'saved%':>7}")
+    for row in rows:
+        print(f"{row['position']:>8} {row['characters']:>11} {row['tokens']:>8} {row['saved']:>7} {row['saved_percent']:>6.1f}%")
+    total_before = sum(row["characters"] for row in rows)
+    total_after = sum(row["tokens"] for row in rows)
+    if total_before:
+        print(f"\nPrompt tokens over {len(rows)} questions (top {args.k} chunks): {total_before} -> {total_after} "
+              f"({(total_before - total_after) / total_before * 100:.1f}% saved, "
+              f"{(total_before - total_after) / len(rows):.0f} tokens per question)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write("position,characters,tokens,saved,saved_percent\n")
+            for row in rows:
+                f.write(f"{row['position']},{row['characters']},{row['tokens']},{row['saved']},{row['saved_percent']}\n")
+        print(f"Saved report to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
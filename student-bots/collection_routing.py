@@ -0,0 +1,209 @@
+"""
+Routing of per-student and per-lecture documents inside one Qdrant collection.
+
+Uploads used to get a collection each (student_bots_{file}_{lecture}_{student}), which the
+QA agents never queried. Now every chunk embedded with a model goes into that model's single
+collection and carries file_id, lecture_id and student_id in its metadata. Keyword payload
+indexes on those fields turn a student's slice of the collection into an indexed filter at
+query time instead of a scan, without thousands of tiny collections each holding its own
+segments and HNSW graph. Chunks ingested without a student_id are shared course material
+that every student retrieves.
+
+Usage (copy the legacy per-upload collections into the shared one):
+    python collection_routing.py --target student-bots-pdf-20250112 [--drop]
+"""
+import argparse
+import logging
+import os
+import threading
+from collections import defaultdict
+
+from qdrant_client.http import models as rest
+
+from ingest_manifest import point_ids
+
+logger = logging.getLogger(__name__)
+
+# Metadata fields a query can filter on, stored under the langchain_qdrant 'metadata' payload key
+PAYLOAD_INDEX_FIELDS = ("student_id", "lecture_id", "file_id")
+LEGACY_COLLECTION_PREFIX = "student_bots_"
+# student_id of shared course material
+SHARED_STUDENT_ID = ""
+
+_ensured = set()
+_ensure_lock = threading.Lock()
+
+
+def payload_key(field):
+    return f"metadata.{field}"
+
+
+def ensure_collection(client, collection_name, dimension):
+    """
+    Create the collection if it is missing and the keyword payload indexes it lacks
+    Checked once per process and collection; existing collections get their indexes
+    on first use, without re-ingesting.
+    """
+    if collection_name in _ensured:
+        return
+    with _ensure_lock:
+        if collection_name in _ensured:
+            return
+        collections = client.get_collections().collections
+        if not any(collection.name == collection_name for collection in collections):
+            client.create_collection(
+                collection_name=collection_name,
+                vectors_config=rest.VectorParams(size=dimension, distance=rest.Distance.COSINE),
+            )
+        indexed = client.get_collection(collection_name).payload_schema or {}
+        for field in PAYLOAD_INDEX_FIELDS:
+            if payload_key(field) not in indexed:
+                client.create_payload_index(
+                    collection_name=collection_name,
+                    field_name=payload_key(field),
+                    field_schema=rest.PayloadSchemaType.KEYWORD,
+                )
+                logger.info(f"Created payload index {payload_key(field)} on {collection_name}")
+        _ensured.add(collection_name)
+
+
+def routing_metadata(metadata, content_hash):
+    """
+    Metadata added to every chunk of an uploaded file
+    Args:
+        metadata (dict): Upload metadata with id, filename, lecture_id and student_id
+        content_hash (str): Hash of the file content
+    Returns:
+        dict: Keyword fields as strings, since keyword indexes only match string values
+    """
+    return {
+        'file_id': str(metadata.get('id') or ''),
+        'lecture_id': str(metadata.get('lecture_id') or ''),
+        'student_id': str(metadata.get('student_id') or SHARED_STUDENT_ID),
+        'filename': metadata.get('filename', ''),
+        'file_hash': content_hash,
+    }
+
+
+def file_key(metadata, filename):
+    """Manifest key (and point ID scope) of an upload in the shared collection"""
+    return "/".join([student_key_prefix(metadata.get('student_id')) + str(metadata.get('lecture_id') or ''),
+                     str(metadata.get('id') or ''), filename])
+
+
+def student_key_prefix(student_id):
+    """Prefix of the file keys of a student's uploads"""
+    return f"{student_id or ''}/"
+
+
+def student_filter(student_id=None, lecture_id=None):
+    """
+    Filter for the chunks a student may retrieve: their own uploads and the shared material
+    Args:
+        student_id (str, optional): Student asking the question; only the shared material if None
+        lecture_id (str, optional): Restrict to one lecture
+    Returns:
+        rest.Filter: Filter for QdrantVectorStore search_kwargs
+    """
+    must = None
+    if lecture_id:
+        must = [rest.FieldCondition(key=payload_key('lecture_id'), match=rest.MatchValue(value=str(lecture_id)))]
+    return rest.Filter(
+        must=must,
+        should=[
+            rest.FieldCondition(key=payload_key('student_id'),
+                                match=rest.MatchAny(any=[SHARED_STUDENT_ID] if student_id is None
+                                                    else [str(student_id), SHARED_STUDENT_ID])),
+            # Chunks ingested before student_id was stored
+            rest.IsEmptyCondition(is_empty=rest.PayloadField(key=payload_key('student_id'))),
+        ],
+    )
+
+
+def chunk_position(metadata):
+    """Sort key of a chunk within its file: first page or slide, part of a split unit, offset in the page"""
+    pages = metadata.get('slides') or metadata.get('pages') or [metadata.get('page', metadata.get('page_range'))]
+    first = str(pages[0]) if pages and pages[0] is not None else ""
+    page = int(first.split("-")[0]) if first.split("-")[0].isdigit() else 0
+    return page, metadata.get('part') or 0, metadata.get('start_index') or 0
+
+
+def scroll_points(client, collection_name, batch_size=256):
+    offset = None
+    while True:
+        points, offset = client.scroll(collection_name=collection_name, limit=batch_size, offset=offset,
+                                       with_payload=True, with_vectors=True)
+        yield from points
+        if offset is None:
+            break
+
+
+def migrate_legacy_collections(client, target, dimension, manifest, drop=False, batch_size=256):
+    """
+    Copy the points of every per-upload collection into the shared collection
+    Points get the scoped IDs the server now writes and each file is recorded in the
+    manifest, so re-uploading a migrated file replaces its points instead of duplicating them.
+    Args:
+        drop (bool): Delete each legacy collection once its points are copied
+    Returns:
+        dict: Legacy collection name -> points copied
+    """
+    ensure_collection(client, target, dimension)
+    legacy = [collection.name for collection in client.get_collections().collections
+              if collection.name.startswith(LEGACY_COLLECTION_PREFIX) and collection.name != target]
+    copied = {}
+    for collection_name in legacy:
+        files = defaultdict(list)
+        for point in scroll_points(client, collection_name, batch_size):
+            metadata = point.payload.get('metadata', {})
+            upload = {'id': metadata.get('file_id'), 'lecture_id': metadata.get('lecture_id'),
+                      'student_id': metadata.get('student_id'), 'filename': metadata.get('filename', '')}
+            files[(file_key(upload, upload['filename']), metadata.get('file_hash', ''))].append((point, upload))
+
+        for (key, content_hash), entries in files.items():
+            # Points written with deterministic IDs (point_ids(content_hash, n), or scoped by the file key)
+            # are ordered by their chunk index; the rest, e.g. the random IDs and missing file_hash of
+            # points stored with add_documents, by their position in the document
+            order = {}
+            if content_hash:
+                for scope in (None, key):
+                    order.update({point_id: index for index, point_id
+                                  in enumerate(point_ids(content_hash, len(entries), scope=scope))})
+            entries.sort(key=lambda entry: (order.get(str(entry[0].id), len(entries)),
+                                            chunk_position(entry[0].payload.get('metadata', {}))))
+            points = []
+            for point_id, (point, upload) in zip(point_ids(content_hash, len(entries), scope=key), entries):
+                payload = dict(point.payload)
+                payload['metadata'] = {**payload.get('metadata', {}), **routing_metadata(upload, content_hash)}
+                points.append(rest.PointStruct(id=point_id, vector=point.vector, payload=payload))
+            for start in range(0, len(points), batch_size):
+                client.upsert(collection_name=target, points=points[start:start + batch_size])
+            manifest.record(target, key, content_hash, len(points), scope=key)
+        copied[collection_name] = sum(len(entries) for entries in files.values())
+        print(f"Copied {copied[collection_name]} points of {len(files)} files from {collection_name} to {target}")
+        if drop:
+            client.delete_collection(collection_name=collection_name)
+            print(f"Dropped {collection_name}")
+    return copied
+
+
+def main():
+    from ingest_manifest import IngestManifest
+    from qdrant_pool import get_client
+
+    parser = argparse.ArgumentParser(description="Move per-upload collections into the shared, payload-indexed collection.")
+    parser.add_argument("--url", default="http://qdrant.service.consul:16333", help="Qdrant URL")
+    parser.add_argument("--api-key", default="qdrant", help="Qdrant API key")
+    parser.add_argument("--target", default=os.getenv("QA_COLLECTION_NAME", "student-bots-pdf-20250112"),
+                        help="Shared collection (QA_COLLECTION_NAME)")
+    parser.add_argument("--dimension", type=int, default=768, help="Vector size of the target collection")
+    parser.add_argument("--drop", action="store_true", help="Delete the legacy collections after copying")
+    args = parser.parse_args()
+
+    client = get_client(args.url, args.api_key, timeout=int(os.getenv("QDRANT_INGEST_TIMEOUT_SECONDS", "120")))
+    copied = migrate_legacy_collections(client, args.target, args.dimension, IngestManifest(), drop=args.drop)
+    print(f"Migrated {len(copied)} collections, {sum(copied.values())} points")
+
+
+if __name__ == "__main__":
+    main()
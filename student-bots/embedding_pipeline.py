@@ -0,0 +1,143 @@
+"""
+Batched, parallel embedding stage with a content-addressed on-disk cache.
+
+Chunks from many files are embedded together in batches of `batch_size`, with at
+most `max_concurrency` embedding calls in flight. Every vector is cached on disk
+under (model name, sha256 of the chunk text), so re-ingesting an unchanged deck
+never calls the embedding model again.
+"""
+import concurrent.futures
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "tmp/embedding_cache.sqlite")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, path=EMBEDDING_CACHE_PATH):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL,"
+            " PRIMARY KEY (model, text_hash))"
+        )
+        self._conn.commit()
+
+    def get_many(self, model_name, hashes):
+        """Return {text_hash: vector} for the hashes already cached for this model."""
+        found = {}
+        hashes = list(hashes)
+        with self._lock:
+            # Stay below SQLite's bound-parameter limit
+            for start in range(0, len(hashes), 500):
+                part = hashes[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(part))})",
+                    [model_name, *part],
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+        return found
+
+    def put_many(self, model_name, items):
+        """Store (text_hash, vector) pairs for this model."""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+                [(model_name, key, array("f", vector).tobytes()) for key, vector in items],
+            )
+            self._conn.commit()
+
+
+class EmbeddingPipeline:
+    def __init__(self, embeddings, model_name, cache=None,
+                 batch_size=EMBEDDING_BATCH_SIZE, max_concurrency=EMBEDDING_MAX_CONCURRENCY):
+        """
+        Args:
+            embeddings: LangChain Embeddings object used for cache misses
+            model_name (str): Name used to key the cache
+            cache (EmbeddingCache, optional): On-disk cache; no caching if None
+            batch_size (int): Maximum number of texts per embed_documents call
+            max_concurrency (int): Maximum number of embedding calls in flight
+        """
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache = cache
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self._stats_lock = threading.Lock()
+        self._stats = {"chunks": 0, "cache_hits": 0, "embedded": 0, "batches": 0, "seconds": 0.0}
+
+    def embed_texts(self, texts):
+        """
+        Embed texts, reusing cached vectors and batching the rest
+        Args:
+            texts (list): Chunk texts, possibly from many files
+        Returns:
+            list: One vector per input text, in input order
+        """
+        start_time = time.time()
+        hashes = [text_hash(text) for text in texts]
+        vectors = self.cache.get_many(self.model_name, set(hashes)) if self.cache else {}
+        cache_hits = sum(1 for key in hashes if key in vectors)
+
+        # Embed each distinct missing text once
+        missing = {}
+        for key, text in zip(hashes, texts):
+            if key not in vectors and key not in missing:
+                missing[key] = text
+        missing_items = list(missing.items())
+        batches = [missing_items[i:i + self.batch_size] for i in range(0, len(missing_items), self.batch_size)]
+
+        def embed_batch(batch):
+            batch_vectors = self.embeddings.embed_documents([text for _, text in batch])
+            items = [(key, vector) for (key, _), vector in zip(batch, batch_vectors)]
+            if self.cache:
+                self.cache.put_many(self.model_name, items)
+            return items
+
+        if batches:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as executor:
+                for items in executor.map(embed_batch, batches):
+                    vectors.update(items)
+
+        elapsed = time.time() - start_time
+        with self._stats_lock:
+            self._stats["chunks"] += len(texts)
+            self._stats["cache_hits"] += cache_hits
+            self._stats["embedded"] += len(missing_items)
+            self._stats["batches"] += len(batches)
+            self._stats["seconds"] += elapsed
+        logger.info(f"{self.model_name}: {len(texts)} chunks ({cache_hits} cached, {len(missing_items)} embedded "
+                    f"in {len(batches)} batches) in {elapsed:.1f}s")
+        return [vectors[key] for key in hashes]
+
+    def embed_documents(self, docs):
+        return self.embed_texts([doc.page_content for doc in docs])
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["model"] = self.model_name
+        stats["chunks_per_second"] = round(stats["chunks"] / stats["seconds"], 1) if stats["seconds"] else 0.0
+        stats["seconds"] = round(stats["seconds"], 2)
+        return stats
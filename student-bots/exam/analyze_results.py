@@ -1,125 +1,84 @@
 #!/usr/bin/env python3
-import json
-import os
-import glob
 import pandas as pd
 import argparse
-from pathlib import Path
 
-def load_results_files(pattern=None):
-    """Load all results files matching the pattern."""
-    current_dir = Path(__file__).parent
-    
-    if pattern:
-        result_files = list(current_dir.glob(f"exam_results*{pattern}*.json"))
-    else:
-        result_files = list(current_dir.glob("exam_results*.json"))
-    
-    if not result_files:
+import item_stats
+from compare_runs import compare_sets
+from results_warehouse import ResultsWarehouse
+
+def load_results(pattern=None):
+    """
+    Bring the results warehouse up to date and load the matching runs from it.
+
+    Returns:
+        (students, wrong_counts): one row per (run, student), and per (run, question) the
+        number of students who got it wrong
+    """
+    warehouse = ResultsWarehouse()
+    counts = warehouse.ingest()
+    if counts["ingested"] or counts["removed"]:
+        print(f"Warehouse updated: {counts['ingested']} files ingested, {counts['removed']} removed")
+    students = warehouse.students(pattern).sort_values('file_name', kind='stable')
+    wrong_counts = warehouse.wrong_counts(pattern)
+    warehouse.close()
+
+    # Different files can share a '<exam>_<time>' label; fall back to the file name for those
+    labels = students.drop_duplicates('file_name')[['file_name', 'run']]
+    duplicated = labels['run'].duplicated(keep=False)
+    labels.loc[duplicated, 'run'] = labels.loc[duplicated, 'file_name'].str.replace('.json', '', regex=False)
+    run_by_file = dict(zip(labels['file_name'], labels['run']))
+    students['run'] = students['file_name'].map(run_by_file)
+    wrong_counts['run'] = wrong_counts['file_name'].map(run_by_file)
+
+    if students.empty:
         print(f"No result files found matching pattern: {pattern if pattern else '*'}")
-        return {}
-    
-    results_by_file = {}
-    
-    for file_path in sorted(result_files):
-        try:
-            with open(file_path, 'r') as f:
-                results = json.load(f)
-                
-            # Extract exam name from the first result
-            if results and 'exam_name' in results[0]:
-                exam_name = results[0]['exam_name']
-                timestamp = file_path.stem.split('_')[-1]
-                key = f"{exam_name}_{timestamp}"
-            else:
-                key = file_path.stem
-                
-            results_by_file[key] = results
-            print(f"Loaded {len(results)} results from {file_path.name}")
-            
-        except Exception as e:
-            print(f"Error loading {file_path}: {e}")
-    
-    return results_by_file
+    else:
+        for file_name, count in students.groupby('file_name', sort=True).size().items():
+            print(f"Loaded {count} results from {file_name}")
+    return students, wrong_counts
 
-def analyze_exam_results(results_by_file):
+def analyze_exam_results(students):
     """Analyze results and generate summary statistics."""
     summary_data = []
     
-    for file_key, results in results_by_file.items():
-        exam_name = results[0]['exam_name'] if results and 'exam_name' in results[0] else "Unknown"
-        total_students = len(results)
-        
-        # Calculate statistics
-        scores = [r.get('score', {}).get('percentage', 0) for r in results if r.get('score')]
-        times = [r.get('time_taken', {}).get('minutes', 0) for r in results if r.get('time_taken')]
-        
-        # Count errors
-        error_count = sum(1 for r in results if r.get('status') == 'error')
-        
-        if scores:
-            avg_score = sum(scores) / len(scores)
-            max_score = max(scores)
-            min_score = min(scores)
-            pass_rate = sum(1 for s in scores if s >= 50) / len(scores) * 100
-        else:
-            avg_score = max_score = min_score = pass_rate = 0
-            
-        if times:
-            avg_time = sum(times) / len(times)
-            max_time = max(times)
-            min_time = min(times)
-        else:
-            avg_time = max_time = min_time = 0
+    for run, results in students.groupby('run', sort=False):
+        exam_name = results['exam_name'].iloc[0] if results['exam_name'].notna().any() else "Unknown"
+        scores = results['percentage'].dropna()
+        times = results['time_minutes'].dropna()
+        avg_time = sum(times.tolist()) / len(times) if len(times) else 0
         
-        # Add to summary data
         summary_data.append({
-            'File': file_key,
+            'File': run,
             'Exam': exam_name,
-            'Students': total_students,
-            'Errors': error_count,
-            'Avg Score': round(avg_score, 1),
-            'Max Score': round(max_score, 1),
-            'Min Score': round(min_score, 1),
-            'Pass Rate %': round(pass_rate, 1),
+            'Students': len(results),
+            'Errors': int((results['status'] == 'error').sum()),
+            'Avg Score': round(scores.mean(), 1) if len(scores) else 0,
+            'Max Score': round(scores.max(), 1) if len(scores) else 0,
+            'Min Score': round(scores.min(), 1) if len(scores) else 0,
+            'Pass Rate %': round((scores >= 50).mean() * 100, 1) if len(scores) else 0,
             'Avg Time (min)': round(avg_time, 1),
-            'Max Time (min)': round(max_time, 1),
-            'Min Time (min)': round(min_time, 1)
+            'Max Time (min)': round(times.max(), 1) if len(times) else 0,
+            'Min Time (min)': round(times.min(), 1) if len(times) else 0
         })
     
     return summary_data
 
-def create_detailed_report(results_by_file, output_file=None):
+def create_detailed_report(students, output_file=None):
     """Create a detailed report of student performance across exams."""
-    # Extract all unique student names
-    all_students = set()
-    for results in results_by_file.values():
-        for result in results:
-            if 'student_name' in result:
-                all_students.add(result['student_name'])
-    
-    # Create a dictionary to hold score data per student per exam
-    student_scores = {student: {} for student in all_students}
-    
-    # Fill in the scores
-    for file_key, results in results_by_file.items():
-        for result in results:
-            student = result.get('student_name')
-            if student and student in student_scores:
-                score = result.get('score', {}).get('percentage', 0)
-                student_scores[student][file_key] = score
-    
-    # Convert to a DataFrame for easier analysis
-    df = pd.DataFrame.from_dict(student_scores, orient='index')
+    # Students x runs matrix of score percentages
+    df = students.pivot_table(index='student_name', columns='run', values='percentage', aggfunc='last', sort=False)
+    df.columns.name = None
+    df.index.name = None
     
     # Sort by student name
     df = df.sort_index()
     
     # Add summary columns
     if not df.empty:
-        df['Average'] = df.mean(axis=1, numeric_only=True)
-        df['Min'] = df.min(axis=1, numeric_only=True)
-        df['Max'] = df.max(axis=1, numeric_only=True)
+        score_columns = list(df.columns)
+        df['Average'] = df[score_columns].mean(axis=1)
+        df['Min'] = df[score_columns].min(axis=1)
+        df['Max'] = df[score_columns].max(axis=1)
     
     # Save to CSV if output file specified
     if output_file:
@@ -128,50 +87,84 @@ def create_detailed_report(results_by_file, output_file=None):
     
     return df
 
-def compare_answers(results_by_file):
+def compare_answers(students, wrong_counts):
     """Compare answer patterns across different exams."""
     wrong_answer_analysis = {}
-    
-    for file_key, results in results_by_file.items():
-        wrong_answers_count = {}
-        
-        for result in results:
-            for wrong_q in result.get('wrong_answers', []):
-                if wrong_q not in wrong_answers_count:
-                    wrong_answers_count[wrong_q] = 0
-                wrong_answers_count[wrong_q] += 1
-        
-        # Sort by frequency
-        sorted_wrong = sorted(wrong_answers_count.items(), key=lambda x: x[1], reverse=True)
-        
-        # Calculate percentage
-        total_students = len(results)
-        wrong_answer_analysis[file_key] = [
+    total_by_run = students.groupby('run').size()
+    wrong_counts = wrong_counts.groupby(['run', 'position'])['wrong_count'].sum()
+    
+    for run in students['run'].unique():
+        total_students = total_by_run.get(run, 0)
+        if run not in wrong_counts.index.get_level_values(0) or total_students == 0:
+            wrong_answer_analysis[run] = []
+            continue
+        # Sort by frequency, then question number
+        run_counts = wrong_counts.loc[run].sort_index().sort_values(ascending=False, kind='stable')
+        wrong_answer_analysis[run] = [
             {
-                'question': q, 
-                'wrong_count': count, 
+                'question': int(q),
+                'wrong_count': int(count),
                 'wrong_percent': round(count/total_students*100, 1)
-            } 
-            for q, count in sorted_wrong if total_students > 0
+            }
+            for q, count in run_counts.items()
         ]
     
     return wrong_answer_analysis
 
+def report_item_statistics(students, pattern=None, output_file=None):
+    """Difficulty, discrimination and distractors per question, from the warehouse answers."""
+    warehouse = ResultsWarehouse()
+    answers = warehouse.answers(pattern)
+    warehouse.close()
+    run_by_file = dict(zip(students['file_name'], students['run']))
+    answers['run'] = answers['file_name'].map(run_by_file)
+    
+    stats = item_stats.analyze(answers)
+    items = stats["items"]
+    summary = items.groupby(level='run', sort=False).agg(
+        questions=('difficulty', 'size'),
+        mean_difficulty=('difficulty', 'mean'),
+        mean_discrimination=('discrimination', 'mean'),
+        negative_discrimination=('discrimination', lambda d: int((d < 0).sum()))
+    ).round(3)
+    print("\n===== ITEM STATISTICS =====")
+    print(summary.to_string())
+    
+    if output_file:
+        distractors = stats["distractors"].reindex(items.index, fill_value=0)
+        items.join(distractors).to_csv(output_file)
+        print(f"Item statistics saved to {output_file}")
+    return stats
+
 def main():
     parser = argparse.ArgumentParser(description='Analyze exam results.')
     parser.add_argument('--pattern', help='Pattern to match result files (e.g., "ktqt" or "batch")')
     parser.add_argument('--output', help='Output file for detailed report (CSV)')
+    parser.add_argument('--compare', nargs='+', metavar='PATTERN',
+                        help='Compare result sets (first pattern is the baseline) by student and question')
+    parser.add_argument('--bootstrap', type=int, default=5000, help='Bootstrap resamples for --compare confidence intervals')
+    parser.add_argument('--item-stats', nargs='?', const='', metavar='CSV',
+                        help='Show per-question difficulty/discrimination, optionally saving them to CSV')
     args = parser.parse_args()
     
-    # Load results files
-    results_by_file = load_results_files(args.pattern)
+    if args.compare:
+        if len(args.compare) < 2:
+            parser.error("--compare needs at least two patterns")
+        comparison = compare_sets(args.compare, n_boot=args.bootstrap)
+        if args.output:
+            comparison.to_csv(args.output, index=False)
+            print(f"Comparison saved to {args.output}")
+        return
     
-    if not results_by_file:
+    # Load results from the warehouse
+    students, wrong_counts = load_results(args.pattern)
+    
+    if students.empty:
         print("No results to analyze.")
         return
     
     # Analyze and display summary
-    summary_data = analyze_exam_results(results_by_file)
+    summary_data = analyze_exam_results(students)
     
     if summary_data:
         # Convert to DataFrame for nicer display
@@ -181,10 +174,10 @@ def main():
     
     # Create detailed report
     output_file = args.output if args.output else None
-    detailed_df = create_detailed_report(results_by_file, output_file)
+    detailed_df = create_detailed_report(students, output_file)
     
     # Show wrong answer analysis
-    wrong_answers = compare_answers(results_by_file)
+    wrong_answers = compare_answers(students, wrong_counts)
     
     print("\n===== MOST COMMON WRONG ANSWERS =====")
     for file_key, wrong_data in wrong_answers.items():
@@ -192,6 +185,9 @@ def main():
             print(f"\n{file_key} - Top 5 most difficult questions:")
             for i, item in enumerate(wrong_data[:5]):
                 print(f"  {i+1}. Question {item['question']}: Wrong in {item['wrong_count']} cases ({item['wrong_percent']}%)")
+    
+    if args.item_stats is not None:
+        report_item_statistics(students, args.pattern, args.item_stats or None)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -1,8 +1,9 @@
 import json
-from collections import Counter
 from typing import List, Dict
 import statistics
 
+from item_stats import analyze, answers_from_records
+
 def load_exam_data(filename: str) -> List[Dict]:
     """Load exam data from JSON file."""
     with open(filename, 'r') as f:
@@ -10,21 +11,21 @@ def load_exam_data(filename: str) -> List[Dict]:
 
 def analyze_wrong_answers(exam_data: List[Dict]) -> Dict:
     """Analyze wrong answers across all exams."""
-    # Count wrong answers for each question
-    wrong_answer_counts = Counter()
+    stats = analyze(answers_from_records(exam_data))
     total_students = len(exam_data)
+    items = stats["items"].droplevel("run")
+    items = items[items["wrong_count"] > 0]
     
-    for exam in exam_data:
-        wrong_answers = exam.get('wrong_answers', [])
-        wrong_answer_counts.update(wrong_answers)
-    
-    # Convert to dictionary with percentages
+    # Convert to dictionary with percentages, difficulty and discrimination
     wrong_answer_stats = {
-        question: {
-            'count': count,
-            'percentage': (count / total_students) * 100
+        int(question): {
+            'count': int(row['wrong_count']),
+            'percentage': (row['wrong_count'] / total_students) * 100,
+            'difficulty': row['difficulty'],
+            'discrimination': row['discrimination'],
+            'top_distractor': row.get('top_distractor')
         }
-        for question, count in wrong_answer_counts.items()
+        for question, row in items.iterrows()
     }
     
     return wrong_answer_stats
@@ -73,10 +74,11 @@ def main():
     
     # Print results
     print("\n=== Most Frequently Missed Questions ===")
-    print("Question | Times Missed | Percentage of Students")
-    print("-" * 45)
+    print("Question | Times Missed | Percentage of Students | Discrimination | Top Distractor")
+    print("-" * 85)
     for question, data in most_missed:
-        print(f"   {question:2d}   |     {data['count']:3d}      |     {data['percentage']:6.2f}%")
+        print(f"   {question:2d}   |     {data['count']:3d}      |     {data['percentage']:6.2f}%"
+              f"            |     {data['discrimination']:6.3f}     |     {data['top_distractor']}")
     
     print("\n=== General Statistics ===")
     print(f"Total number of students: {stats['total_students']}")
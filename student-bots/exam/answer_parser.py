@@ -0,0 +1,129 @@
+import json
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+# Compiled once at import; parse() runs for every student of every run
+CSV_PATTERN = re.compile(r'^([A-E],\s*)+[A-E]$')
+CONTINUOUS_PATTERN = re.compile(r'^[A-E]+$')
+# "1. A", "1: A", "1) A", "1-A", "Câu 1: A", "Question 1 - B", "**1.** C", "1. (D)"
+NUMBERED_PATTERN = re.compile(
+    r'^[ \t>*_-]*(?:(?i:câu|cau|question|q)\.?\s*)?(\d+)\s*\**\s*[.:)\-–]\s*\**\s*\(?([A-E])(?![A-Za-z])',
+    re.MULTILINE
+)
+# "1-A, 2-B, 3-C" or "1.A 2.B" on a single line
+INLINE_NUMBERED_PATTERN = re.compile(r'(?<!\d)(\d+)\s*[.:)\-–]\s*\(?([A-E])(?![A-Za-z])')
+LINE_PATTERN = re.compile(r'^\s*([A-E])(?![A-Za-z])', re.MULTILINE)
+JSON_FENCE_PATTERN = re.compile(r'```(?:json)?\s*(.*?)```', re.DOTALL)
+LETTER_PATTERN = re.compile(r'^\s*\(?([A-E])\)?[.)]?\s*$')
+
+STRATEGIES = ["json", "csv", "continuous", "numbered", "numbered_inline", "lines", "none"]
+
+
+def _letter(value: Any) -> Optional[str]:
+    if not isinstance(value, str):
+        return None
+    match = LETTER_PATTERN.match(value)
+    return match.group(1) if match else None
+
+
+class AnswerParser:
+    """
+    Extracts one letter answer per question from a model response.
+
+    Strategies are tried in a fixed order and the name of the one that matched is returned
+    with the answers, so parse failures can be traced back to response formats.
+    """
+
+    def __init__(self, questions: List[Dict[str, Any]]):
+        """
+        Args:
+            questions: The exam's questions, in the order answers are reported
+        """
+        # Position index: built once, reused for every numbered or keyed response
+        self.positions = [
+            question.get('metadata', {}).get('question_position', i + 1) for i, question in enumerate(questions)
+        ]
+
+    def _by_position(self, answer_dict: Dict[int, str]) -> List[Optional[str]]:
+        return [answer_dict.get(position) for position in self.positions]
+
+    def _parse_json(self, text: str) -> Optional[List[Optional[str]]]:
+        fenced = JSON_FENCE_PATTERN.search(text)
+        candidate = fenced.group(1).strip() if fenced else text
+        if not candidate or candidate[0] not in '[{':
+            return None
+        try:
+            data = json.loads(candidate)
+        except ValueError:
+            return None
+
+        # {"answers": ...} wrapper
+        if isinstance(data, dict) and isinstance(data.get('answers'), (list, dict)):
+            data = data['answers']
+        if isinstance(data, dict):
+            # {"1": "A", "2": "B", ...}
+            answer_dict = {int(key): _letter(value) for key, value in data.items() if str(key).strip().isdigit()}
+            return self._by_position(answer_dict) if answer_dict else None
+        if not isinstance(data, list) or not data:
+            return None
+        if all(isinstance(item, dict) for item in data):
+            # [{"question": 1, "answer": "A"}, ...]
+            answer_dict = {}
+            for item in data:
+                position = item.get('question', item.get('position', item.get('question_position')))
+                try:
+                    answer_dict[int(position)] = _letter(item.get('answer'))
+                except (TypeError, ValueError):
+                    continue
+            return self._by_position(answer_dict) if answer_dict else None
+        return [_letter(item) for item in data]
+
+    def parse(self, response_text: str) -> Tuple[List[Optional[str]], str]:
+        """
+        Returns:
+            (answers, strategy): answers are letters (or None) in question order, or positional
+            for unnumbered formats; strategy is one of STRATEGIES
+        """
+        clean_text = (response_text or '').strip()
+        if not clean_text:
+            return [], "none"
+
+        answers = self._parse_json(clean_text)
+        if answers is not None:
+            return answers, "json"
+
+        if CSV_PATTERN.match(clean_text):
+            return [answer.strip() for answer in clean_text.split(',')], "csv"
+
+        if CONTINUOUS_PATTERN.match(clean_text):
+            return list(clean_text), "continuous"
+
+        matches = NUMBERED_PATTERN.findall(clean_text)
+        if len(matches) < len(self.positions):
+            # Several numbered answers per line are only caught by the unanchored pattern
+            inline_matches = INLINE_NUMBERED_PATTERN.findall(clean_text)
+            if len(inline_matches) > len(matches):
+                return self._by_position({int(position): letter for position, letter in inline_matches}), "numbered_inline"
+        if matches:
+            return self._by_position({int(position): letter for position, letter in matches}), "numbered"
+
+        answers = LINE_PATTERN.findall(clean_text)
+        if answers:
+            return answers, "lines"
+
+        return [], "none"
+
+
+_parsers: Dict[str, AnswerParser] = {}
+_parsers_lock = threading.Lock()
+
+
+def parser_for_exam(exam_key: str, questions: List[Dict[str, Any]]) -> AnswerParser:
+    """Shared parser per exam (keyed by questions file), so every student reuses one position index."""
+    with _parsers_lock:
+        parser = _parsers.get(exam_key)
+        if parser is None:
+            parser = AnswerParser(questions)
+            _parsers[exam_key] = parser
+        return parser
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Replay answer texts through AnswerParser and report parse rate, regressions and throughput.
+
+Records written since answer_parser.py was introduced carry the model's raw_response, which is
+replayed and compared with the answers recorded at the time. Older result files only have the
+parsed letters; --synthesize renders those back into every response format the parser supports
+(the default when no raw responses are found).
+"""
+import argparse
+import json
+import time
+from collections import Counter
+from pathlib import Path
+
+from answer_parser import AnswerParser
+
+
+def synthetic_texts(letters, positions):
+    """Render one answer sheet in each known response format."""
+    pairs = list(zip(positions, letters))
+    return {
+        "csv": ", ".join(letters),
+        "continuous": "".join(letters),
+        "numbered": "\n".join(f"{p}. {a}" for p, a in pairs),
+        "numbered_dash": "\n".join(f"{p}-{a}" for p, a in pairs),
+        "numbered_vi": "\n".join(f"Câu {p}: {a}" for p, a in pairs),
+        "numbered_markdown": "\n".join(f"**{p}.** {a}" for p, a in pairs),
+        "numbered_inline": ", ".join(f"{p}-{a}" for p, a in pairs),
+        "json_array": json.dumps(letters),
+        "json_objects": "```json\n" + json.dumps([{"question": p, "answer": a} for p, a in pairs]) + "\n```",
+        "json_mapping": json.dumps({str(p): a for p, a in pairs}),
+        "lines": "\n".join(letters),
+    }
+
+
+def load_cases(pattern, synthesize):
+    """
+    Returns:
+        list of (source, text, positions, expected letters)
+    """
+    current_dir = Path(__file__).parent
+    files = sorted(current_dir.glob(f"exam_results*{pattern}*.json" if pattern else "exam_results*.json"))
+    replayed, synthesized = [], []
+    for file_path in files:
+        try:
+            with open(file_path, 'r') as f:
+                records = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Skipping {file_path.name}: {str(e)}")
+            continue
+        for record in records if isinstance(records, list) else []:
+            answers = record.get('answers') or []
+            if not answers:
+                continue
+            positions = [answer.get('position') for answer in answers]
+            letters = [answer.get('actual') for answer in answers]
+            if record.get('raw_response'):
+                replayed.append(("replay", record['raw_response'], positions, letters))
+            elif synthesize and all(isinstance(a, str) and len(a) == 1 and a in "ABCDE" for a in letters):
+                for fmt, text in synthetic_texts(letters, positions).items():
+                    synthesized.append((fmt, text, positions, letters))
+    if not replayed and not synthesize:
+        print("No raw responses found in the result files; synthesizing them from recorded answers")
+        return load_cases(pattern, synthesize=True)
+    return replayed + synthesized
+
+
+def run_benchmark(cases, repeat):
+    parsers = {}
+    stats = {}
+    strategies = Counter()
+    for source, text, positions, expected in cases:
+        parser = parsers.setdefault(tuple(positions), AnswerParser([{'metadata': {'question_position': p}} for p in positions]))
+        answers, strategy = parser.parse(text)
+        strategies[strategy] += 1
+        entry = stats.setdefault(source, {"responses": 0, "parsed": 0, "questions": 0, "answered": 0, "exact": 0})
+        entry["responses"] += 1
+        entry["parsed"] += 1 if answers else 0
+        entry["questions"] += len(expected)
+        entry["answered"] += sum(1 for answer in answers[:len(expected)] if answer)
+        entry["exact"] += 1 if list(answers[:len(expected)]) == list(expected) else 0
+
+    # Throughput: parse every case `repeat` times with the parsers already built
+    prepared = [(parsers[tuple(positions)], text) for _, text, positions, _ in cases]
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        for parser, text in prepared:
+            parser.parse(text)
+    elapsed = time.perf_counter() - start_time
+    return stats, strategies, len(prepared) * repeat, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the exam answer parser on historical responses.')
+    parser.add_argument('--pattern', help='Pattern to match result files (e.g., "ktqt" or "batch")')
+    parser.add_argument('--synthesize', action='store_true',
+                        help='Also render recorded answers into every supported response format')
+    parser.add_argument('--repeat', type=int, default=20, help='Passes over all cases for the throughput figure')
+    args = parser.parse_args()
+
+    cases = load_cases(args.pattern, args.synthesize)
+    if not cases:
+        print("No cases to benchmark.")
+        return
+
+    stats, strategies, parsed_count, elapsed = run_benchmark(cases, args.repeat)
+
+    print("\n===== PARSE RATE BY SOURCE =====")
+    print(f"{'source':<20} {'responses':>9} {'parsed%':>8} {'answered%':>10} {'exact%':>7}")
+    for source, entry in sorted(stats.items()):
+        print(f"{source:<20} {entry['responses']:>9} "
+              f"{entry['parsed'] / entry['responses'] * 100:>7.1f}% "
+              f"{entry['answered'] / max(entry['questions'], 1) * 100:>9.1f}% "
+              f"{entry['exact'] / entry['responses'] * 100:>6.1f}%")
+
+    print("\n===== MATCHED STRATEGIES =====")
+    for strategy, count in strategies.most_common():
+        print(f"  {strategy}: {count}")
+
+    print("\n===== THROUGHPUT =====")
+    print(f"  {parsed_count} parses in {elapsed:.3f}s: {parsed_count / elapsed:,.0f} responses/s, "
+          f"{elapsed / parsed_count * 1e6:.1f} us/response")
+
+
+if __name__ == "__main__":
+    main()
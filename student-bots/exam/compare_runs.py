@@ -0,0 +1,177 @@
+"""
+Cross-run comparison of exam result sets.
+
+Each set is a result-file pattern (as in analyze_results.py --pattern); the first set is the
+baseline. Runs are aligned by exam, student and question, and every other set is reported
+against the baseline: paired score deltas with bootstrap confidence intervals, questions
+that flipped between correct and wrong, and time_taken differences.
+"""
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from results_warehouse import ResultsWarehouse
+
+EXAM_DIR = Path(__file__).parent
+# Exam ids are the suffixes of the question files: exam_111.json, exam_121.json, exam_ktqt.json
+KNOWN_EXAMS = {path.stem[len("exam_"):] for path in EXAM_DIR.glob("exam_*.json") if not path.stem.startswith("exam_results")}
+TIMESTAMP_PATTERN = re.compile(r'(\d{8}_\d{6})')
+VERSION_PATTERN = re.compile(r'^v\d+(\.\d+)?$')
+
+
+def parse_run_config(file_name: str) -> Dict[str, Optional[str]]:
+    """
+    Configuration encoded in a result file name, e.g.
+    exam_results_121_individual_no_material_best_prompt_v1_20250627_153816.json or
+    exam_results_requests_ktqt_batch_vark_v2_20250611_093042.json
+    """
+    stem = Path(file_name).stem
+    name = stem[len("exam_results"):].lstrip("_")
+    config = {"runner": "per_question", "exam": None, "mode": None, "vark": None, "material": None,
+              "prompt": None, "version": None, "model": None, "timestamp": None}
+    if name.startswith("requests"):
+        config["runner"] = "requests"
+        name = name[len("requests"):].lstrip("_")
+
+    timestamp = TIMESTAMP_PATTERN.search(name)
+    if timestamp:
+        config["timestamp"] = timestamp.group(1)
+        name = (name[:timestamp.start()] + "_" + name[timestamp.end():]).strip("_")
+    name = re.sub(r'_+', '_', name)
+
+    for flag, key, values in [("no_vark", "vark", "no"), ("vark", "vark", "yes"),
+                              ("no_material", "material", "no"), ("with_material", "material", "yes")]:
+        if re.search(rf'(^|_){flag}(_|$)', name):
+            config[key] = values
+            name = re.sub(rf'(^|_){flag}(_|$)', '_', name, count=1)
+    prompt = re.search(r'(^|_)([A-Za-z0-9]+)_prompt(_|$)', name)
+    if prompt:
+        config["prompt"] = prompt.group(2)
+        name = name[:prompt.start()] + "_" + name[prompt.end():]
+
+    model_tokens = []
+    for token in [token for token in name.split("_") if token]:
+        if token in KNOWN_EXAMS and config["exam"] is None:
+            config["exam"] = token
+        elif token in ("batch", "individual"):
+            config["mode"] = token
+        elif VERSION_PATTERN.match(token):
+            config["version"] = token
+        else:
+            model_tokens.append(token)
+    config["model"] = "_".join(model_tokens) or None
+    return config
+
+
+def files_matching(pattern: str) -> List[str]:
+    return sorted(path.name for path in EXAM_DIR.glob(f"exam_results*{pattern}*.json"))
+
+
+def load_set(warehouse: ResultsWarehouse, pattern: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Students and answers of every file matching the pattern, keyed by exam.
+
+    A set can hold several runs of the same exam (repeats); they are averaged per student
+    and per (student, question).
+    """
+    students = warehouse.students(pattern)
+    answers = warehouse.answers(pattern)
+    exam_by_file = {
+        file_name: parse_run_config(file_name)["exam"] or exam_name or "unknown"
+        for file_name, exam_name in students[["file_name", "exam_name"]].drop_duplicates("file_name").itertuples(index=False)
+    }
+    students["exam"] = students["file_name"].map(exam_by_file)
+    answers["exam"] = answers["file_name"].map(exam_by_file)
+
+    students = students.groupby(["exam", "student_name"]).agg(
+        percentage=("percentage", "mean"), time_seconds=("time_seconds", "mean"), runs=("file_name", "nunique")
+    )
+    answers = answers.groupby(["exam", "student_name", "position"])["correct"].mean()
+    return students, answers
+
+
+def bootstrap_ci(deltas: np.ndarray, n_boot: int = 5000, alpha: float = 0.05,
+                 seed: int = 0) -> Tuple[float, float]:
+    """Percentile bootstrap CI of the mean, resampling all replicates in one matrix operation."""
+    deltas = np.asarray(deltas, dtype=float)
+    deltas = deltas[~np.isnan(deltas)]
+    if len(deltas) < 2:
+        return float("nan"), float("nan")
+    rng = np.random.default_rng(seed)
+    means = deltas[rng.integers(0, len(deltas), size=(n_boot, len(deltas)))].mean(axis=1)
+    low, high = np.percentile(means, [100 * alpha / 2, 100 * (1 - alpha / 2)])
+    return float(low), float(high)
+
+
+def compare(baseline: Tuple[pd.DataFrame, pd.DataFrame], other: Tuple[pd.DataFrame, pd.DataFrame],
+            n_boot: int = 5000) -> Tuple[Dict, pd.DataFrame]:
+    """
+    Returns:
+        (summary of paired deltas, per-question flips between baseline and other)
+    """
+    base_students, base_answers = baseline
+    other_students, other_answers = other
+    paired = base_students.join(other_students, how="inner", lsuffix="_a", rsuffix="_b")
+    score_delta = (paired["percentage_b"] - paired["percentage_a"]).to_numpy()
+    time_delta = (paired["time_seconds_b"] - paired["time_seconds_a"]).to_numpy()
+    score_low, score_high = bootstrap_ci(score_delta, n_boot)
+    time_low, time_high = bootstrap_ci(time_delta, n_boot)
+
+    aligned = pd.concat([base_answers.rename("a"), other_answers.rename("b")], axis=1, join="inner")
+    correct_a = aligned["a"] >= 0.5
+    correct_b = aligned["b"] >= 0.5
+    flips = pd.DataFrame({
+        "improved": (~correct_a & correct_b).astype(int),
+        "regressed": (correct_a & ~correct_b).astype(int),
+    }).groupby(level=["exam", "position"]).sum()
+    flips["net"] = flips["improved"] - flips["regressed"]
+    flips = flips[(flips["improved"] > 0) | (flips["regressed"] > 0)]
+    flips = flips.reindex(flips["net"].abs().sort_values(ascending=False, kind="stable").index)
+
+    summary = {
+        "pairs": len(paired),
+        "score_a": round(float(np.nanmean(paired["percentage_a"])), 2) if len(paired) else float("nan"),
+        "score_b": round(float(np.nanmean(paired["percentage_b"])), 2) if len(paired) else float("nan"),
+        "score_delta": round(float(np.nanmean(score_delta)), 2) if len(paired) else float("nan"),
+        "score_ci": (round(score_low, 2), round(score_high, 2)),
+        "time_delta_s": round(float(np.nanmean(time_delta)), 1) if np.isfinite(time_delta).any() else float("nan"),
+        "time_ci": (round(time_low, 1), round(time_high, 1)),
+        "answers_improved": int(flips["improved"].sum()),
+        "answers_regressed": int(flips["regressed"].sum()),
+    }
+    return summary, flips
+
+
+def compare_sets(patterns: List[str], n_boot: int = 5000, top: int = 10) -> pd.DataFrame:
+    """Print every set against the first one and return the summary table."""
+    warehouse = ResultsWarehouse()
+    warehouse.ingest()
+    sets = [load_set(warehouse, pattern) for pattern in patterns]
+    warehouse.close()
+
+    baseline_pattern = patterns[0]
+    for pattern, (students, _) in zip(patterns, sets):
+        exams = ", ".join(sorted(students.index.get_level_values("exam").unique())) or "none"
+        print(f"Set '{pattern}': {len(students)} students, exams: {exams}")
+        for file_name in files_matching(pattern):
+            config = {key: value for key, value in parse_run_config(file_name).items() if value}
+            print(f"  {file_name}: {config}")
+
+    rows = []
+    for pattern, other in zip(patterns[1:], sets[1:]):
+        summary, flips = compare(sets[0], other, n_boot)
+        rows.append({"baseline": baseline_pattern, "compared": pattern, **summary})
+        print(f"\n===== {pattern} vs {baseline_pattern} =====")
+        print(f"Paired students: {summary['pairs']}")
+        print(f"Score: {summary['score_a']} -> {summary['score_b']} "
+              f"(delta {summary['score_delta']:+}, 95% CI {summary['score_ci'][0]:+} to {summary['score_ci'][1]:+})")
+        print(f"Time taken: delta {summary['time_delta_s']:+}s "
+              f"(95% CI {summary['time_ci'][0]:+} to {summary['time_ci'][1]:+})")
+        print(f"Answer flips: {summary['answers_improved']} improved, {summary['answers_regressed']} regressed")
+        if not flips.empty:
+            print(f"Top {min(top, len(flips))} flipped questions:")
+            print(flips.head(top).to_string())
+    return pd.DataFrame(rows)
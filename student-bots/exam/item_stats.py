@@ -0,0 +1,91 @@
+"""
+Vectorized per-question statistics over exam answers.
+
+Input is the long answers frame of the results warehouse (one row per run, student and
+question with a 0/1 `correct` column); every statistic is a groupby over that frame, so
+hundreds of runs are handled in one pass without per-record Python loops.
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from results_warehouse import normalize
+
+ANSWER_COLUMNS = ["file_name", "run", "student_name", "position", "expected", "actual", "correct"]
+
+
+def answers_from_records(records: List[dict], run: str = "run") -> pd.DataFrame:
+    """Answers frame for result records loaded straight from a JSON file."""
+    _, answer_rows = normalize(run, run, records)
+    return pd.DataFrame(answer_rows, columns=ANSWER_COLUMNS)
+
+
+def correctness_matrix(answers: pd.DataFrame, run: Optional[str] = None) -> pd.DataFrame:
+    """Students x questions matrix of 0/1 correctness (NaN where a student has no row for a question)."""
+    if run is not None:
+        answers = answers[answers["run"] == run]
+    return answers.pivot_table(index="student_name", columns="position", values="correct", aggfunc="max")
+
+
+def item_statistics(answers: pd.DataFrame) -> pd.DataFrame:
+    """
+    Per (run, question): students, difficulty (share correct), wrong count and share, and
+    discrimination as the point-biserial correlation between the item and the rest score
+    (the student's total without that item).
+    """
+    frame = answers[["run", "student_name", "position", "correct"]].copy()
+    frame["correct"] = frame["correct"].astype(float)
+    totals = frame.groupby(["run", "student_name"])["correct"].transform("sum")
+    frame["rest"] = totals - frame["correct"]
+    frame["correct_rest"] = frame["correct"] * frame["rest"]
+    frame["rest_sq"] = frame["rest"] ** 2
+
+    grouped = frame.groupby(["run", "position"])
+    sums = grouped[["correct", "rest", "correct_rest", "rest_sq"]].sum()
+    n = grouped.size()
+
+    difficulty = sums["correct"] / n
+    mean_rest = sums["rest"] / n
+    covariance = sums["correct_rest"] / n - difficulty * mean_rest
+    variance_item = difficulty * (1 - difficulty)
+    variance_rest = sums["rest_sq"] / n - mean_rest ** 2
+    denominator = np.sqrt(variance_item * variance_rest)
+    discrimination = covariance / denominator.where(denominator > 0)
+
+    stats = pd.DataFrame({
+        "students": n,
+        "difficulty": difficulty.round(3),
+        "wrong_count": (n - sums["correct"]).astype(int),
+        "wrong_percent": ((1 - difficulty) * 100).round(1),
+        "discrimination": discrimination.round(3),
+    })
+    return stats
+
+
+def distractor_frequencies(answers: pd.DataFrame) -> pd.DataFrame:
+    """Per (run, question): how often each wrong letter was chosen, plus unanswered ('none')."""
+    wrong = answers[answers["correct"] == 0]
+    chosen = wrong["actual"].fillna("none").replace("", "none")
+    counts = wrong.assign(actual=chosen).groupby(["run", "position", "actual"]).size()
+    return counts.unstack("actual", fill_value=0)
+
+
+def persona_accuracy(answers: pd.DataFrame) -> pd.DataFrame:
+    """Students x runs accuracy (share of questions correct), with the mean over runs."""
+    accuracy = answers.groupby(["student_name", "run"])["correct"].mean().unstack("run")
+    accuracy["Average"] = accuracy.mean(axis=1)
+    return accuracy.round(3)
+
+
+def analyze(answers: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """All statistics for an answers frame."""
+    items = item_statistics(answers)
+    distractors = distractor_frequencies(answers)
+    if not distractors.empty:
+        items = items.join(distractors.idxmax(axis=1).rename("top_distractor"))
+    return {
+        "items": items,
+        "distractors": distractors,
+        "personas": persona_accuracy(answers),
+    }
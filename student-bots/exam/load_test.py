@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Drive the exam runners against the mock webhook and report client-side throughput ceilings.
+
+Each runner's process_student is run for a batch of simulated students at every requested
+concurrency level, against an in-process mock_webhook.MockWebhook (or --endpoint-url). Nothing
+is written to result files; the request timings of the records are summarised instead, with
+the mock's own latency subtracted to show the overhead added on the client side.
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import logging
+import os
+import time
+from typing import Dict, List
+
+import aiohttp
+
+from mock_webhook import MockWebhook, add_mock_arguments, mock_from_args, start_in_thread
+from request_timing import aiohttp_trace_config, run_timings, summarize
+from submission_client import get_bucket
+from taking_exam_requests import DEFAULT_STUDENT_NAMES
+
+logger = logging.getLogger(__name__)
+
+RUNNERS = ["requests", "async", "per_question"]
+
+
+def run_requests(endpoint_url: str, students: List[str], concurrency: int, questions_file: str) -> List[dict]:
+    import taking_exam_requests
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(
+            lambda student: taking_exam_requests.process_student(endpoint_url, student, "load_test", questions_file),
+            students
+        ))
+
+
+def run_per_question(endpoint_url: str, students: List[str], concurrency: int, questions_file: str,
+                     questions_in_flight: int) -> List[dict]:
+    import taking_exam
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(
+            lambda student: taking_exam.process_student(endpoint_url, student, "load_test", questions_file,
+                                                        questions_in_flight),
+            students
+        ))
+
+
+def run_async(endpoint_url: str, students: List[str], concurrency: int, questions_file: str,
+              request_timeout: float) -> List[dict]:
+    from taking_exam_async import AsyncExamRunner
+
+    runner = AsyncExamRunner(endpoint_url, "load_test", questions_file, max_concurrency=concurrency,
+                             rate_limit=0.0, request_timeout=request_timeout)
+
+    async def run() -> List[dict]:
+        # Same session setup as AsyncExamRunner.run, without its result store
+        semaphore = asyncio.Semaphore(concurrency)
+        connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=concurrency)
+        timeout = aiohttp.ClientTimeout(total=request_timeout)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                         trace_configs=[aiohttp_trace_config()]) as session:
+            async def run_student(student: str) -> dict:
+                async with semaphore:
+                    return await runner.process_student(session, student)
+
+            return await asyncio.gather(*(run_student(student) for student in students))
+
+    return asyncio.run(run())
+
+
+def measure(runner: str, endpoint_url: str, students: List[str], concurrency: int,
+            args: argparse.Namespace, mock: MockWebhook = None) -> Dict:
+    if mock is not None:
+        mock.reset_stats()
+    start_time = time.perf_counter()
+    if runner == "requests":
+        records = run_requests(endpoint_url, students, concurrency, args.questions_file)
+    elif runner == "per_question":
+        records = run_per_question(endpoint_url, students, concurrency, args.questions_file, args.questions_in_flight)
+    else:
+        records = run_async(endpoint_url, students, concurrency, args.questions_file, args.request_timeout)
+    wall = time.perf_counter() - start_time
+
+    timings = run_timings(records)
+    summary = summarize(timings)
+    row = {
+        "runner": runner,
+        "concurrency": concurrency,
+        "students": len(students),
+        "errors": sum(1 for record in records if record.get("status") == "error"),
+        "requests": len(timings),
+        "wall_s": round(wall, 2),
+        "req_per_s": round(len(timings) / wall, 1) if wall > 0 else None,
+        "students_per_min": round(len(students) / wall * 60, 1) if wall > 0 else None,
+        "p50_s": summary.get("total", {}).get("p50"),
+        "p95_s": summary.get("total", {}).get("p95"),
+        "p99_s": summary.get("total", {}).get("p99"),
+    }
+    if mock is not None:
+        server = mock.stats()
+        row["server_in_flight_max"] = server["max_in_flight"]
+        # Client overhead: mean request time beyond the latency the mock was told to add
+        totals = [timing["total"] for timing in timings if timing.get("total") is not None]
+        if totals and server["mean_latency_seconds"] is not None:
+            row["client_overhead_ms"] = round((sum(totals) / len(totals) - server["mean_latency_seconds"]) * 1000, 1)
+    return row
+
+
+def print_table(rows: List[Dict]) -> None:
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    widths = {column: max(len(column), *(len(str(row.get(column, "-"))) for row in rows)) for column in columns}
+    print("  ".join(column.rjust(widths[column]) for column in columns))
+    for row in rows:
+        print("  ".join(str(row.get(column, "-")).rjust(widths[column]) for column in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test the exam runners against a mock webhook.')
+    add_mock_arguments(parser)
+    parser.add_argument('--runners', default=",".join(RUNNERS), help=f'Comma-separated subset of {RUNNERS}')
+    parser.add_argument('--concurrency', default='1,5,20,50',
+                        help='Comma-separated concurrency levels (students in flight)')
+    parser.add_argument('--students', type=int, default=20, help='Simulated students per measurement')
+    parser.add_argument('--questions-in-flight', type=int, default=5, help='Per-student concurrency of taking_exam.py')
+    parser.add_argument('--request-timeout', type=float, default=60.0)
+    parser.add_argument('--endpoint-url', help='Load-test this endpoint instead of an in-process mock')
+    args = parser.parse_args()
+
+    # The runners log every question; only failures matter here
+    logging.getLogger().setLevel(logging.ERROR)
+    os.environ.setdefault("ACCESS_TOKEN", "load-test")
+
+    mock, stop = None, None
+    endpoint_url = args.endpoint_url
+    if not endpoint_url:
+        mock = mock_from_args(args)
+        endpoint_url, stop = start_in_thread(mock)
+    # No client-side rate limit: the point is to find where the client stops scaling
+    get_bucket(endpoint_url, rate=0.0)
+
+    students = (DEFAULT_STUDENT_NAMES * (args.students // len(DEFAULT_STUDENT_NAMES) + 1))[:args.students]
+    runners = [runner.strip() for runner in args.runners.split(",") if runner.strip() in RUNNERS]
+    levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+
+    rows = []
+    try:
+        for runner in runners:
+            for concurrency in levels:
+                row = measure(runner, endpoint_url, students, concurrency, args, mock)
+                print(f"{runner} x{concurrency}: {row['req_per_s']} req/s, {row['students_per_min']} students/min")
+                rows.append(row)
+    finally:
+        if stop:
+            stop()
+
+    print("\n===== LOAD TEST =====")
+    print_table(rows)
+    print("\n===== THROUGHPUT CEILING PER RUNNER =====")
+    for runner in runners:
+        runner_rows = [row for row in rows if row["runner"] == runner and row["req_per_s"]]
+        if runner_rows:
+            best = max(runner_rows, key=lambda row: row["req_per_s"])
+            print(f"  {runner}: {best['req_per_s']} req/s ({best['students_per_min']} students/min) "
+                  f"at concurrency {best['concurrency']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the n8n exam webhook, for offline load tests of the exam runners.
+
+Answers in the webhook's format ([{"json": {"text": ...}}]) either by replaying the answers
+recorded in exam_results_*.json files or by generating them at a configurable accuracy,
+after a sampled latency and with configurable error and throttling rates. Per-question
+requests (taking_exam.py) get one letter; whole-exam requests (taking_exam_requests.py,
+taking_exam_async.py) get a numbered answer sheet, or the recorded raw response.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import random
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+EXAM_DIR = Path(__file__).parent
+LETTERS = "ABCD"
+STUDENT_PATTERN = re.compile(r'@student-bot #(\S+)')
+
+
+def latency_sampler(spec: str) -> Optional[Callable[[], float]]:
+    """
+    Latency distribution from a spec string:
+        fixed:SECONDS, uniform:LOW,HIGH, lognormal:MEDIAN,SIGMA, exp:MEAN,
+        or recorded (the per-question seconds / time_taken of replayed records; returns None)
+    """
+    kind, _, params = spec.partition(":")
+    values = [float(value) for value in params.split(",") if value.strip()]
+    if kind == "recorded" and not values:
+        return None
+    # Checked here so a bad spec fails at startup rather than inside the request handler
+    arity = {"fixed": 1, "uniform": 2, "lognormal": 2, "exp": 1}
+    if arity.get(kind) != len(values) or (kind == "lognormal" and values[0] <= 0):
+        raise ValueError(f"Invalid latency spec '{spec}'; expected fixed:S, uniform:A,B, lognormal:MEDIAN,SIGMA, exp:MEAN or recorded")
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "lognormal":
+        return lambda: random.lognormvariate(math.log(values[0]), values[1])
+    return lambda: random.expovariate(1 / values[0]) if values[0] > 0 else 0.0
+
+
+class MockWebhook:
+    def __init__(self, mode: str = "generate", pattern: Optional[str] = None, questions_file: Optional[str] = None,
+                 accuracy: float = 0.7, latency: str = "fixed:0", time_scale: float = 1.0,
+                 error_rate: float = 0.0, throttle_rate: float = 0.0, max_concurrency: int = 0):
+        """
+        Args:
+            mode: "replay" (recorded answers, generated for students without a recording) or "generate"
+            pattern: Result files to replay, as in analyze_results.py --pattern
+            questions_file: Exam whose answer key generated answers are drawn against
+            accuracy: Share of generated answers that are correct (random letters without an answer key)
+            latency: Latency spec, see latency_sampler
+            time_scale: Factor applied to every sampled or recorded latency
+            error_rate: Share of requests answered with a 500
+            throttle_rate: Share of requests answered with a 429 and Retry-After: 1
+            max_concurrency: Requests processed at once, the rest queue (0 = unlimited), to model upstream capacity
+        """
+        self.mode = mode
+        self.accuracy = accuracy
+        self.sampler = latency_sampler(latency)
+        self.time_scale = time_scale
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.max_concurrency = max_concurrency
+        self._semaphore = None
+        self.answer_key = {}
+        if questions_file:
+            with open(EXAM_DIR / questions_file, 'r') as f:
+                questions = json.load(f).get('questions', [])
+            self.answer_key = {
+                question.get('metadata', {}).get('question_position', i + 1): question.get('metadata', {}).get('answer')
+                for i, question in enumerate(questions)
+            }
+        self.recordings = self.load_recordings(pattern) if mode == "replay" else {}
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    @staticmethod
+    def load_recordings(pattern: Optional[str]) -> Dict[str, dict]:
+        """Latest completed record per student of the matching result files."""
+        recordings = {}
+        files = sorted(EXAM_DIR.glob(f"exam_results*{pattern}*.json" if pattern else "exam_results*.json"))
+        for file_path in files:
+            try:
+                with open(file_path, 'r') as f:
+                    records = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping {file_path.name}: {str(e)}")
+                continue
+            for record in records if isinstance(records, list) else []:
+                if record.get('student_name') and record.get('answers'):
+                    recordings[record['student_name']] = {
+                        "answers": {answer.get('position'): answer for answer in record['answers']},
+                        "raw_response": record.get('raw_response'),
+                        "seconds": (record.get('time_taken') or {}).get('seconds'),
+                    }
+        logger.info(f"Loaded recordings of {len(recordings)} students from {len(files)} result files")
+        return recordings
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._stats = {"requests": 0, "in_flight": 0, "max_in_flight": 0, "statuses": {},
+                           "replayed": 0, "generated": 0, "latency_seconds": 0.0, "started_at": time.time()}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {**self._stats, "statuses": dict(self._stats["statuses"])}
+        elapsed = time.time() - stats.pop("started_at")
+        stats["requests_per_second"] = round(stats["requests"] / elapsed, 3) if elapsed > 0 else None
+        stats["mean_latency_seconds"] = round(stats["latency_seconds"] / stats["requests"], 4) if stats["requests"] else None
+        return stats
+
+    def _count(self, key: str, amount: float = 1) -> None:
+        with self._lock:
+            self._stats[key] += amount
+            if key == "in_flight":
+                self._stats["max_in_flight"] = max(self._stats["max_in_flight"], self._stats["in_flight"])
+
+    def _generated_letter(self, position: int) -> str:
+        expected = self.answer_key.get(position)
+        if expected and random.random() < self.accuracy:
+            return expected
+        return random.choice([letter for letter in LETTERS if letter != expected])
+
+    def answer_text(self, payload: Dict[str, Any]) -> Tuple[str, Optional[float]]:
+        """
+        Returns:
+            (response text, recorded latency in seconds or None)
+        """
+        metadata = payload.get('metadata') or {}
+        match = STUDENT_PATTERN.search(payload.get('text') or '')
+        student = metadata.get('student_name') or (match.group(1) if match else None)
+        recording = self.recordings.get(student)
+        self._count("replayed" if recording else "generated")
+
+        if 'position' in metadata:
+            position = metadata['position']
+            answer = (recording or {}).get("answers", {}).get(position)
+            if answer and answer.get('actual'):
+                return answer.get('raw_response') or answer['actual'], answer.get('seconds')
+            return self._generated_letter(position), None
+
+        if recording and recording["raw_response"]:
+            return recording["raw_response"], recording["seconds"]
+        positions = sorted(self.answer_key) or list(range(1, int(metadata.get('total_questions') or 50) + 1))
+        lines = []
+        for position in positions:
+            answer = (recording or {}).get("answers", {}).get(position)
+            letter = answer.get('actual') if answer else None
+            if recording is None:
+                letter = self._generated_letter(position)
+            if letter:
+                lines.append(f"{position}. {letter}")
+        return "\n".join(lines), (recording or {}).get("seconds")
+
+    async def handle(self, request: web.Request) -> web.Response:
+        try:
+            payload = await request.json()
+        except ValueError:
+            # Requests with an image are multipart forms
+            payload = dict(await request.post())
+        if not isinstance(payload, dict):
+            payload = {}
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency) if self.max_concurrency > 0 else None
+
+        self._count("requests")
+        self._count("in_flight")
+        try:
+            if self._semaphore is not None:
+                async with self._semaphore:
+                    status, body = await self._respond(payload)
+            else:
+                status, body = await self._respond(payload)
+        finally:
+            self._count("in_flight", -1)
+        with self._lock:
+            self._stats["statuses"][str(status)] = self._stats["statuses"].get(str(status), 0) + 1
+
+        if status == 429:
+            return web.Response(status=429, headers={"Retry-After": "1"}, text="Too Many Requests")
+        if status != 200:
+            return web.Response(status=status, text="Mock upstream error")
+        return web.json_response(body)
+
+    async def _respond(self, payload: Dict[str, Any]) -> Tuple[int, Any]:
+        roll = random.random()
+        if roll < self.throttle_rate:
+            return 429, None
+        text, recorded_seconds = self.answer_text(payload)
+        latency = self.sampler() if self.sampler else (recorded_seconds or 0.0)
+        latency = max(0.0, latency * self.time_scale)
+        self._count("latency_seconds", latency)
+        if latency:
+            await asyncio.sleep(latency)
+        if roll < self.throttle_rate + self.error_rate:
+            return 500, None
+        return 200, [{"json": {"text": text}}]
+
+    async def stats_handler(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats())
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post('/webhook/{name}', self.handle)
+        app.router.add_post('/', self.handle)
+        app.router.add_get('/stats', self.stats_handler)
+        return app
+
+
+def start_in_thread(mock: MockWebhook, host: str = "127.0.0.1", port: int = 0) -> Tuple[str, Callable[[], None]]:
+    """
+    Serve the mock from a background event loop.
+
+    Returns:
+        (webhook URL, function that stops the server)
+    """
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(mock.app(), access_log=None)
+    ready = threading.Event()
+    address = {}
+
+    def serve():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, host, port)
+        loop.run_until_complete(site.start())
+        address["port"] = site._server.sockets[0].getsockname()[1]
+        ready.set()
+        loop.run_forever()
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result(timeout=10)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=10)
+
+    thread = threading.Thread(target=serve, name="mock-webhook", daemon=True)
+    thread.start()
+    ready.wait()
+    return f"http://{host}:{address['port']}/webhook/mock", stop
+
+
+def add_mock_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--mode', choices=['replay', 'generate'], default='generate',
+                        help='Replay recorded answers or generate them')
+    parser.add_argument('--pattern', help='Result files to replay (e.g., "ktqt_batch")')
+    parser.add_argument('--questions-file', default='exam_ktqt.json', help='Answer key for generated answers')
+    parser.add_argument('--accuracy', type=float, default=0.7, help='Share of generated answers that are correct')
+    parser.add_argument('--latency', default='fixed:0',
+                        help='fixed:S, uniform:A,B, lognormal:MEDIAN,SIGMA, exp:MEAN or recorded')
+    parser.add_argument('--time-scale', type=float, default=1.0, help='Factor applied to every latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with a 500')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Share of requests answered with a 429')
+    parser.add_argument('--max-concurrency', type=int, default=0,
+                        help='Requests processed at once, the rest queue (0 = unlimited)')
+
+
+def mock_from_args(args: argparse.Namespace) -> MockWebhook:
+    return MockWebhook(
+        mode=args.mode, pattern=args.pattern, questions_file=args.questions_file, accuracy=args.accuracy,
+        latency=args.latency, time_scale=args.time_scale, error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate, max_concurrency=args.max_concurrency,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a mock exam webhook for offline runs and load tests.')
+    add_mock_arguments(parser)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=18080)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    mock = mock_from_args(args)
+    logger.info(f"Point the runners at EXAM_ENDPOINT_URL=http://{args.host}:{args.port}/webhook/mock "
+                f"(stats at http://{args.host}:{args.port}/stats)")
+    web.run_app(mock.app(), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -24,6 +24,9 @@ def process_data(input_file, output_file):
         # Extract relevant information
         processed_data = []
         for entry in data:
+            # Errored runs have no score
+            if not entry.get('score'):
+                continue
             processed_data.append({
                 'student_name': entry['student_name'],
                 'score.percentage': entry['score']['percentage']
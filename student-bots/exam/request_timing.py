@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Per-request timing of exam submissions, and latency/throughput reports over result files.
+
+SubmissionClient and AsyncSubmissionClient fill one timing entry per submission (queue wait
+in the rate limiter, connect, time to first byte, total, payload sizes, retries); the runners
+write them into each result record under "request_timings". This module summarises them as
+p50/p95/p99 latency and requests/sec per run, and can push them to the OTLP collector.
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Same collector the student bots service exports its metrics to
+EXAM_OTLP_ENDPOINT = os.getenv("EXAM_OTLP_ENDPOINT", "http://10.77.0.12:14317")
+
+PHASES = ["queue_wait", "connect", "ttfb", "total"]
+PERCENTILES = [50, 95, 99]
+
+
+def new_timing(**fields: Any) -> Dict[str, Any]:
+    """Empty timing entry; `fields` (e.g. position) are kept as labels."""
+    return {
+        **fields,
+        "started_at": round(time.time(), 3),
+        "queue_wait": 0.0,
+        "connect": None,
+        "ttfb": None,
+        "total": None,
+        "request_bytes": None,
+        "response_bytes": None,
+        "attempts": 0,
+        "retries": 0,
+        "status": None,
+        "error": None,
+    }
+
+
+def aiohttp_trace_config():
+    """
+    TraceConfig recording connect time and time to first byte into the timing entry passed
+    as trace_request_ctx={"timing": entry} to session.post.
+    """
+    import aiohttp
+
+    async def on_request_start(session, context, params):
+        context.request_start = time.perf_counter()
+        context.connect_start = None
+
+    async def on_connection_create_start(session, context, params):
+        context.connect_start = time.perf_counter()
+
+    async def on_connection_create_end(session, context, params):
+        timing = _trace_timing(context)
+        if timing is not None and context.connect_start is not None:
+            timing["connect"] = round(time.perf_counter() - context.connect_start, 4)
+
+    async def on_connection_reuseconn(session, context, params):
+        timing = _trace_timing(context)
+        if timing is not None:
+            timing["connect"] = 0.0
+
+    async def on_request_end(session, context, params):
+        # Fired once the response headers are in
+        timing = _trace_timing(context)
+        if timing is not None:
+            timing["ttfb"] = round(time.perf_counter() - context.request_start, 4)
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_connection_create_start.append(on_connection_create_start)
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+    trace_config.on_request_end.append(on_request_end)
+    return trace_config
+
+
+def _trace_timing(context: SimpleNamespace) -> Optional[Dict[str, Any]]:
+    ctx = getattr(context, "trace_request_ctx", None)
+    return ctx.get("timing") if isinstance(ctx, dict) else None
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    values = [value for value in values if value is not None]
+    if not values:
+        return {f"p{p}": None for p in PERCENTILES}
+    return {f"p{p}": round(float(v), 3) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+
+
+def run_timings(records: List[dict]) -> List[Dict[str, Any]]:
+    """Every timing entry of a run's result records."""
+    return [timing for record in records for timing in record.get("request_timings") or []]
+
+
+def summarize(timings: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Returns:
+        requests, errors, retries, requests/sec over the run's wall-clock span, bytes sent and
+        received, and p50/p95/p99 of every phase
+    """
+    summary = {"requests": len(timings)}
+    if not timings:
+        return summary
+    start = min(timing["started_at"] for timing in timings)
+    end = max(timing["started_at"] + (timing["total"] or 0) for timing in timings)
+    span = end - start
+    summary.update({
+        "errors": sum(1 for timing in timings if timing.get("error")),
+        "retries": sum(timing.get("retries") or 0 for timing in timings),
+        "wall_seconds": round(span, 1),
+        "requests_per_second": round(len(timings) / span, 3) if span > 0 else None,
+        "request_bytes": sum(timing.get("request_bytes") or 0 for timing in timings),
+        "response_bytes": sum(timing.get("response_bytes") or 0 for timing in timings),
+    })
+    for phase in PHASES:
+        summary[phase] = percentiles([timing.get(phase) for timing in timings])
+    return summary
+
+
+def format_summary(label: str, summary: Dict[str, Any]) -> str:
+    if not summary.get("requests"):
+        return f"{label}: no request timings"
+    rps = summary["requests_per_second"]
+    lines = [
+        f"{label}: {summary['requests']} requests, {summary['errors']} errors, {summary['retries']} retries, "
+        f"{rps if rps is not None else '-'} req/s over {summary['wall_seconds']}s, "
+        f"{summary['request_bytes'] / 1024:.1f} KiB sent, {summary['response_bytes'] / 1024:.1f} KiB received"
+    ]
+    for phase in PHASES:
+        values = summary[phase]
+        lines.append(f"  {phase:<11}" + "".join(
+            f" {name}={'-' if value is None else f'{value:.3f}s':<9}" for name, value in values.items()
+        ))
+    return "\n".join(lines)
+
+
+def log_run_summary(label: str, records: List[dict]) -> Dict[str, Any]:
+    summary = summarize(run_timings(records))
+    logger.info("\n" + format_summary(label, summary))
+    return summary
+
+
+def export_otlp(timings: List[Dict[str, Any]], attributes: Dict[str, str],
+                endpoint: str = EXAM_OTLP_ENDPOINT) -> bool:
+    """
+    Push the timings of a run to the OTLP collector as histograms (seconds and bytes) and
+    a retry counter. Needs opentelemetry-sdk and opentelemetry-exporter-otlp; without them
+    a warning is logged and nothing is exported.
+
+    Returns:
+        Whether the export was attempted
+    """
+    try:
+        from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import OTLPMetricExporter
+        from opentelemetry.sdk.metrics import MeterProvider
+        from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+        from opentelemetry.sdk.resources import Resource
+    except ImportError as e:
+        logger.warning(f"OTLP export skipped, opentelemetry-sdk/exporter not installed: {str(e)}")
+        return False
+
+    reader = PeriodicExportingMetricReader(OTLPMetricExporter(endpoint=endpoint, insecure=True))
+    provider = MeterProvider(resource=Resource.create({"service.name": "student-bots-exam"}),
+                             metric_readers=[reader])
+    meter = provider.get_meter("student-bots-exam")
+    histograms = {
+        phase: meter.create_histogram(f"exam_request_{phase}_seconds", unit="s",
+                                      description=f"Exam submission {phase.replace('_', ' ')}")
+        for phase in PHASES
+    }
+    payload = meter.create_histogram("exam_request_payload_bytes", unit="By", description="Exam submission payload size")
+    retries = meter.create_counter("exam_request_retries", description="Retried exam submission attempts")
+
+    for timing in timings:
+        labels = {**attributes, "status": str(timing.get("status"))}
+        for phase, histogram in histograms.items():
+            if timing.get(phase) is not None:
+                histogram.record(timing[phase], labels)
+        for direction in ("request", "response"):
+            if timing.get(f"{direction}_bytes") is not None:
+                payload.record(timing[f"{direction}_bytes"], {**labels, "direction": direction})
+        retries.add(timing.get("retries") or 0, labels)
+
+    # Shutting down collects and exports everything recorded above
+    provider.shutdown()
+    logger.info(f"Exported {len(timings)} request timings to {endpoint}")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Latency and throughput report of exam runs from their result files.')
+    parser.add_argument('--pattern', help='Pattern to match result files (e.g., "ktqt" or "batch")')
+    parser.add_argument('--otlp', action='store_true', help=f'Also export the timings to {EXAM_OTLP_ENDPOINT}')
+    args = parser.parse_args()
+
+    current_dir = Path(__file__).parent
+    files = sorted(current_dir.glob(f"exam_results*{args.pattern}*.json" if args.pattern else "exam_results*.json"))
+    reported = 0
+    for file_path in files:
+        try:
+            with open(file_path, 'r') as f:
+                records = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Skipping {file_path.name}: {str(e)}")
+            continue
+        timings = run_timings(records if isinstance(records, list) else [records])
+        if not timings:
+            continue
+        print(format_summary(file_path.stem, summarize(timings)))
+        reported += 1
+        if args.otlp:
+            export_otlp(timings, {"run": file_path.stem})
+    if not reported:
+        print("No result files with request timings found.")
+
+
+if __name__ == "__main__":
+    main()
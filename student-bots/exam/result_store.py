@@ -0,0 +1,174 @@
+import json
+import logging
+import os
+import queue
+import threading
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+def read_records(jsonl_path: Union[str, Path]) -> List[dict]:
+    """
+    Read every record of a result store.
+
+    A crash can leave a partially written last line; it is skipped with a warning
+    instead of failing the whole read.
+    """
+    records = []
+    path = Path(jsonl_path)
+    if not path.exists():
+        return records
+    with open(path, 'r') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                logger.warning(f"Skipping truncated record at {path}:{line_number}")
+    return records
+
+
+def latest_records(records: List[dict]) -> List[dict]:
+    """Keep the last record written for each student, sorted by student name."""
+    by_student: Dict[str, dict] = {}
+    for record in records:
+        by_student[record["student_name"]] = record
+    return sorted(by_student.values(), key=lambda x: x["student_name"])
+
+
+def load_run(json_path: Union[str, Path]) -> Dict[str, dict]:
+    """
+    Latest record per student of an existing run, for resuming it.
+
+    Reads the run's JSONL store, or the exported JSON for runs made before the store existed.
+    """
+    json_path = Path(json_path)
+    records = read_records(json_path.with_suffix(".jsonl"))
+    if not records and json_path.exists():
+        with open(json_path, 'r') as f:
+            records = json.load(f)
+    return {record["student_name"]: record for record in latest_records(records)}
+
+
+def pending_students(student_names: List[str], previous: Dict[str, dict]) -> List[str]:
+    """Students of the run that have no completed record yet (missing or errored)."""
+    return [name for name in student_names if previous.get(name, {}).get("status") != "completed"]
+
+
+def write_json_atomic(path: Union[str, Path], data) -> None:
+    """Write JSON to a temporary file and rename it over the target, so readers never see half a file."""
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class ResultStore:
+    """
+    Append-only JSONL sink for exam results.
+
+    Workers call append() from any thread; a single writer thread appends one line per
+    record and fsyncs it, so concurrent completions never interleave and a crash loses
+    at most the record being written. export() produces the usual sorted JSON (and CSV)
+    once the run is over.
+    """
+
+    def __init__(self, json_path: Union[str, Path]):
+        """
+        Args:
+            json_path: Path of the exported results JSON; records are kept next to it with a .jsonl suffix
+        """
+        self.json_path = Path(json_path)
+        self.path = self.json_path.with_suffix(".jsonl")
+        self._queue: "queue.Queue" = queue.Queue()
+        self._file = open(self.path, 'a')
+        # Terminate a line left half-written by a crash so the next record starts on its own line
+        if self._file.tell() > 0:
+            with open(self.path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self._file.write("\n")
+        self._writer = threading.Thread(target=self._write_loop, name="result-store-writer", daemon=True)
+        self._writer.start()
+
+    def _write_loop(self) -> None:
+        while True:
+            record = self._queue.get()
+            try:
+                if record is _STOP:
+                    return
+                self._file.write(json.dumps(record) + "\n")
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            except Exception as e:
+                logger.error(f"Failed to write result for {record.get('student_name')}: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    def append(self, record: dict) -> None:
+        """Queue a record for writing; returns immediately."""
+        self._queue.put(record)
+
+    def flush(self) -> None:
+        """Block until every queued record is on disk."""
+        self._queue.join()
+
+    def close(self) -> None:
+        self._queue.put(_STOP)
+        self._writer.join()
+        self._file.close()
+
+    def resume(self, student_names: List[str]) -> Tuple[Dict[str, dict], List[str]]:
+        """
+        Pick up an interrupted run stored at this path.
+
+        Returns:
+            (latest previous record per student, students that still need to run)
+        """
+        previous = load_run(self.json_path)
+        if previous and not read_records(self.path):
+            # Run made before the store existed: carry its records over so export keeps them
+            for record in previous.values():
+                self.append(record)
+        pending = pending_students(student_names, previous)
+        logger.info(f"Resuming {self.json_path.name}: {len(student_names) - len(pending)} students done, "
+                    f"{len(pending)} to run")
+        return previous, pending
+
+    def records(self) -> List[dict]:
+        self.flush()
+        return read_records(self.path)
+
+    def export(self, csv: bool = True) -> List[dict]:
+        """
+        Write the sorted results JSON (and the process_students CSV) from the store.
+
+        Returns:
+            The exported records, one per student
+        """
+        records = latest_records(self.records())
+        write_json_atomic(self.json_path, records)
+        logger.info(f"Results exported to {self.json_path} ({len(records)} students)")
+        if csv:
+            try:
+                from process_students import process_data
+            except ImportError as e:
+                logger.warning(f"Skipping CSV export: {str(e)}")
+            else:
+                process_data(str(self.json_path), str(self.json_path.with_suffix(".csv")))
+        return records
+
+    def __enter__(self) -> "ResultStore":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Local SQLite warehouse of exam results, one row per (run, student) and per (run, student, question).
+
+Result files are normalized once and re-ingested only when their mtime/size change and
+their content hash differs, so analysis queries no longer json.load every file.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+EXAM_DIR = Path(__file__).parent
+RESULTS_WAREHOUSE_PATH = os.getenv("RESULTS_WAREHOUSE_PATH", str(EXAM_DIR / "results_warehouse.sqlite"))
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS files ("
+    " file_name TEXT PRIMARY KEY, run TEXT NOT NULL, mtime REAL NOT NULL, size INTEGER NOT NULL,"
+    " sha256 TEXT NOT NULL, students INTEGER NOT NULL, ingested_at TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS students ("
+    " file_name TEXT NOT NULL, run TEXT NOT NULL, student_name TEXT NOT NULL, exam_name TEXT,"
+    " status TEXT, error TEXT, timestamp TEXT, total_questions INTEGER, correct_answers INTEGER,"
+    " percentage REAL, time_seconds REAL, time_minutes REAL, retries INTEGER)",
+    "CREATE TABLE IF NOT EXISTS answers ("
+    " file_name TEXT NOT NULL, run TEXT NOT NULL, student_name TEXT NOT NULL, position INTEGER NOT NULL,"
+    " expected TEXT, actual TEXT, correct INTEGER NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_students_file ON students (file_name)",
+    "CREATE INDEX IF NOT EXISTS idx_answers_file ON answers (file_name)",
+    "CREATE INDEX IF NOT EXISTS idx_answers_run_position ON answers (run, position)",
+]
+
+
+def run_key(file_path: Path, records: List[dict]) -> str:
+    """Same run label analyze_results.py has always used: '<exam_name>_<timestamp>' or the file stem."""
+    if records and 'exam_name' in records[0]:
+        return f"{records[0]['exam_name']}_{file_path.stem.split('_')[-1]}"
+    return file_path.stem
+
+
+def file_sha256(file_path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def normalize(file_name: str, run: str, records: List[dict]):
+    """Flatten result records into student rows and answer rows."""
+    student_rows, answer_rows = [], []
+    for record in records:
+        student = record.get('student_name')
+        if not student:
+            continue
+        score = record.get('score') or {}
+        time_taken = record.get('time_taken') or {}
+        student_rows.append((
+            file_name, run, student, record.get('exam_name'), record.get('status'), record.get('error'),
+            record.get('timestamp'), score.get('total_questions'), score.get('correct_answers'),
+            score.get('percentage'), time_taken.get('seconds'), time_taken.get('minutes'),
+            len(record.get('retries') or []),
+        ))
+        wrong = set(record.get('wrong_answers') or [])
+        seen = set()
+        for answer in record.get('answers') or []:
+            position = answer.get('position')
+            if position is None or position in seen:
+                continue
+            seen.add(position)
+            expected, actual = answer.get('expected'), answer.get('actual')
+            correct = int(position not in wrong and actual is not None and actual == expected)
+            answer_rows.append((file_name, run, student, position, expected, actual, correct))
+        # Questions that were marked wrong without an answer entry (no response)
+        for position in wrong - seen:
+            answer_rows.append((file_name, run, student, position, None, None, 0))
+    return student_rows, answer_rows
+
+
+class ResultsWarehouse:
+    def __init__(self, path: str = RESULTS_WAREHOUSE_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        for statement in SCHEMA:
+            self.conn.execute(statement)
+        self.conn.commit()
+
+    def _delete_file(self, file_name: str) -> None:
+        for table in ("answers", "students", "files"):
+            self.conn.execute(f"DELETE FROM {table} WHERE file_name = ?", (file_name,))
+
+    def ingest(self, directory: Path = EXAM_DIR, glob_pattern: str = "exam_results*.json") -> Dict[str, int]:
+        """
+        Bring the warehouse in line with the result files in `directory`.
+
+        Returns:
+            Counts of files ingested, skipped as unchanged and removed
+        """
+        counts = {"ingested": 0, "unchanged": 0, "removed": 0, "failed": 0}
+        known = {row[0]: row[1:] for row in self.conn.execute("SELECT file_name, mtime, size, sha256 FROM files")}
+        present = set()
+
+        for file_path in sorted(Path(directory).glob(glob_pattern)):
+            file_name = file_path.name
+            present.add(file_name)
+            stat = file_path.stat()
+            previous = known.get(file_name)
+            if previous and previous[0] == stat.st_mtime and previous[1] == stat.st_size:
+                counts["unchanged"] += 1
+                continue
+            sha256 = file_sha256(file_path)
+            if previous and previous[2] == sha256:
+                # Touched but not changed
+                self.conn.execute("UPDATE files SET mtime = ?, size = ? WHERE file_name = ?",
+                                  (stat.st_mtime, stat.st_size, file_name))
+                self.conn.commit()
+                counts["unchanged"] += 1
+                continue
+
+            try:
+                with open(file_path, 'r') as f:
+                    records = json.load(f)
+                if not isinstance(records, list):
+                    records = [records]
+            except (OSError, ValueError) as e:
+                print(f"Error loading {file_path}: {e}")
+                counts["failed"] += 1
+                continue
+
+            run = run_key(file_path, records)
+            student_rows, answer_rows = normalize(file_name, run, records)
+            with self.conn:
+                self._delete_file(file_name)
+                self.conn.executemany("INSERT INTO students VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", student_rows)
+                self.conn.executemany("INSERT INTO answers VALUES (?, ?, ?, ?, ?, ?, ?)", answer_rows)
+                self.conn.execute(
+                    "INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (file_name, run, stat.st_mtime, stat.st_size, sha256, len(student_rows),
+                     time.strftime("%Y-%m-%d %H:%M:%S")),
+                )
+            counts["ingested"] += 1
+
+        for file_name in set(known) - present:
+            with self.conn:
+                self._delete_file(file_name)
+            counts["removed"] += 1
+        return counts
+
+    def _query(self, table: str, columns: str, pattern: Optional[str], where: str = "", group_by: str = "") -> pd.DataFrame:
+        conditions = [where] if where else []
+        params = ()
+        if pattern:
+            conditions.append("file_name GLOB ?")
+            params = (f"exam_results*{pattern}*.json",)
+        sql = f"SELECT {columns} FROM {table}"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        if group_by:
+            sql += f" GROUP BY {group_by}"
+        return pd.read_sql_query(sql, self.conn, params=params)
+
+    def files(self, pattern: Optional[str] = None) -> pd.DataFrame:
+        return self._query("files", "file_name, run, students, ingested_at", pattern)
+
+    def students(self, pattern: Optional[str] = None) -> pd.DataFrame:
+        """One row per (run, student)."""
+        return self._query("students", "*", pattern)
+
+    def answers(self, pattern: Optional[str] = None) -> pd.DataFrame:
+        """One row per (run, student, question)."""
+        return self._query("answers", "*", pattern)
+
+    def wrong_counts(self, pattern: Optional[str] = None) -> pd.DataFrame:
+        """Number of students who got each question wrong, per result file (aggregated in SQLite)."""
+        return self._query("answers", "file_name, position, COUNT(*) AS wrong_count", pattern,
+                           where="correct = 0", group_by="file_name, position")
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ingest exam result files into the results warehouse.')
+    parser.add_argument('--path', default=RESULTS_WAREHOUSE_PATH, help='SQLite file of the warehouse')
+    parser.add_argument('--rebuild', action='store_true', help='Drop everything and ingest all files again')
+    args = parser.parse_args()
+
+    if args.rebuild and os.path.exists(args.path):
+        os.remove(args.path)
+    warehouse = ResultsWarehouse(args.path)
+    start_time = time.time()
+    counts = warehouse.ingest()
+    print(f"Ingested {counts['ingested']}, unchanged {counts['unchanged']}, removed {counts['removed']}, "
+          f"failed {counts['failed']} result files in {time.time() - start_time:.2f}s")
+    warehouse.close()
+
+
+if __name__ == "__main__":
+    main()
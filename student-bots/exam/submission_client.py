@@ -0,0 +1,289 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+
+class SubmissionError(Exception):
+    """Raised when a submission still fails after every retry."""
+
+    def __init__(self, failures: List[Dict]):
+        last_error = failures[-1]["error"] if failures else "unknown error"
+        super().__init__(f"No response after {len(failures)} attempts: {last_error}")
+        self.failures = failures
+
+
+class AdaptiveTokenBucket:
+    """
+    Token bucket shared by every request to one endpoint.
+
+    The rate drops multiplicatively on 429 responses (and requests pause for Retry-After)
+    and creeps back up additively after successful calls, so a run settles at the rate
+    the upstream actually accepts. A rate of 0 means no steady limit; Retry-After pauses
+    still apply.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None, min_rate: float = 0.05):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate) if rate > 0 else min_rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token and return how many seconds the caller must wait before sending."""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self.blocked_until - now)
+            if self.rate <= 0:
+                return wait
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.tokens -= 1
+            if self.tokens < 0:
+                wait = max(wait, -self.tokens / self.rate)
+            return wait
+
+    def acquire(self) -> float:
+        """Block until a request may be sent; returns the seconds spent waiting."""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self) -> float:
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def on_throttled(self, retry_after: Optional[float] = None) -> None:
+        """Called on a 429: halve the rate and pause everyone for Retry-After seconds."""
+        with self._lock:
+            if self.rate > 0:
+                self.rate = max(self.min_rate, self.rate / 2)
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+            logger.warning(f"Throttled by upstream, rate now {self.rate:.2f} req/s"
+                           + (f", pausing {retry_after:.0f}s" if retry_after else ""))
+
+    def on_success(self) -> None:
+        with self._lock:
+            if 0 < self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + 0.05 * self.max_rate)
+
+
+_buckets: Dict[str, AdaptiveTokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(endpoint_url: str, rate: Optional[float] = None) -> AdaptiveTokenBucket:
+    """Return the process-wide bucket for an endpoint (EXAM_RATE_LIMIT requests/sec by default)."""
+    with _buckets_lock:
+        if endpoint_url not in _buckets:
+            if rate is None:
+                rate = float(os.getenv("EXAM_RATE_LIMIT", "5"))
+            _buckets[endpoint_url] = AdaptiveTokenBucket(rate)
+        return _buckets[endpoint_url]
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def shared_session(pool_size: int = 100) -> requests.Session:
+    """One keep-alive connection pool for every student thread in the process."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After is either a number of seconds or an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """Exponential backoff with full jitter for the given retry attempt (1-based)."""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** (attempt - 1))))
+
+
+class SubmissionClient:
+    def __init__(self, endpoint_url: str, headers: Dict[str, str], bucket: Optional[AdaptiveTokenBucket] = None,
+                 max_retries: Optional[int] = None, base_delay: float = 1.0, max_delay: float = 60.0,
+                 timeout: Optional[float] = None, session: Optional[requests.Session] = None):
+        """
+        Args:
+            endpoint_url: Webhook URL
+            headers: Headers sent with every request
+            bucket: Rate limiter shared by all clients of the endpoint (get_bucket by default)
+            max_retries: Retries after the first attempt (EXAM_MAX_RETRIES, default 5)
+            base_delay: Backoff base in seconds
+            max_delay: Backoff cap in seconds
+            timeout: Per-request timeout in seconds (EXAM_REQUEST_TIMEOUT, default 900)
+            session: requests.Session to reuse connections with (shared_session by default)
+        """
+        self.endpoint_url = endpoint_url
+        self.headers = headers
+        self.bucket = bucket or get_bucket(endpoint_url)
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("EXAM_MAX_RETRIES", "5"))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout if timeout is not None else float(os.getenv("EXAM_REQUEST_TIMEOUT", "900"))
+        self.session = session or shared_session()
+
+    def post(self, json_body: Dict[str, Any], files: Optional[Dict] = None,
+             timing: Optional[Dict[str, Any]] = None) -> Tuple[Optional[Any], List[Dict]]:
+        """
+        POST with rate limiting and retries.
+
+        Args:
+            timing: Entry from request_timing.new_timing, filled in for the whole submission.
+                requests does not expose connect time, so connect stays None and ttfb is
+                response.elapsed (request sent until headers parsed) of the last attempt
+
+        Returns:
+            (response JSON or None if every attempt failed, list of failed attempts)
+        """
+        timing = timing if timing is not None else {}
+        start_time = time.perf_counter()
+        failures = []
+        try:
+            for attempt in range(1, self.max_retries + 2):
+                timing["queue_wait"] = round(timing.get("queue_wait", 0.0) + self.bucket.acquire(), 4)
+                timing["attempts"] = attempt
+                retry_after = None
+                try:
+                    response = self.session.post(
+                        self.endpoint_url, json=json_body, files=files, headers=self.headers, timeout=self.timeout
+                    )
+                    timing["status"] = response.status_code
+                    timing["ttfb"] = round(response.elapsed.total_seconds(), 4)
+                    timing["request_bytes"] = len(response.request.body or b"")
+                    timing["response_bytes"] = len(response.content)
+                    if response.status_code == 429:
+                        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                        self.bucket.on_throttled(retry_after)
+                    response.raise_for_status()
+                    data = response.json()
+                    self.bucket.on_success()
+                    return data, failures
+                except requests.RequestException as e:
+                    status = getattr(getattr(e, 'response', None), 'status_code', None)
+                    retryable = status is None or status in RETRYABLE_STATUS_CODES
+                    failures.append({"attempt": attempt, "status": status, "error": str(e)})
+                except ValueError as e:
+                    # Upstream answered 2xx with a body that is not JSON (e.g. a proxy error page)
+                    retryable = True
+                    failures.append({"attempt": attempt, "status": response.status_code, "error": f"Invalid JSON: {str(e)}"})
+
+                if not retryable or attempt > self.max_retries:
+                    break
+                delay = max(retry_after or 0.0, backoff_delay(attempt, self.base_delay, self.max_delay))
+                logger.warning(f"Attempt {attempt} failed ({failures[-1]['error']}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+            timing["error"] = failures[-1]["error"]
+            logger.error(f"Giving up on {self.endpoint_url} after {len(failures)} attempts: {failures[-1]['error']}")
+            return None, failures
+        finally:
+            timing["total"] = round(time.perf_counter() - start_time, 4)
+            timing["retries"] = max(0, timing["attempts"] - 1)
+
+
+class AsyncSubmissionClient:
+    """aiohttp counterpart of SubmissionClient, sharing the same per-endpoint bucket."""
+
+    def __init__(self, session, endpoint_url: str, headers: Dict[str, str],
+                 bucket: Optional[AdaptiveTokenBucket] = None, max_retries: Optional[int] = None,
+                 base_delay: float = 1.0, max_delay: float = 60.0):
+        self.session = session
+        self.endpoint_url = endpoint_url
+        self.headers = headers
+        self.bucket = bucket or get_bucket(endpoint_url)
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("EXAM_MAX_RETRIES", "5"))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    async def post(self, json_body: Dict[str, Any],
+                   timing: Optional[Dict[str, Any]] = None) -> Tuple[Optional[Any], List[Dict]]:
+        """
+        Args:
+            timing: Entry from request_timing.new_timing; connect and ttfb are only recorded
+                when the session was created with request_timing.aiohttp_trace_config()
+        """
+        import aiohttp
+
+        timing = timing if timing is not None else {}
+        # aiohttp serializes json= bodies with json.dumps and default separators
+        request_bytes = len(json.dumps(json_body).encode())
+        start_time = time.perf_counter()
+        failures = []
+        try:
+            for attempt in range(1, self.max_retries + 2):
+                timing["queue_wait"] = round(timing.get("queue_wait", 0.0) + await self.bucket.acquire_async(), 4)
+                timing["attempts"] = attempt
+                retry_after = None
+                try:
+                    async with self.session.post(self.endpoint_url, json=json_body, headers=self.headers,
+                                                 trace_request_ctx={"timing": timing}) as response:
+                        timing["status"] = response.status
+                        timing["request_bytes"] = request_bytes
+                        if response.status == 429:
+                            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                            self.bucket.on_throttled(retry_after)
+                        response.raise_for_status()
+                        timing["response_bytes"] = len(await response.read())
+                        data = await response.json(content_type=None)
+                    self.bucket.on_success()
+                    return data, failures
+                except aiohttp.ClientResponseError as e:
+                    retryable = e.status in RETRYABLE_STATUS_CODES
+                    failures.append({"attempt": attempt, "status": e.status, "error": str(e)})
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    retryable = True
+                    failures.append({"attempt": attempt, "status": None, "error": str(e) or type(e).__name__})
+                except ValueError as e:
+                    retryable = True
+                    failures.append({"attempt": attempt, "status": None, "error": f"Invalid JSON: {str(e)}"})
+
+                if not retryable or attempt > self.max_retries:
+                    break
+                delay = max(retry_after or 0.0, backoff_delay(attempt, self.base_delay, self.max_delay))
+                logger.warning(f"Attempt {attempt} failed ({failures[-1]['error']}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+            timing["error"] = failures[-1]["error"]
+            logger.error(f"Giving up on {self.endpoint_url} after {len(failures)} attempts: {failures[-1]['error']}")
+            return None, failures
+        finally:
+            timing["total"] = round(time.perf_counter() - start_time, 4)
+            timing["retries"] = max(0, timing["attempts"] - 1)
@@ -1,5 +1,5 @@
+import argparse
 import json
-import requests
 import logging
 import os
 import base64
@@ -8,6 +8,10 @@ from pathlib import Path
 from typing import Dict, Any, Optional, List
 import concurrent.futures
 
+from request_timing import export_otlp, log_run_summary, new_timing, run_timings
+from result_store import ResultStore
+from submission_client import SubmissionClient
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -15,9 +19,18 @@ logger = logging.getLogger(__name__)
 class ExamTaker:
     ROOT_PROMPT = "DoingExamNoVARK"
     
-    def __init__(self, endpoint_url: str, student_name: str = "Stuart", exam_name: str = "General Knowledge"):
-        """Initialize the ExamTaker with the endpoint URL."""
+    def __init__(self, endpoint_url: str, student_name: str = "Stuart", exam_name: str = "General Knowledge",
+                 max_in_flight: int = 1, previous_answers: Optional[List[Dict[str, Any]]] = None):
+        """
+        Initialize the ExamTaker with the endpoint URL.
+
+        Args:
+            max_in_flight: Questions of this student sent concurrently (1 sends them one after another)
+            previous_answers: Answers kept from an interrupted run; those questions are not sent again
+        """
         self.endpoint_url = endpoint_url
+        self.max_in_flight = max(1, max_in_flight)
+        self.previous_answers = {answer["position"]: answer for answer in previous_answers or []}
         self.access_token = os.getenv('ACCESS_TOKEN')
         if not self.access_token:
             raise ValueError("ACCESS_TOKEN environment variable is not set")
@@ -26,13 +39,22 @@ class ExamTaker:
         self.exam_name = exam_name
         self.answers = []
         self.wrong_answers = []
+        # Questions that got no response even after retries, and the failed attempts themselves
+        self.unanswered = []
+        self.retries = []
+        # One timing entry per question sent (see request_timing.py)
+        self.request_timings = []
+        self.client = SubmissionClient(endpoint_url, {
+            'Content-Type': 'application/json',
+            'Authorization': f'Basic {self.access_token}'
+        })
 
     def load_questions(self, json_path: str) -> None:
         """Load questions from a JSON file."""
         try:
             with open(json_path, 'r') as f:
                 self.questions = json.load(f)
-            logger.info(f"Successfully loaded {len(self.questions)} questions from {json_path}")
+            logger.info(f"Successfully loaded {len(self.questions.get('questions', []))} questions from {json_path}")
         except FileNotFoundError:
             logger.error(f"Questions file not found at {json_path}")
             raise
@@ -47,120 +69,108 @@ class ExamTaker:
         
         # Add student bot prefix
         question_text = f"@student-bot #{self.student_name}\n\n"
-        question_text += f"There are 50 questions. This is question {question_position}:\n\n{question.get('question', '')}"
+        question_text += f"There are {len(self.questions.get('questions', []))} questions. This is question {question_position}:\n\n{question.get('question', '')}"
         
         return question_text.strip()
 
     def send_question(self, question: Dict[str, Any], position: int) -> Optional[Dict[str, Any]]:
-        """Send a single question with its image to the endpoint."""
-        try:
-            # Prepare the files dictionary for image upload
-            files = {}
-            if 'image_path' in question:
-                image_path = Path(question['image_path'])
-                if image_path.exists():
-                    files['image'] = (image_path.name, open(image_path, 'rb'))
-                else:
-                    logger.warning(f"Image not found at {image_path}")
+        """Send a single question with its image to the endpoint, retrying transient failures."""
+        # Image bytes are read up front so every retry can resend them
+        files = {}
+        if 'image_path' in question:
+            image_path = Path(question['image_path'])
+            if image_path.exists():
+                files['image'] = (image_path.name, image_path.read_bytes())
+            else:
+                logger.warning(f"Image not found at {image_path}")
 
-            # Format question with context and options
-            formatted_question = self.format_question_with_options(question, position)
+        # Format question with context and options
+        formatted_question = self.format_question_with_options(question, position)
 
-            # Prepare the question data
-            data = {
-                'root_prompt': self.ROOT_PROMPT,
-                'text': formatted_question,
-                'metadata': {
-                    **question.get('metadata', {}),
-                    'position': position,
-                    'total_options': len(question.get('options', [])),
-                    'exam_name': self.exam_name
-                }
+        # Prepare the question data
+        data = {
+            'root_prompt': self.ROOT_PROMPT,
+            'text': formatted_question,
+            'metadata': {
+                **question.get('metadata', {}),
+                'position': position,
+                'total_options': len(question.get('options', [])),
+                'exam_name': self.exam_name
             }
+        }
 
-            # Prepare headers
-            access_token = os.getenv('ACCESS_TOKEN')
-            if not access_token:
-                raise ValueError("ACCESS_TOKEN environment variable is not set")
-                
-            headers = {
-                'Content-Type': 'application/json',
-                'Authorization': f'Basic {access_token}'
-            }
+        timing = new_timing(position=position)
+        response, failures = self.client.post(data, files=files or None, timing=timing)
+        self.request_timings.append(timing)
+        self.retries.extend({**failure, "position": position} for failure in failures)
+        if response is None:
+            logger.error(f"Failed to send question {position} after {len(failures)} attempts")
+        return response
 
-            # Send the request
-            response = requests.post(
-                self.endpoint_url,
-                files=files,
-                json=data,
-                headers=headers
-            )
-            response.raise_for_status()
-            
-            # Close any opened files
-            for file in files.values():
-                file[1].close()
+    def answer_question(self, question: Dict[str, Any]) -> Dict[str, Any]:
+        """Send one question and return its answer entry, without touching the shared tallies."""
+        position = question.get('metadata', {}).get('question_position', 0)
+        expected_answer = question.get('metadata', {}).get('answer')
+        entry = {"position": position, "expected": expected_answer, "actual": None, "answered": False}
 
-            return response.json()
+        if expected_answer is None:
+            logger.error(f"Failed to send question {position}")
+            return entry
+        if position in self.previous_answers:
+            return {**self.previous_answers[position], "answered": True}
 
-        except requests.RequestException as e:
-            logger.error(f"Failed to send question: {str(e)}")
-            return None
-        finally:
-            # Ensure files are closed even if an error occurs
-            for file in files.values():
-                file[1].close()
+        start_time = time.time()
+        try:
+            # Send the question and get the answer
+            result = self.send_question(question, position)
+            if result:
+                response_text = result[0].get('json', {}).get('text', '')
+                # Extract the first letter answer (A, B, C, D, or E)
+                entry["actual"] = response_text[0] if response_text else ''
+                entry["raw_response"] = response_text
+                entry["answered"] = True
+            else:
+                logger.error(f"No response received for question {position}")
+        except Exception as e:
+            logger.error(f"Failed to evaluate question {position}: {str(e)}")
+        entry["seconds"] = round(time.time() - start_time, 2)
+        return entry
 
     def process_all_questions(self) -> dict:
-        """Process all questions in the exam."""
+        """Process all questions in the exam, up to max_in_flight at a time."""
         start_time = time.time()
-        # For now, we'll hardcode the total number of questions
-        # total_questions = len(self.questions['questions'])
-        total_questions = 50
+        questions = self.questions.get('questions', [])
+        total_questions = len(questions)
         correct_answers = 0
-        
-        for question in self.questions['questions']:
-            position = question.get('metadata', {}).get('question_position', 0)
-            expected_answer = question.get('metadata', {}).get('answer')
-            
-            if expected_answer is not None:
-                try:
-                    # Send the question and get the answer
-                    result = self.send_question(question, position)
-                    if result:
-                        response_text = result[0].get('json', {}).get('text', '')
-                        # Extract the first letter answer (A, B, C, D, or E)
-                        actual_answer = response_text[0] if response_text else ''
-                        
-                        self.answers.append({
-                            "position": position,
-                            "expected": expected_answer,
-                            "actual": actual_answer
-                        })
-                        
-                        if actual_answer == expected_answer:
-                            correct_answers += 1
-                            logger.info(f"Student {self.student_name} - Question {position}: Correct! ({actual_answer})")
-                        else:
-                            self.wrong_answers.append(position)
-                            logger.warning(f"Student {self.student_name} - Question {position}: Wrong! Expected {expected_answer}, got {actual_answer}")
-                    else:
-                        logger.error(f"No response received for question {position}")
-                        self.wrong_answers.append(position)
-                except Exception as e:
-                    logger.error(f"Failed to evaluate question {position}: {str(e)}")
-                    self.wrong_answers.append(position)
+
+        if self.max_in_flight > 1:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+                entries = list(executor.map(self.answer_question, questions))
+        else:
+            entries = [self.answer_question(question) for question in questions]
+
+        # Responses arrive in any order; results are always reported in question order
+        for entry in sorted(entries, key=lambda entry: entry["position"]):
+            position = entry["position"]
+            answered = entry.pop("answered")
+            if entry["expected"] is None:
+                self.wrong_answers.append(position)
+                continue
+            if not answered:
+                self.unanswered.append(position)
+                self.wrong_answers.append(position)
+                continue
+
+            self.answers.append(entry)
+            if entry["actual"] == entry["expected"]:
+                correct_answers += 1
+                logger.info(f"Student {self.student_name} - Question {position}: Correct! ({entry['actual']})")
             else:
-                logger.error(f"Failed to send question {position}")
                 self.wrong_answers.append(position)
-            
-            # Add 5-second gap between questions
-            if position < total_questions:
-                logger.info(f"Student {self.student_name}: Question {position}: Waiting 5 seconds...")
-                time.sleep(5)
-        
+                logger.warning(f"Student {self.student_name} - Question {position}: Wrong! Expected {entry['expected']}, got {entry['actual']}")
+
         total_time = time.time() - start_time
-        score_percentage = (correct_answers / total_questions) * 100
+        score_percentage = (correct_answers / total_questions) * 100 if total_questions > 0 else 0
         
         result = {
             "total_questions": total_questions,
@@ -170,7 +180,7 @@ class ExamTaker:
             "total_time_minutes": round(total_time/60, 1)
         }
         
-        logger.info("\n=== Exam Results - Student {self.student_name} ===")
+        logger.info(f"\n=== Exam Results - Student {self.student_name} ===")
         logger.info(f"Score: {correct_answers}/{total_questions} ({score_percentage:.1f}%)")
         logger.info(f"Time taken: {total_time:.1f} seconds ({total_time/60:.1f} minutes)")
         if self.wrong_answers:
@@ -178,7 +188,14 @@ class ExamTaker:
             
         return result
 
-def process_student(endpoint_url: str, student_name: str, exam_name: str = "General Knowledge", questions_file: str = "exam_ktqt.json") -> dict:
+def process_student(endpoint_url: str, student_name: str, exam_name: str = "General Knowledge", questions_file: str = "exam_ktqt.json",
+                    max_in_flight: int = 1, previous: Optional[dict] = None) -> dict:
+    """
+    Take the exam for one student.
+
+    Args:
+        previous: Record of this student from an interrupted run; its answered questions are reused
+    """
     result = {
         "student_name": student_name,
         "exam_name": exam_name,
@@ -188,10 +205,15 @@ def process_student(endpoint_url: str, student_name: str, exam_name: str = "Gene
         "answers": [],
         "wrong_answers": [],
         "score": None,
-        "time_taken": None
+        "time_taken": None,
+        "retries": [],
+        "request_timings": []
     }
     
-    exam_taker = ExamTaker(endpoint_url, student_name, exam_name)
+    previous_answers = previous.get("answers", []) if previous else []
+    previous_retries = previous.get("retries", []) if previous else []
+    previous_timings = previous.get("request_timings", []) if previous else []
+    exam_taker = ExamTaker(endpoint_url, student_name, exam_name, max_in_flight, previous_answers)
     try:
         # Load questions from the JSON file in the same directory
         current_dir = Path(__file__).parent
@@ -213,8 +235,16 @@ def process_student(endpoint_url: str, student_name: str, exam_name: str = "Gene
             "seconds": exam_results["total_time_seconds"],
             "minutes": exam_results["total_time_minutes"]
         }
+        result["retries"] = previous_retries + exam_taker.retries
+        result["request_timings"] = previous_timings + exam_taker.request_timings
+        # Questions that failed every retry make the score meaningless, so the record is an error
+        if exam_taker.unanswered:
+            result["status"] = "error"
+            result["error"] = f"No response after retries for questions: {', '.join(map(str, exam_taker.unanswered))}"
         
     except Exception as e:
+        result["retries"] = previous_retries + exam_taker.retries
+        result["request_timings"] = previous_timings + exam_taker.request_timings
         error_msg = f"Error during exam taking process for {student_name}: {str(e)}"
         logger.error(error_msg)
         result["status"] = "error"
@@ -222,32 +252,18 @@ def process_student(endpoint_url: str, student_name: str, exam_name: str = "Gene
     
     return result
 
-def save_results(result: dict, run_timestamp: str):
-    """Save exam results to a JSON file with proper formatting."""
-    # Create filename with timestamp and exam name
-    exam_name = result.get('exam_name', 'unknown_exam')
-    filename = f"exam_results_{exam_name}_{run_timestamp}.json"
-    current_dir = Path(__file__).parent
-    output_path = current_dir / filename
-    
-    # Load existing results if file exists
-    existing_results = []
-    if output_path.exists():
-        with open(output_path, 'r') as f:
-            existing_results = json.load(f)
-    
-    # Add new result
-    existing_results.append(result)
-    
-    # Sort results by student name for better readability
-    sorted_results = sorted(existing_results, key=lambda x: x["student_name"])
-    
-    with open(output_path, 'w') as f:
-        json.dump(sorted_results, f, indent=2)
-    
-    logger.info(f"Results updated in {output_path}")
+def results_path(exam_name: str, run_timestamp: str) -> Path:
+    """Path of the exported results JSON of a run; the run's JSONL store sits next to it."""
+    return Path(__file__).parent / f"exam_results_{exam_name}_{run_timestamp}.json"
 
 def main():
+    parser = argparse.ArgumentParser(description='Take an exam with every simulated student, one request per question')
+    parser.add_argument('--resume', metavar='RUN_ID',
+                        help='Timestamp of an interrupted run; only its missing or errored students and questions are re-run')
+    parser.add_argument('--otlp', action='store_true',
+                        help='Export the request timings of the run to the OTLP collector (EXAM_OTLP_ENDPOINT)')
+    args = parser.parse_args()
+
     # Default Configuration settings
     config = {
         # API endpoint configuration
@@ -260,6 +276,8 @@ def main():
         
         # Execution configuration
         "max_workers": int(os.getenv("EXAM_MAX_WORKERS", "5")),
+        # Questions in flight per student (1 = one question at a time)
+        "questions_in_flight": int(os.getenv("EXAM_QUESTIONS_IN_FLIGHT", "5")),
         
         # Student list - can be overridden with EXAM_STUDENTS env var (comma-separated)
         "student_names": os.getenv("EXAM_STUDENTS", "").split(",") if os.getenv("EXAM_STUDENTS") else [
@@ -299,14 +317,20 @@ def main():
     # Override ExamTaker.ROOT_PROMPT with config value
     ExamTaker.ROOT_PROMPT = config["root_prompt"]
     
-    # Generate a timestamp for this run in a readable format
-    run_timestamp = time.strftime("%Y%m%d_%H%M%S")
-    logger.info(f"\n=== Starting new exam run '{config['exam_name']}' at {run_timestamp} ===\n")
+    # Generate a timestamp for this run in a readable format, or continue an interrupted one
+    run_timestamp = args.resume or time.strftime("%Y%m%d_%H%M%S")
+    store = ResultStore(results_path(config["exam_name"], run_timestamp))
+    if args.resume:
+        previous, student_names = store.resume(config["student_names"])
+        logger.info(f"\n=== Resuming exam run '{config['exam_name']}' {run_timestamp} ===\n")
+    else:
+        previous, student_names = {}, config["student_names"]
+        logger.info(f"\n=== Starting new exam run '{config['exam_name']}' at {run_timestamp} ===\n")
     
     # Determine max workers (limit by configuration and number of students)
-    max_workers = min(len(config["student_names"]), config["max_workers"])
+    max_workers = max(1, min(len(student_names), config["max_workers"]))
     
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+    with store, concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
         # Create a list of futures
         future_to_student = {
             executor.submit(
@@ -314,9 +338,11 @@ def main():
                 config["endpoint_url"], 
                 student_name, 
                 config["exam_name"],
-                config["questions_file"]
+                config["questions_file"],
+                config["questions_in_flight"],
+                previous.get(student_name)
             ): student_name
-            for student_name in config["student_names"]
+            for student_name in student_names
         }
         
         # Save results as they complete
@@ -326,7 +352,7 @@ def main():
                 result = future.result()
                 logger.info(f"Completed exam for {student_name}")
                 # Save result immediately after student completes
-                save_results(result, run_timestamp)
+                store.append(result)
             except Exception as e:
                 logger.error(f"Unexpected error for {student_name}: {str(e)}")
                 error_result = {
@@ -339,8 +365,13 @@ def main():
                     "wrong_answers": []
                 }
                 # Save error result immediately
-                save_results(error_result, run_timestamp)
+                store.append(error_result)
     
+    # Sorted JSON and CSV in the usual formats, built from the store
+    records = store.export()
+    log_run_summary(f"{config['exam_name']} {run_timestamp}", records)
+    if args.otlp:
+        export_otlp(run_timings(records), {"runner": "per_question", "exam_name": config["exam_name"], "run": run_timestamp})
     logger.info(f"\n=== Completed exam run {run_timestamp} ===\n")
 
 if __name__ == "__main__":
@@ -0,0 +1,207 @@
+import argparse
+import asyncio
+import logging
+import os
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import aiohttp
+
+from request_timing import aiohttp_trace_config, export_otlp, log_run_summary, new_timing, run_timings
+from result_store import ResultStore
+from submission_client import AsyncSubmissionClient, SubmissionError, get_bucket
+from taking_exam_requests import (
+    DEFAULT_STUDENT_NAMES,
+    ExamTakerRequests,
+    fill_student_result,
+    new_student_result,
+    results_path,
+)
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class Progress:
+    """Logs a one-line progress summary every time a student finishes."""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.done = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.start_time = time.time()
+
+    def started(self) -> None:
+        self.in_flight += 1
+
+    def finished(self, result: dict) -> None:
+        self.in_flight -= 1
+        self.done += 1
+        if result.get("status") == "error":
+            self.errors += 1
+        elapsed = time.time() - self.start_time
+        rate = self.done / elapsed * 60 if elapsed > 0 else 0.0
+        logger.info(
+            f"Progress: {self.done}/{self.total} students done, {self.errors} errors, "
+            f"{self.in_flight} in flight, {rate:.1f} students/min, {elapsed:.0f}s elapsed"
+        )
+
+
+class AsyncExamRunner:
+    def __init__(self, endpoint_url: str, exam_name: str, questions_file: str,
+                 max_concurrency: int = 100, rate_limit: Optional[float] = None, request_timeout: float = 900.0):
+        """
+        Args:
+            endpoint_url: Webhook that answers the whole exam in one request
+            exam_name: Name written into every result record
+            questions_file: Exam JSON file, relative to this directory
+            max_concurrency: Maximum number of students with a request in flight
+            rate_limit: Starting requests per second per endpoint; lowered on 429s (0 disables the steady limit,
+                None uses EXAM_RATE_LIMIT as the sync runners do)
+            request_timeout: Seconds before a single request is abandoned
+        """
+        self.endpoint_url = endpoint_url
+        self.exam_name = exam_name
+        self.questions_path = str(Path(__file__).parent / questions_file)
+        self.max_concurrency = max_concurrency
+        self.request_timeout = request_timeout
+        self.bucket = get_bucket(endpoint_url, rate_limit)
+        self.rate_limit = self.bucket.max_rate
+
+    async def send_all_questions(self, session: aiohttp.ClientSession,
+                                 exam_taker: ExamTakerRequests) -> Optional[List]:
+        """Async counterpart of ExamTakerRequests.send_all_questions."""
+        logger.info(f"Sending all questions for student {exam_taker.student_name}...")
+        client = AsyncSubmissionClient(session, exam_taker.endpoint_url, exam_taker.request_headers(), self.bucket)
+        timing = new_timing()
+        response, failures = await client.post(exam_taker.build_all_questions_payload(), timing=timing)
+        exam_taker.request_timings.append(timing)
+        exam_taker.retries.extend(failures)
+        if response is None:
+            logger.error(f"Failed to send questions for {exam_taker.student_name} after {len(failures)} attempts")
+        return response
+
+    async def process_student(self, session: aiohttp.ClientSession, student_name: str) -> dict:
+        """Same result schema as taking_exam_requests.process_student."""
+        result = new_student_result(student_name, self.exam_name)
+        exam_taker = None
+        try:
+            exam_taker = ExamTakerRequests(self.endpoint_url, student_name, self.exam_name)
+            exam_taker.load_questions(self.questions_path)
+
+            start_time = time.time()
+            response = await self.send_all_questions(session, exam_taker)
+            if response is None:
+                raise SubmissionError(exam_taker.retries)
+            exam_results = exam_taker.score_response(response, start_time)
+            fill_student_result(result, exam_taker, exam_results)
+        except Exception as e:
+            if exam_taker is not None:
+                result["retries"] = exam_taker.retries
+                result["request_timings"] = exam_taker.request_timings
+            error_msg = f"Error during exam taking process for {student_name}: {str(e)}"
+            logger.error(error_msg)
+            result["status"] = "error"
+            result["error"] = error_msg
+        return result
+
+    async def run(self, student_names: List[str], run_timestamp: str, resume: bool = False) -> List[dict]:
+        """
+        Run every student concurrently over one shared connection pool and save results as they finish.
+
+        With resume=True, students that already completed in the run's result store are skipped.
+        """
+        store = ResultStore(results_path(self.exam_name, run_timestamp))
+        if resume:
+            _, student_names = store.resume(student_names)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        progress = Progress(len(student_names))
+        results = []
+
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency, limit_per_host=self.max_concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.request_timeout)
+        # Connect and time-to-first-byte of every request go into its timing entry
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                         trace_configs=[aiohttp_trace_config()]) as session:
+            async def run_student(student_name: str) -> None:
+                async with semaphore:
+                    progress.started()
+                    result = await self.process_student(session, student_name)
+                progress.finished(result)
+                results.append(result)
+                # Queued for the store's writer thread; never blocks the event loop
+                store.append(result)
+
+            with store:
+                await asyncio.gather(*(run_student(student_name) for student_name in student_names))
+        records = await asyncio.get_running_loop().run_in_executor(None, store.export)
+        log_run_summary(f"{self.exam_name} {run_timestamp}", records)
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Take an exam with every simulated student concurrently')
+    parser.add_argument('--resume', metavar='RUN_ID',
+                        help='Timestamp of an interrupted run; only its missing or errored students are re-run')
+    parser.add_argument('--otlp', action='store_true',
+                        help='Export the request timings of the run to the OTLP collector (EXAM_OTLP_ENDPOINT)')
+    args = parser.parse_args()
+
+    # Default Configuration settings
+    config = {
+        # API endpoint configuration
+        "endpoint_url": os.getenv("EXAM_ENDPOINT_URL", "https://n8n.khiemfle.com/webhook/139644a9-2fd6-4c59-ba4a-ecf406da70bb"),
+        "root_prompt": os.getenv("EXAM_ROOT_PROMPT", "DoingExamNoVARKAllTests"),
+
+        # Exam configuration
+        "exam_name": os.getenv("EXAM_NAME", "ktqt_gemini_2_v1.1"),
+        "questions_file": os.getenv("EXAM_QUESTIONS_FILE", "exam_ktqt.json"),
+
+        # Execution configuration
+        "max_concurrency": int(os.getenv("EXAM_MAX_CONCURRENCY", "100")),
+        # EXAM_RATE_LIMIT, with the same default as the sync runners (applied by get_bucket)
+        "rate_limit": None,
+        "request_timeout": float(os.getenv("EXAM_REQUEST_TIMEOUT", "900")),
+
+        # Student list - can be overridden with EXAM_STUDENTS env var (comma-separated)
+        "student_names": os.getenv("EXAM_STUDENTS", "").split(",") if os.getenv("EXAM_STUDENTS") else DEFAULT_STUDENT_NAMES
+    }
+
+    # Filter out empty student names (in case of trailing comma in env var)
+    config["student_names"] = [name.strip() for name in config["student_names"] if name.strip()]
+
+    # Log configuration for debugging
+    logger.info("Starting with configuration:")
+    for key, value in config.items():
+        if key == "student_names":
+            logger.info(f"  {key}: {len(value)} students")
+        else:
+            logger.info(f"  {key}: {value}")
+
+    # Override ExamTakerRequests.ROOT_PROMPT with config value
+    ExamTakerRequests.ROOT_PROMPT = config["root_prompt"]
+
+    # Generate a timestamp for this run in a readable format, or continue an interrupted one
+    run_timestamp = args.resume or time.strftime("%Y%m%d_%H%M%S")
+    logger.info(f"\n=== {'Resuming' if args.resume else 'Starting new'} exam run '{config['exam_name']}' at {run_timestamp} ===\n")
+
+    runner = AsyncExamRunner(
+        config["endpoint_url"],
+        config["exam_name"],
+        config["questions_file"],
+        max_concurrency=config["max_concurrency"],
+        rate_limit=config["rate_limit"],
+        request_timeout=config["request_timeout"]
+    )
+    results = asyncio.run(runner.run(config["student_names"], run_timestamp, resume=bool(args.resume)))
+    if args.otlp:
+        export_otlp(run_timings(results), {"runner": "async", "exam_name": config["exam_name"], "run": run_timestamp})
+
+    logger.info(f"\n=== Completed exam run {run_timestamp} ===\n")
+
+
+if __name__ == "__main__":
+    main()
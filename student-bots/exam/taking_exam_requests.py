@@ -1,5 +1,5 @@
+import argparse
 import json
-import requests
 import logging
 import os
 import time
@@ -7,6 +7,11 @@ from pathlib import Path
 from typing import Dict, Any, Optional, List
 import concurrent.futures
 
+from answer_parser import parser_for_exam
+from request_timing import export_otlp, log_run_summary, new_timing, run_timings
+from result_store import ResultStore
+from submission_client import SubmissionClient, SubmissionError
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -25,12 +30,22 @@ class ExamTakerRequests:
         self.exam_name = exam_name
         self.answers = []
         self.wrong_answers = []
+        # Failed attempts that were retried (or given up on), written into the result record
+        self.retries = []
+        # One timing entry per request sent (see request_timing.py)
+        self.request_timings = []
+        self.client = SubmissionClient(endpoint_url, self.request_headers())
+        self.answer_parser = None
+        # Raw model output and the answer format it was parsed with, kept for parser regressions
+        self.raw_response = None
+        self.parse_strategy = None
 
     def load_questions(self, json_path: str) -> None:
         """Load questions from a JSON file."""
         try:
             with open(json_path, 'r') as f:
                 self.questions_data = json.load(f)
+            self.answer_parser = parser_for_exam(str(json_path), self.questions_data.get('questions', []))
             logger.info(f"Successfully loaded questions from {json_path}")
         except FileNotFoundError:
             logger.error(f"Questions file not found at {json_path}")
@@ -51,61 +66,38 @@ class ExamTakerRequests:
         return question_text.strip()
 
     def send_question(self, question: Dict[str, Any], position: int) -> Optional[Dict[str, Any]]:
-        """Send a single question with its image to the endpoint."""
-        try:
-            # Prepare the files dictionary for image upload
-            files = {}
-            if 'image_path' in question:
-                image_path = Path(question['image_path'])
-                if image_path.exists():
-                    files['image'] = (image_path.name, open(image_path, 'rb'))
-                else:
-                    logger.warning(f"Image not found at {image_path}")
-
-            # Format question
-            formatted_question = self.format_question(question, position)
+        """Send a single question with its image to the endpoint, retrying transient failures."""
+        # Image bytes are read up front so every retry can resend them
+        files = {}
+        if 'image_path' in question:
+            image_path = Path(question['image_path'])
+            if image_path.exists():
+                files['image'] = (image_path.name, image_path.read_bytes())
+            else:
+                logger.warning(f"Image not found at {image_path}")
 
-            # Prepare the question data
-            data = {
-                'root_prompt': self.ROOT_PROMPT,
-                'text': formatted_question,
-                'metadata': {
-                    **question.get('metadata', {}),
-                    'position': position,
-                    'total_options': len(question.get('options', [])),
-                    'exam_name': self.exam_name
-                }
-            }
+        # Format question
+        formatted_question = self.format_question(question, position)
 
-            # Prepare headers
-            headers = {
-                'Content-Type': 'application/json',
-                'Authorization': f'Basic {self.access_token}'
+        # Prepare the question data
+        data = {
+            'root_prompt': self.ROOT_PROMPT,
+            'text': formatted_question,
+            'metadata': {
+                **question.get('metadata', {}),
+                'position': position,
+                'total_options': len(question.get('options', [])),
+                'exam_name': self.exam_name
             }
+        }
 
-            # Send the request
-            response = requests.post(
-                self.endpoint_url,
-                files=files,
-                json=data,
-                headers=headers
-            )
-            response.raise_for_status()
-            
-            # Close any opened files
-            for file in files.values():
-                file[1].close()
-
-            return response.json()
-
-        except requests.RequestException as e:
-            logger.error(f"Failed to send question: {str(e)}")
-            return None
-        finally:
-            # Ensure files are closed even if an error occurs
-            for file in files.values():
-                if hasattr(file, 'close'):
-                    file[1].close()
+        timing = new_timing(position=position)
+        response, failures = self.client.post(data, files=files or None, timing=timing)
+        self.request_timings.append(timing)
+        self.retries.extend({**failure, "position": position} for failure in failures)
+        if response is None:
+            logger.error(f"Failed to send question {position} after {len(failures)} attempts")
+        return response
 
     def format_all_questions(self) -> str:
         """Format all questions into a single text with the student prefix."""
@@ -124,105 +116,43 @@ class ExamTakerRequests:
         
         return formatted_text.strip()
 
-    def send_all_questions(self) -> Optional[Dict[str, Any]]:
-        """Send all questions in a single request to the endpoint."""
-        try:
-            # Format all questions together
-            formatted_questions = self.format_all_questions()
-
-            # Prepare the question data
-            data = {
-                'root_prompt': self.ROOT_PROMPT,
-                'text': formatted_questions,
-                'metadata': {
-                    'exam_name': self.exam_name,
-                    'total_questions': len(self.questions_data.get('questions', [])),
-                    'student_name': self.student_name
-                }
+    def build_all_questions_payload(self) -> Dict[str, Any]:
+        """Build the JSON body that sends all questions in a single request."""
+        return {
+            'root_prompt': self.ROOT_PROMPT,
+            'text': self.format_all_questions(),
+            'metadata': {
+                'exam_name': self.exam_name,
+                'total_questions': len(self.questions_data.get('questions', [])),
+                'student_name': self.student_name
             }
+        }
 
-            # Prepare headers
-            headers = {
-                'Content-Type': 'application/json',
-                'Authorization': f'Basic {self.access_token}'
-            }
-
-            # Send the request
-            logger.info(f"Sending all questions for student {self.student_name}...")
-            response = requests.post(
-                self.endpoint_url,
-                json=data,
-                headers=headers
-            )
-            response.raise_for_status()
-
-            return response.json()
+    def request_headers(self) -> Dict[str, str]:
+        return {
+            'Content-Type': 'application/json',
+            'Authorization': f'Basic {self.access_token}'
+        }
 
-        except requests.RequestException as e:
-            logger.error(f"Failed to send questions: {str(e)}")
-            return None
+    def send_all_questions(self) -> Optional[Dict[str, Any]]:
+        """Send all questions in a single request to the endpoint, retrying transient failures."""
+        logger.info(f"Sending all questions for student {self.student_name}...")
+        timing = new_timing()
+        response, failures = self.client.post(self.build_all_questions_payload(), timing=timing)
+        self.request_timings.append(timing)
+        self.retries.extend(failures)
+        if response is None:
+            logger.error(f"Failed to send questions for {self.student_name} after {len(failures)} attempts")
+        return response
 
     def parse_answers(self, response_text: str) -> List[str]:
-        """Parse the response text to extract letter answers."""
-        # First check if the response is a comma-separated list of answers
-        import re
-        
-        # Clean the response text of any leading/trailing whitespace
-        clean_text = response_text.strip()
-        
-        # Try to match a comma-separated list of single letters (A-E)
-        csv_pattern = re.compile(r'^([A-E],\s*)+[A-E]$')
-        if csv_pattern.match(clean_text):
-            # Split by comma and clean each answer
-            answers = [ans.strip() for ans in clean_text.split(',')]
-            logger.info(f"Parsed {len(answers)} answers from comma-separated list")
-            return answers
-        
-        # Try to match a list of single letters with no commas (like "ABCDE")
-        if all(c in 'ABCDE' for c in clean_text) and len(clean_text) > 0:
-            answers = list(clean_text)
-            logger.info(f"Parsed {len(answers)} answers from continuous string of letters")
-            return answers
-        
-        # Try to extract answers in format like "1. A", "2. B", etc.
-        answer_pattern = re.compile(r'(?:^|\n)(\d+)[.:)] *([A-E])', re.MULTILINE)
-        matches = answer_pattern.findall(response_text)
-        
-        if matches:
-            # Create a dictionary to hold question number -> answer
-            answer_dict = {int(q): a for q, a in matches}
-            
-            # Get all questions from the original data
-            questions = self.questions_data.get('questions', [])
-            answers = []
-            
-            for i, question in enumerate(questions):
-                position = question.get('metadata', {}).get('question_position', i+1)
-                if position in answer_dict:
-                    answers.append(answer_dict[position])
-                else:
-                    # If we can't find an answer for this position, add None
-                    answers.append(None)
-            
-            logger.info(f"Parsed {len(answers)} answers from numbered format")
-            return answers
-        
-        # Fallback: try to extract answers from each line
-        lines = response_text.strip().split('\n')
-        answers = []
-        
-        for line in lines:
-            line = line.strip()
-            if line and len(line) >= 1 and line[0] in 'ABCDE':
-                answers.append(line[0])
-        
+        """Parse the response text to extract letter answers, remembering which format matched."""
+        answers, self.parse_strategy = self.answer_parser.parse(response_text)
         if answers:
-            logger.info(f"Parsed {len(answers)} answers from line-by-line format")
-            return answers
-            
-        # If nothing worked, log a warning and return empty list
-        logger.warning(f"Could not parse answers from response: {response_text[:100]}...")
-        return []
+            logger.info(f"Parsed {len(answers)} answers using the {self.parse_strategy} format")
+        else:
+            logger.warning(f"Could not parse answers from response: {response_text[:100]}...")
+        return answers
 
     def take_exam(self) -> dict:
         """Process all questions in a single request."""
@@ -230,15 +160,23 @@ class ExamTakerRequests:
             raise ValueError("Questions not loaded. Call load_questions() first.")
             
         start_time = time.time()
+        
+        # Send all questions at once. A request that failed every retry is an error,
+        # not a 0% score
+        result = self.send_all_questions()
+        if result is None:
+            raise SubmissionError(self.retries)
+        return self.score_response(result, start_time)
+
+    def score_response(self, result: Optional[Any], start_time: float) -> dict:
+        """Grade the endpoint response against the expected answers and summarise the exam."""
         questions = self.questions_data.get('questions', [])
         total_questions = len(questions)
         correct_answers = 0
         
-        # Send all questions at once
-        result = self.send_all_questions()
-        
         if result:
             response_text = result[0].get('json', {}).get('text', '')
+            self.raw_response = response_text
             logger.info(f"Received response for student {self.student_name}")
             
             # Parse the answers from the response
@@ -293,8 +231,9 @@ class ExamTakerRequests:
             
         return result
 
-def process_student(endpoint_url: str, student_name: str, exam_name: str, questions_file: str) -> dict:
-    result = {
+def new_student_result(student_name: str, exam_name: str) -> dict:
+    """Empty result record in the schema written to the results file."""
+    return {
         "student_name": student_name,
         "exam_name": exam_name,
         "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
@@ -303,8 +242,32 @@ def process_student(endpoint_url: str, student_name: str, exam_name: str, questi
         "answers": [],
         "wrong_answers": [],
         "score": None,
-        "time_taken": None
+        "time_taken": None,
+        "retries": [],
+        "request_timings": []
+    }
+
+def fill_student_result(result: dict, exam_taker: ExamTakerRequests, exam_results: dict) -> dict:
+    """Copy the answers and scores of a finished exam into its result record."""
+    result["answers"] = exam_taker.answers
+    result["wrong_answers"] = sorted(exam_taker.wrong_answers) if exam_taker.wrong_answers else []
+    result["score"] = {
+        "total_questions": exam_results["total_questions"],
+        "correct_answers": exam_results["correct_answers"],
+        "percentage": exam_results["score_percentage"]
+    }
+    result["time_taken"] = {
+        "seconds": exam_results["total_time_seconds"],
+        "minutes": exam_results["total_time_minutes"]
     }
+    result["retries"] = exam_taker.retries
+    result["request_timings"] = exam_taker.request_timings
+    result["raw_response"] = exam_taker.raw_response
+    result["parse_strategy"] = exam_taker.parse_strategy
+    return result
+
+def process_student(endpoint_url: str, student_name: str, exam_name: str, questions_file: str) -> dict:
+    result = new_student_result(student_name, exam_name)
     
     exam_taker = ExamTakerRequests(endpoint_url, student_name, exam_name)
     try:
@@ -317,19 +280,11 @@ def process_student(endpoint_url: str, student_name: str, exam_name: str, questi
         exam_results = exam_taker.take_exam()
         
         # Capture results
-        result["answers"] = exam_taker.answers
-        result["wrong_answers"] = sorted(exam_taker.wrong_answers) if exam_taker.wrong_answers else []
-        result["score"] = {
-            "total_questions": exam_results["total_questions"],
-            "correct_answers": exam_results["correct_answers"],
-            "percentage": exam_results["score_percentage"]
-        }
-        result["time_taken"] = {
-            "seconds": exam_results["total_time_seconds"],
-            "minutes": exam_results["total_time_minutes"]
-        }
+        fill_student_result(result, exam_taker, exam_results)
         
     except Exception as e:
+        result["retries"] = exam_taker.retries
+        result["request_timings"] = exam_taker.request_timings
         error_msg = f"Error during exam taking process for {student_name}: {str(e)}"
         logger.error(error_msg)
         result["status"] = "error"
@@ -337,31 +292,39 @@ def process_student(endpoint_url: str, student_name: str, exam_name: str, questi
     
     return result
 
-def save_results(result: dict, run_timestamp: str):
-    """Save exam results to a JSON file with proper formatting."""
-    # Create filename with timestamp
-    filename = f"exam_results_requests_{result['exam_name'].replace(' ', '_')}_{run_timestamp}.json"
-    current_dir = Path(__file__).parent
-    output_path = current_dir / filename
-    
-    # Load existing results if file exists
-    existing_results = []
-    if output_path.exists():
-        with open(output_path, 'r') as f:
-            existing_results = json.load(f)
-    
-    # Add new result
-    existing_results.append(result)
-    
-    # Sort results by student name for better readability
-    sorted_results = sorted(existing_results, key=lambda x: x["student_name"])
-    
-    with open(output_path, 'w') as f:
-        json.dump(sorted_results, f, indent=2)
-    
-    logger.info(f"Results updated in {output_path}")
+def results_path(exam_name: str, run_timestamp: str) -> Path:
+    """Path of the exported results JSON of a run; the run's JSONL store sits next to it."""
+    return Path(__file__).parent / f"exam_results_requests_{exam_name.replace(' ', '_')}_{run_timestamp}.json"
+
+# Full list of simulated students, overridable with EXAM_STUDENTS (comma-separated)
+DEFAULT_STUDENT_NAMES = [
+    "Ethan-15","Olivia-19","James-23","Sophia-27","Emily-31","Benjamin-35","Ava-39","Daniel-43",
+    "William-47","Matthew-51","Charlotte-55","Isabella-59","Noah-63","Alexander-13","Henry-17",
+    "Jack-21","Amelia-25","Lucas-29","Harper-33","Lily-37","Grace-41","Nathan-45","Jacob-49",
+    "Ella-53","Scarlett-57","Violet-61","Samuel-16","Hazel-20","Madison-24","Oliver-28",
+    "Riley-32","Natalie-36","Connor-40","Elijah-44","Ryan-48","Zachary-52","Zoe-56",
+    "Hannah-60","Evelyn-14","Layla-18","Caleb-22","Dylan-26","Aria-30","Nora-34","Audrey-38",
+    "Stella-42","Leo-46","Owen-50","Penelope-54","Ruby-58","Bella-62",
+    "Brown-64", "Moore-65", "Lewis-66", "Rodriguez-67", "Gonzalez-68",
+    "Garcia-69", "Anderson-70", "Martin-71", "Perez-72", "Young-73",
+    "Ramirez-74", "Hill-75", "Nguyen-76", "Taylor-77", "Scott-78",
+    "Thomas-79", "Ramirez-80", "Allen-81", "Davis-82", "Harris-83",
+    "Thompson-84", "Lewis-85", "Lee-86", "Sanchez-87", "Wright-88",
+    "Lopez-89", "Hill-90", "Martin-91", "Harris-92", "Taylor-93",
+    "Johnson-94", "Williams-95", "Moore-96", "Thompson-97", "Scott-98",
+    "Ramirez-99", "Thompson-100", "Walker-101", "Hernandez-102", "Nguyen-103",
+    "Wright-104", "Johnson-105", "Flores-106", "Miller-107", "Johnson-108",
+    "Hernandez-109", "Allen-110"
+]
 
 def main():
+    parser = argparse.ArgumentParser(description='Take an exam with every simulated student, all questions in one request')
+    parser.add_argument('--resume', metavar='RUN_ID',
+                        help='Timestamp of an interrupted run; only its missing or errored students are re-run')
+    parser.add_argument('--otlp', action='store_true',
+                        help='Export the request timings of the run to the OTLP collector (EXAM_OTLP_ENDPOINT)')
+    args = parser.parse_args()
+
     # Default Configuration settings
     config = {
         # API endpoint configuration
@@ -376,27 +339,7 @@ def main():
         "max_workers": int(os.getenv("EXAM_MAX_WORKERS", "1")),
         
         # Student list - can be overridden with EXAM_STUDENTS env var (comma-separated)
-        "student_names": os.getenv("EXAM_STUDENTS", "").split(",") if os.getenv("EXAM_STUDENTS") else 
-        [
-            # Full list of students
-            "Ethan-15","Olivia-19","James-23","Sophia-27","Emily-31","Benjamin-35","Ava-39","Daniel-43",
-            "William-47","Matthew-51","Charlotte-55","Isabella-59","Noah-63","Alexander-13","Henry-17",
-            "Jack-21","Amelia-25","Lucas-29","Harper-33","Lily-37","Grace-41","Nathan-45","Jacob-49",
-            "Ella-53","Scarlett-57","Violet-61","Samuel-16","Hazel-20","Madison-24","Oliver-28",
-            "Riley-32","Natalie-36","Connor-40","Elijah-44","Ryan-48","Zachary-52","Zoe-56",
-            "Hannah-60","Evelyn-14","Layla-18","Caleb-22","Dylan-26","Aria-30","Nora-34","Audrey-38",
-            "Stella-42","Leo-46","Owen-50","Penelope-54","Ruby-58","Bella-62",
-            "Brown-64", "Moore-65", "Lewis-66", "Rodriguez-67", "Gonzalez-68",
-            "Garcia-69", "Anderson-70", "Martin-71", "Perez-72", "Young-73",
-            "Ramirez-74", "Hill-75", "Nguyen-76", "Taylor-77", "Scott-78",
-            "Thomas-79", "Ramirez-80", "Allen-81", "Davis-82", "Harris-83",
-            "Thompson-84", "Lewis-85", "Lee-86", "Sanchez-87", "Wright-88",
-            "Lopez-89", "Hill-90", "Martin-91", "Harris-92", "Taylor-93",
-            "Johnson-94", "Williams-95", "Moore-96", "Thompson-97", "Scott-98",
-            "Ramirez-99", "Thompson-100", "Walker-101", "Hernandez-102", "Nguyen-103",
-            "Wright-104", "Johnson-105", "Flores-106", "Miller-107", "Johnson-108",
-            "Hernandez-109", "Allen-110"
-        ]
+        "student_names": os.getenv("EXAM_STUDENTS", "").split(",") if os.getenv("EXAM_STUDENTS") else DEFAULT_STUDENT_NAMES
         # [
         #     # Default list of students
         #     "Ethan-15"
@@ -421,14 +364,20 @@ def main():
     # Override ExamTaker.ROOT_PROMPT with config value
     ExamTakerRequests.ROOT_PROMPT = config["root_prompt"]
     
-    # Generate a timestamp for this run in a readable format
-    run_timestamp = time.strftime("%Y%m%d_%H%M%S")
-    logger.info(f"\n=== Starting new exam run '{config['exam_name']}' at {run_timestamp} ===\n")
+    # Generate a timestamp for this run in a readable format, or continue an interrupted one
+    run_timestamp = args.resume or time.strftime("%Y%m%d_%H%M%S")
+    store = ResultStore(results_path(config["exam_name"], run_timestamp))
+    if args.resume:
+        _, student_names = store.resume(config["student_names"])
+        logger.info(f"\n=== Resuming exam run '{config['exam_name']}' {run_timestamp} ===\n")
+    else:
+        student_names = config["student_names"]
+        logger.info(f"\n=== Starting new exam run '{config['exam_name']}' at {run_timestamp} ===\n")
     
     # Determine max workers (limit by configuration and number of students)
-    max_workers = min(len(config["student_names"]), config["max_workers"])
+    max_workers = max(1, min(len(student_names), config["max_workers"]))
     
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+    with store, concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
         # Create a list of futures
         future_to_student = {
             executor.submit(
@@ -438,7 +387,7 @@ def main():
                 config["exam_name"],
                 config["questions_file"]
             ): student_name
-            for student_name in config["student_names"]
+            for student_name in student_names
         }
         
         # Save results as they complete
@@ -448,7 +397,7 @@ def main():
                 result = future.result()
                 logger.info(f"Completed exam for {student_name}")
                 # Save result immediately after student completes
-                save_results(result, run_timestamp)
+                store.append(result)
             except Exception as e:
                 logger.error(f"Unexpected error for {student_name}: {str(e)}")
                 error_result = {
@@ -461,8 +410,13 @@ def main():
                     "wrong_answers": []
                 }
                 # Save error result immediately
-                save_results(error_result, run_timestamp)
+                store.append(error_result)
     
+    # Sorted JSON and CSV in the usual formats, built from the store
+    records = store.export()
+    log_run_summary(f"{config['exam_name']} {run_timestamp}", records)
+    if args.otlp:
+        export_otlp(run_timings(records), {"runner": "requests", "exam_name": config["exam_name"], "run": run_timestamp})
     logger.info(f"\n=== Completed exam run {run_timestamp} ===\n")
 
 if __name__ == "__main__":
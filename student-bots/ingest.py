@@ -1,14 +1,19 @@
 from flask import Flask, request, jsonify
 from werkzeug.utils import secure_filename
 import os
-from langchain_community.document_loaders.llmsherpa import LLMSherpaFileLoader
-from langchain_community.document_loaders import UnstructuredPowerPointLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
-from qdrant_client import QdrantClient
 from qdrant_client.http import models as rest
-from langchain_qdrant import Qdrant
 import concurrent.futures
+import time
+import uuid
+from model_registry import registry
+from qdrant_pool import get_client
+from embedding_pipeline import EmbeddingCache, EmbeddingPipeline
+from ingest_manifest import IngestManifest, file_hash, point_ids, stale_point_ids
+from collection_routing import ensure_collection, file_key as upload_file_key, routing_metadata
+from ingest_jobs import IngestJobQueue
+from pdf_parsing import iter_pdf_ranges, load_pdf
+from pptx_parsing import load_pptx
+from chunking import chunk_documents
 
 # Configure upload folder
 UPLOAD_FOLDER = 'tmp/uploads'
@@ -18,7 +23,10 @@ if not os.path.exists(UPLOAD_FOLDER):
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
-llmsherpa_api_url = "http://llmsherpa.service.consul:15001/api/parseDocument?renderFormat=all"
+# Processed uploads are moved here (or deleted when INGEST_ARCHIVE_UPLOADS=false)
+ARCHIVE_FOLDER = os.path.join(UPLOAD_FOLDER, 'archive')
+ARCHIVE_UPLOADS = os.getenv("INGEST_ARCHIVE_UPLOADS", "true").lower() in ("1", "true", "yes")
+
 qdrant_url = "http://qdrant.service.consul:16333"
 qdrant_api_key = "qdrant"
 embedding_model_name = "BAAI/bge-base-en-v1.5"
@@ -27,61 +35,79 @@ collection_prefix = "student_bots"
 model_name_HuggingFace_768 = "sentence-transformers/all-mpnet-base-v2"
 # ollama_embedding_model_name = "chroma/all-minilm-l6-v2-f32"
 ollama_embedding_model_name = "nomic-embed-text"
+ingest_timeout_seconds = int(os.getenv("QDRANT_INGEST_TIMEOUT_SECONDS", "120"))
+# collection_name = "student-bots-pdf-20250112"
+# collection_name = "student-bots-pdf-20250216"
+# collection_name = "student-bots-ollama-pdf-20250216"
+collection_name = "student-bots-ollama-pdf-vimo-20250316"
+
+manifest = IngestManifest()
 
 # Supported file extensions
 SUPPORTED_EXTENSIONS = ['.pdf', '.pptx']
 
 def get_embedding_HuggingFace(model_name):
-    model_kwargs = {'device': 'cpu'}
-    encode_kwargs = {'normalize_embeddings': False}
-    embeddings = HuggingFaceEmbeddings(
-        model_name=model_name,
-        model_kwargs=model_kwargs,
-        encode_kwargs=encode_kwargs
-    )
-    return embeddings
+    return registry.get_embeddings(model_name, provider="huggingface")
 
 def get_embedding_Ollama(model_name):
-    from langchain_community.embeddings import OllamaEmbeddings
-    embeddings = OllamaEmbeddings(
-        model=model_name,
-        base_url="http://192.168.0.108:11434"  # Update with your Ollama service URL
-    )
-    return embeddings
-
-def store_to_qdrant(docs, embeddings, metadata):
-    client = QdrantClient(url=qdrant_url, api_key=qdrant_api_key)
-    # collection_name = "student-bots-pdf-20250112"
-    # collection_name = "student-bots-pdf-20250216"
-    # collection_name = "student-bots-ollama-pdf-20250216"
-    collection_name = "student-bots-ollama-pdf-vimo-20250316"
-
-    # Check if collection exists, if not, create it
-    collections = client.get_collections().collections
-    if not any(collection.name == collection_name for collection in collections):
-        client.create_collection(
-            collection_name=collection_name,
-            vectors_config=rest.VectorParams(size=embedding_dimension, distance=rest.Distance.COSINE),
-        )
+    return registry.get_embeddings(model_name, provider="ollama")
 
-    qdrant = Qdrant(
-        client=client,
-        collection_name=collection_name,
-        embeddings=embeddings,
+def get_embedding_pipeline():
+    """Embedding stage shared by every file of an ingestion run (batched, cached on disk)"""
+    return EmbeddingPipeline(
+        get_embedding_Ollama(ollama_embedding_model_name),
+        ollama_embedding_model_name,
+        cache=EmbeddingCache()
     )
 
+def store_to_qdrant(docs, vectors, metadata, file_key, content_hash):
+    """
+    Replace the points of one file in the collection
+    Chunks get deterministic IDs from (file_key, content_hash, chunk index), so re-running the
+    same file overwrites its points instead of duplicating them, and two files with the same
+    content keep separate points. Points left over from a previous version of the file are
+    deleted afterwards.
+    """
+    client = get_client(qdrant_url, qdrant_api_key, timeout=ingest_timeout_seconds)
+    # Created with payload indexes on student_id/lecture_id/file_id, which the QA retrievers filter on
+    ensure_collection(client, collection_name, embedding_dimension)
+
     # Add metadata to each document
     for doc in docs:
-        doc.metadata.update({
-            'file_id': metadata['id'],
-            'lecture_id': metadata['lecture_id'],
-            'student_id': metadata['student_id'],
-            'filename': metadata['filename']
-        })
-    
-    # Add documents regardless of collection status
-    qdrant.add_documents(docs)
-    print(f"Added {len(docs)} documents to collection {collection_name}")
+        doc.metadata.update(routing_metadata(metadata, content_hash))
+
+    # Vectors are precomputed by the embedding pipeline; the payload layout matches
+    # langchain_qdrant so the retrievers read these points unchanged
+    points = [
+        rest.PointStruct(
+            id=point_id,
+            vector=vector,
+            payload={'page_content': doc.page_content, 'metadata': doc.metadata}
+        )
+        for point_id, doc, vector in zip(point_ids(content_hash, len(docs), scope=file_key), docs, vectors)
+    ]
+    for start in range(0, len(points), 256):
+        client.upsert(collection_name=collection_name, points=points[start:start + 256])
+
+    stale_ids = stale_point_ids(manifest.get(collection_name, file_key), content_hash, len(docs), scope=file_key)
+    if stale_ids:
+        client.delete(collection_name=collection_name, points_selector=rest.PointIdsList(points=stale_ids))
+    manifest.record(collection_name, file_key, content_hash, len(docs), scope=file_key)
+    print(f"Upserted {len(docs)} documents to collection {collection_name} ({len(stale_ids)} stale removed)")
+
+def delete_file_points(file_key):
+    """Delete the points of a file that no longer exists and forget it in the manifest."""
+    previous = manifest.get(collection_name, file_key)
+    if previous is None:
+        return 0
+    client = get_client(qdrant_url, qdrant_api_key, timeout=ingest_timeout_seconds)
+    # Derived with the scope recorded at ingestion (unscoped for files ingested before IDs were scoped)
+    stale_ids = point_ids(previous['file_hash'], previous['chunk_count'], scope=previous['id_scope'])
+    if stale_ids:
+        client.delete(collection_name=collection_name, points_selector=rest.PointIdsList(points=stale_ids))
+    manifest.remove(collection_name, file_key)
+    print(f"Removed {len(stale_ids)} documents of deleted file {file_key}")
+    return len(stale_ids)
 
 def load_document(file_path, file_extension):
     """
@@ -93,70 +119,129 @@ def load_document(file_path, file_extension):
         list: List of document objects
     """
     if file_extension.lower() == '.pdf':
-        loader = LLMSherpaFileLoader(
-            file_path=file_path,
-            new_indent_parser=True,
-            apply_ocr=True,
-            strategy="sections",
-            llmsherpa_api_url=llmsherpa_api_url,
-        )
+        # Page ranges are parsed in parallel, locally or with LLMSherpa depending on the text layer
+        return load_pdf(file_path)
     elif file_extension.lower() == '.pptx':
-        loader = UnstructuredPowerPointLoader(file_path)
+        # One document per slide from python-pptx; only slides without a text layer go to Unstructured
+        return load_pptx(file_path)
     else:
         raise ValueError(f"Unsupported file extension: {file_extension}")
-    
-    return loader.load()
 
-def process_single_file(file_info):
+def load_and_split_file(file_path, filename):
+    """
+    Load a document file and split it into chunks
+    Args:
+        file_path (str): Path to the file
+        filename (str): Name of the file, used for logging and its extension
+    Returns:
+        list: List of chunk documents
+    """
+    file_extension = os.path.splitext(filename)[1].lower()
+    print(f"{filename}: Loading file and converting to text...")
+    docs = load_document(file_path, file_extension)
+    return split_documents(docs, filename)
+
+def split_documents(docs, filename):
+    print(f"{filename}: Splitting text into chunks...")
+    # Sized in tokens of the embedding model, along page/section/slide boundaries
+    return chunk_documents(docs, ollama_embedding_model_name)
+
+def process_single_file(file_info, pipeline=None, progress=None, file_key=None):
     """
     Process a single document file
     Args:
         file_info (tuple): (file_path, filename, metadata)
+        pipeline (EmbeddingPipeline, optional): Shared embedding stage, created if None
+        progress (callable, optional): progress(stage) is called as each stage of ingest_jobs.STAGES finishes
+        file_key (str, optional): Manifest key of the file, defaults to its absolute path
     Returns:
         dict: Processing result for the file
     """
     file_path, filename, metadata = file_info
     print(f"Processing file: {filename}")
-    
+
     try:
+        file_key = file_key or os.path.abspath(file_path)
+        content_hash = file_hash(file_path)
+        if manifest.is_unchanged(collection_name, file_key, content_hash, scope=file_key):
+            return _file_result(filename, metadata, skipped=True)
+
+        pipeline = pipeline or get_embedding_pipeline()
         file_extension = os.path.splitext(filename)[1].lower()
         print(f"{filename}: Loading file and converting to text...")
-        
-        docs = load_document(file_path, file_extension)
-        
-        print(f"{filename}: Splitting text into chunks...")
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=2048, chunk_overlap=128)
-        docs = text_splitter.split_documents(docs)
-        
+        if file_extension == '.pdf':
+            # Split and embed each page range as soon as it is parsed, then restore page order
+            ranges = []
+            for start, range_docs in iter_pdf_ranges(file_path):
+                chunks = split_documents(range_docs, filename)
+                ranges.append((start, chunks, pipeline.embed_documents(chunks) if chunks else []))
+            ranges.sort(key=lambda item: item[0])
+            docs = [doc for _, chunks, _ in ranges for doc in chunks]
+            vectors = [vector for _, _, range_vectors in ranges for vector in range_vectors]
+            if progress:
+                progress("parsed")
+                progress("chunked")
+                progress("embedded")
+        else:
+            docs = load_document(file_path, file_extension)
+            if progress:
+                progress("parsed")
+
+            docs = split_documents(docs, filename)
+            if progress:
+                progress("chunked")
+
+            vectors = pipeline.embed_documents(docs)
+            if progress:
+                progress("embedded")
+
         print(f"{filename}: Storing documents to Qdrant...")
-        store_to_qdrant(docs, get_embedding_Ollama(ollama_embedding_model_name), metadata)
-        
-        result = {
+        store_to_qdrant(docs, vectors, metadata, file_key, content_hash)
+        if progress:
+            progress("stored")
+        result = _file_result(filename, metadata)
+    except Exception as e:
+        result = _file_result(filename, metadata, error=e)
+
+    return result
+
+def _file_result(filename, metadata, error=None, skipped=False):
+    if skipped:
+        print(f"File {filename} unchanged since last ingestion, skipped.\n")
+        return {
             "filename": filename,
-            "status": "success",
-            "message": f"File {filename} processed successfully",
+            "status": "skipped",
+            "message": f"File {filename} unchanged since last ingestion",
             "metadata": metadata
         }
+    if error is None:
         print(f"File {filename} processed successfully.\n")
-        
-    except Exception as e:
-        result = {
+        return {
             "filename": filename,
-            "status": "error",
-            "message": f"Error processing {filename}: {str(e)}",
+            "status": "success",
+            "message": f"File {filename} processed successfully",
             "metadata": metadata
         }
-        print(f"Error processing {filename}: {str(e)}\n")
-    
-    return result
+    print(f"Error processing {filename}: {str(error)}\n")
+    return {
+        "filename": filename,
+        "status": "error",
+        "message": f"Error processing {filename}: {str(error)}",
+        "metadata": metadata
+    }
 
-def process_document_folder(folder_path, metadata_list=None, max_workers=5):
+def process_document_folder(folder_path, metadata_list=None, max_workers=5, prune=True, progress=None):
     """
     Process all supported document files in the given folder in parallel
+    Files are loaded and split in parallel, then the chunks of all files are embedded
+    together in batches (see embedding_pipeline) before being stored per file.
+    Files whose content hash matches the ingest manifest are skipped without parsing.
     Args:
         folder_path (str): Path to folder containing document files
         metadata_list (list, optional): List of metadata dictionaries corresponding to each file.
         max_workers (int): Maximum number of parallel processes
+        prune (bool): Delete points of previously ingested files that are no longer in the folder
+        progress (callable, optional): progress(stage) is called as each stage of ingest_jobs.STAGES finishes
     Returns:
         list: List of processing results with success/failure status for each file
     """
@@ -186,15 +271,105 @@ def process_document_folder(folder_path, metadata_list=None, max_workers=5):
         file_infos.append((file_path, filename, metadata))
     
     results = []
+    if prune:
+        folder_prefix = os.path.join(os.path.abspath(folder_path), '')
+        present = {os.path.abspath(file_path) for file_path, _, _ in file_infos}
+        for file_key in manifest.files(collection_name):
+            if file_key.startswith(folder_prefix) and file_key not in present:
+                delete_file_points(file_key)
+
+    # Only files whose content changed since the last run are parsed and embedded
+    changed = []
+    for file_path, filename, metadata in file_infos:
+        try:
+            content_hash = file_hash(file_path)
+        except OSError as e:
+            results.append(_file_result(filename, metadata, error=e))
+            continue
+        file_key = os.path.abspath(file_path)
+        if manifest.is_unchanged(collection_name, file_key, content_hash, scope=file_key):
+            results.append(_file_result(filename, metadata, skipped=True))
+        else:
+            changed.append((file_path, filename, metadata, content_hash))
+
+    loaded = []
     with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_file = {executor.submit(process_single_file, file_info): file_info for file_info in file_infos}
+        future_to_file = {
+            executor.submit(load_and_split_file, file_path, filename): (file_path, filename, metadata, content_hash)
+            for file_path, filename, metadata, content_hash in changed
+        }
         
         for future in concurrent.futures.as_completed(future_to_file):
-            result = future.result()
-            results.append(result)
-    
+            file_path, filename, metadata, content_hash = future_to_file[future]
+            try:
+                loaded.append((file_path, filename, metadata, content_hash, future.result()))
+            except Exception as e:
+                results.append(_file_result(filename, metadata, error=e))
+    if progress:
+        progress("parsed")
+        progress("chunked")
+
+    if not loaded:
+        return results
+
+    # Embed the chunks of every file together so batches are full across file boundaries
+    pipeline = get_embedding_pipeline()
+    all_docs = [doc for *_, docs in loaded for doc in docs]
+    try:
+        all_vectors = pipeline.embed_documents(all_docs)
+    except Exception as e:
+        return results + [_file_result(filename, metadata, error=e) for _, filename, metadata, _, _ in loaded]
+    if progress:
+        progress("embedded")
+
+    offset = 0
+    for file_path, filename, metadata, content_hash, docs in loaded:
+        vectors = all_vectors[offset:offset + len(docs)]
+        offset += len(docs)
+        try:
+            print(f"{filename}: Storing documents to Qdrant...")
+            store_to_qdrant(docs, vectors, metadata, os.path.abspath(file_path), content_hash)
+            results.append(_file_result(filename, metadata))
+        except Exception as e:
+            results.append(_file_result(filename, metadata, error=e))
+    if progress:
+        progress("stored")
+
+    stats = pipeline.stats()
+    print(f"Embedding throughput ({stats['model']}): {stats['chunks_per_second']} chunks/sec "
+          f"({stats['chunks']} chunks, {stats['cache_hits']} from cache, {stats['embedded']} embedded)")
     return results
 
+def archive_upload(file_path, filename):
+    """Move a processed upload to the archive folder, or delete it if archiving is disabled."""
+    if not os.path.exists(file_path):
+        return
+    if ARCHIVE_UPLOADS:
+        if not os.path.exists(ARCHIVE_FOLDER):
+            os.makedirs(ARCHIVE_FOLDER)
+        os.replace(file_path, os.path.join(ARCHIVE_FOLDER, f"{time.strftime('%Y%m%d_%H%M%S')}_{filename}"))
+    else:
+        os.remove(file_path)
+
+def run_ingest_job(job, report):
+    """Ingest only the uploaded file (runs on an ingestion worker)."""
+    file_path, filename = job['file_path'], job['filename']
+    try:
+        # Keyed (and point IDs scoped) by student, lecture, file id and upload name, so re-uploading
+        # an unchanged file is skipped and uploads of other students never share points
+        result = process_single_file(
+            (file_path, filename, job['metadata']),
+            progress=report,
+            file_key=upload_file_key(job['metadata'], filename)
+        )
+    finally:
+        archive_upload(file_path, filename)
+    if result['status'] == 'error':
+        raise RuntimeError(result['message'])
+    return result
+
+ingest_jobs = IngestJobQueue(run_ingest_job, "ingest")
+
 @app.route("/ingest-file", methods=['POST'])
 def ingest_file():
     if 'file' not in request.files:
@@ -207,7 +382,8 @@ def ingest_file():
     file_extension = os.path.splitext(file.filename)[1].lower()
     if file and file_extension in SUPPORTED_EXTENSIONS:
         filename = secure_filename(file.filename)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        # Unique name so concurrent uploads of the same file do not overwrite each other
+        file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{uuid.uuid4().hex}_{filename}")
         file.save(file_path)
         
         # Get metadata from form data
@@ -218,20 +394,24 @@ def ingest_file():
             'student_id': request.form.get('student_id', '')
         }
         
-        # Process the single file using the folder processing function
-        results = process_document_folder(
-            app.config['UPLOAD_FOLDER'],
-            metadata_list=[metadata]
-        )
-        
-        # Return the result for the single file
-        if results[0]['status'] == 'success':
-            return jsonify(results[0]), 200
-        else:
-            return jsonify({"error": results[0]['message']}), 500
+        # Parsing and embedding run on the ingestion workers; poll /ingest-jobs/<job_id>
+        job_id = ingest_jobs.submit(file_path, filename, metadata)
+        return jsonify({
+            "message": f"File {filename} uploaded and queued for processing",
+            "job_id": job_id,
+            "status_url": f"/ingest-jobs/{job_id}",
+            "metadata": metadata
+        }), 202
     else:
         return jsonify({"error": f"Invalid file format. Please upload one of the supported file types: {', '.join(SUPPORTED_EXTENSIONS)}"}), 400
 
+@app.route("/ingest-jobs/<job_id>")
+def ingest_job_status(job_id):
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job {job_id}"}), 404
+    return jsonify(job)
+
 # Example usage of the folder processing function:
 """
 # Process all documents in a folder
@@ -256,6 +436,9 @@ for result in results:
 """
 
 if __name__ == "__main__":
+    # Resume ingestion jobs queued or interrupted before the restart
+    ingest_jobs.start()
+
     # Process all documents in a folder
     folder_path = "/Users/khiemfle/Downloads/archives/kinhtevimo-pdf"  # You can change this path as needed
     
@@ -0,0 +1,160 @@
+"""
+SQLite-backed ingestion job queue.
+
+/ingest-file saves the upload, queues a job and returns its id immediately. A small
+pool of worker threads runs the jobs with a concurrency limit and records the time
+spent in each stage (parsed, chunked, embedded, stored). Jobs live in a local SQLite
+file, so queued jobs and jobs interrupted by a restart are picked up again on start.
+Every service names its queue: the server and ingest.py share the file but each only
+runs (and re-queues) its own jobs, with its own handler.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+
+logger = logging.getLogger(__name__)
+
+INGEST_JOBS_PATH = os.getenv("INGEST_JOBS_PATH", "tmp/ingest_jobs.sqlite")
+INGEST_MAX_CONCURRENT_JOBS = int(os.getenv("INGEST_MAX_CONCURRENT_JOBS", "2"))
+
+STAGES = ["parsed", "chunked", "embedded", "stored"]
+
+
+class IngestJobQueue:
+    def __init__(self, handler, name, path=INGEST_JOBS_PATH, max_workers=INGEST_MAX_CONCURRENT_JOBS, poll_interval=1.0):
+        """
+        Args:
+            handler (callable): handler(job, report) processes one job. `job` is the dict returned
+                by get(); report(stage) marks a stage from STAGES as finished. The return value is
+                stored as the job result.
+            name (str): Queue of the service; only jobs submitted under this name are run
+            path (str): SQLite file holding the jobs
+            max_workers (int): Maximum number of jobs processed at once
+            poll_interval (float): Seconds between checks for new jobs when idle
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.handler = handler
+        self.name = name
+        self.path = path
+        self.max_workers = max(1, max_workers)
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._started = False
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, status TEXT NOT NULL, file_path TEXT NOT NULL, filename TEXT NOT NULL,"
+            " metadata TEXT NOT NULL, stage TEXT, stages TEXT NOT NULL, result TEXT, error TEXT,"
+            " created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        # Jobs queued before queues were named have no queue and are left alone
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")]
+        if "queue" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN queue TEXT")
+        self._conn.commit()
+
+    def start(self):
+        """Start the workers once; jobs left running by a previous process are re-queued."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            self._conn.execute("UPDATE jobs SET status = 'queued', stage = NULL, stages = '{}' WHERE status = 'running' AND queue = ?",
+                (self.name,))
+            self._conn.commit()
+        for index in range(self.max_workers):
+            threading.Thread(target=self._worker, name=f"ingest-worker-{index}", daemon=True).start()
+
+    def submit(self, file_path, filename, metadata):
+        """Queue a file for ingestion and return the job id."""
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, queue, status, file_path, filename, metadata, stages, created_at)"
+                " VALUES (?, ?, 'queued', ?, ?, ?, '{}', ?)",
+                (job_id, self.name, file_path, filename, json.dumps(metadata), time.time()),
+            )
+            self._conn.commit()
+        self.start()
+        self._wakeup.set()
+        logger.info(f"Queued ingestion job {job_id} for {filename}")
+        return job_id
+
+    def get(self, job_id):
+        """Return the job of this queue as a dict, or None if unknown."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, file_path, filename, metadata, stage, stages, result, error,"
+                " created_at, started_at, finished_at FROM jobs WHERE id = ? AND queue = ?",
+                (job_id, self.name),
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(
+            ["id", "status", "file_path", "filename", "metadata", "stage", "stages", "result", "error",
+             "created_at", "started_at", "finished_at"], row))
+        job["metadata"] = json.loads(job["metadata"])
+        job["stages"] = json.loads(job["stages"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["queue_seconds"] = round((job["started_at"] or time.time()) - job["created_at"], 2)
+        if job["started_at"]:
+            job["run_seconds"] = round((job["finished_at"] or time.time()) - job["started_at"], 2)
+        return job
+
+    def _claim(self):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' AND queue = ? ORDER BY created_at LIMIT 1",
+                (self.name,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?", (time.time(), row[0])
+            )
+            self._conn.commit()
+        return row[0]
+
+    def _update(self, job_id, **fields):
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", [*fields.values(), job_id])
+            self._conn.commit()
+
+    def _run(self, job_id):
+        job = self.get(job_id)
+        stages = {}
+        last_mark = time.time()
+
+        def report(stage):
+            nonlocal last_mark
+            now = time.time()
+            stages[stage] = {"seconds": round(now - last_mark, 2), "finished_at": now}
+            last_mark = now
+            self._update(job_id, stage=stage, stages=json.dumps(stages))
+
+        try:
+            result = self.handler(job, report)
+            self._update(job_id, status="completed", result=json.dumps(result), finished_at=time.time())
+            logger.info(f"Ingestion job {job_id} completed")
+        except Exception as e:
+            logger.error(f"Ingestion job {job_id} failed: {str(e)}")
+            logger.error(f"Traceback: {traceback.format_exc()}")
+            self._update(job_id, status="failed", error=str(e), finished_at=time.time())
+
+    def _worker(self):
+        while True:
+            job_id = self._claim()
+            if job_id is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self._run(job_id)
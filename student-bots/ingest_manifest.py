@@ -0,0 +1,153 @@
+"""
+Manifest of ingested files for idempotent, incremental re-ingestion.
+
+Every chunk is stored under a deterministic point ID derived from (file content hash,
+chunk index). The manifest remembers which hash and how many chunks each file had in
+each collection, so a re-run can skip unchanged files, replace the points of changed
+files and delete the points of files that disappeared.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+INGEST_MANIFEST_PATH = os.getenv("INGEST_MANIFEST_PATH", "tmp/ingest_manifest.sqlite")
+
+# Fixed namespace so point IDs are stable across machines and runs
+POINT_ID_NAMESPACE = uuid.UUID("6f1c9d52-3b8e-4a51-9a57-0c2b7e1d4f90")
+
+
+def file_hash(file_path, block_size=1 << 20):
+    """Return the sha256 of the file content."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def point_ids(content_hash, count, scope=None):
+    """
+    Deterministic Qdrant point IDs for the chunks of a file
+    Args:
+        scope (str, optional): Owner of the file in a shared collection (see collection_routing.file_key),
+            so the same file uploaded by two students gets two sets of points
+    """
+    prefix = f"{scope}:{content_hash}" if scope else content_hash
+    return [str(uuid.uuid5(POINT_ID_NAMESPACE, f"{prefix}:{index}")) for index in range(count)]
+
+
+class IngestManifest:
+    def __init__(self, path=INGEST_MANIFEST_PATH):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " collection TEXT NOT NULL, file_key TEXT NOT NULL, file_hash TEXT NOT NULL,"
+            " chunk_count INTEGER NOT NULL, ingested_at TEXT NOT NULL,"
+            " PRIMARY KEY (collection, file_key))"
+        )
+        # Scope the point IDs of a file were derived with; NULL for files ingested before IDs were scoped
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(files)")]
+        if "id_scope" not in columns:
+            self._conn.execute("ALTER TABLE files ADD COLUMN id_scope TEXT")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS collection_versions ("
+            " collection TEXT PRIMARY KEY, version INTEGER NOT NULL, updated_at TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _bump_version(self, collection):
+        """Must be called with self._lock held, before the commit of the change it versions."""
+        self._conn.execute(
+            "INSERT INTO collection_versions (collection, version, updated_at) VALUES (?, 1, ?)"
+            " ON CONFLICT(collection) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at",
+            (collection, time.strftime("%Y-%m-%d %H:%M:%S")),
+        )
+
+    def collection_version(self, collection):
+        """
+        Version of the collection content, incremented on every ingestion or deletion
+        Caches of answers or retrievals include it in their keys, so re-ingesting a
+        collection invalidates them without an explicit flush.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version FROM collection_versions WHERE collection = ?", (collection,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def get(self, collection, file_key):
+        """Return {'file_hash', 'chunk_count', 'ingested_at', 'id_scope'} for the file, or None if never ingested."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT file_hash, chunk_count, ingested_at, id_scope FROM files WHERE collection = ? AND file_key = ?",
+                (collection, file_key),
+            ).fetchone()
+        if row is None:
+            return None
+        return {'file_hash': row[0], 'chunk_count': row[1], 'ingested_at': row[2], 'id_scope': row[3]}
+
+    def is_unchanged(self, collection, file_key, content_hash, scope=None):
+        """True if the file was ingested with this content and point ID scope (files with old IDs are re-ingested)."""
+        entry = self.get(collection, file_key)
+        return entry is not None and entry['file_hash'] == content_hash and entry['id_scope'] == scope
+
+    def files(self, collection):
+        """Return {file_key: entry} for every file ingested into the collection."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT file_key, file_hash, chunk_count, ingested_at FROM files WHERE collection = ?",
+                (collection,),
+            ).fetchall()
+        return {row[0]: {'file_hash': row[1], 'chunk_count': row[2], 'ingested_at': row[3]} for row in rows}
+
+    def has_files(self, collection, key_prefix):
+        """Whether any file whose key starts with key_prefix is ingested into the collection."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM files WHERE collection = ? AND substr(file_key, 1, ?) = ? LIMIT 1",
+                (collection, len(key_prefix), key_prefix),
+            ).fetchone()
+        return row is not None
+
+    def record(self, collection, file_key, content_hash, chunk_count, scope=None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (collection, file_key, file_hash, chunk_count, ingested_at, id_scope)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (collection, file_key, content_hash, chunk_count, time.strftime("%Y-%m-%d %H:%M:%S"), scope),
+            )
+            self._bump_version(collection)
+            self._conn.commit()
+
+    def remove(self, collection, file_key):
+        with self._lock:
+            self._conn.execute("DELETE FROM files WHERE collection = ? AND file_key = ?", (collection, file_key))
+            self._bump_version(collection)
+            self._conn.commit()
+
+
+def stale_point_ids(previous, content_hash, chunk_count, scope=None):
+    """
+    IDs of points written by a previous ingestion that the new one does not overwrite
+    Args:
+        previous (dict): Manifest entry of the previous ingestion, or None
+        content_hash (str): Hash of the file being ingested now
+        chunk_count (int): Number of chunks being ingested now
+        scope (str, optional): Scope the new point IDs are derived with
+    Returns:
+        list: Point IDs to delete after the new points are upserted
+    """
+    if previous is None:
+        return []
+    previous_scope = previous.get('id_scope')
+    if previous['file_hash'] == content_hash and previous_scope == scope:
+        return point_ids(content_hash, previous['chunk_count'], scope)[chunk_count:]
+    return point_ids(previous['file_hash'], previous['chunk_count'], previous_scope)
@@ -0,0 +1,141 @@
+"""
+Process-wide registry for embedding models and the ColBERT reranker.
+
+Loading sentence-transformers / ColBERT weights takes seconds and hundreds of MB,
+so every model is loaded at most once per process and shared across threads.
+The registry also keeps load time and resident memory per model so they can be
+reported on the /status endpoint.
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+reranker_model_name = "colbert-ir/colbertv2.0"
+ollama_base_url = "http://192.168.0.108:11434"  # Update with your Ollama service URL
+
+
+def get_rss_bytes():
+    """Return the current resident set size of this process in bytes."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # Fall back to the peak RSS on platforms without /proc (macOS reports bytes, Linux KB)
+    import resource
+    import sys
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def _load_huggingface(model_name):
+    from langchain_huggingface import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(
+        model_name=model_name,
+        model_kwargs={'device': 'cpu'},
+        encode_kwargs={'normalize_embeddings': False}
+    )
+
+
+def _load_fastembed(model_name):
+    from langchain_community.embeddings import FastEmbedEmbeddings
+    return FastEmbedEmbeddings(model_name=model_name)
+
+
+def _load_ollama(model_name):
+    from langchain_community.embeddings import OllamaEmbeddings
+    return OllamaEmbeddings(model=model_name, base_url=ollama_base_url)
+
+
+def _load_colbert(model_name):
+    from ragatouille import RAGPretrainedModel
+    return RAGPretrainedModel.from_pretrained(model_name)
+
+
+class ModelRegistry:
+    LOADERS = {
+        "huggingface": _load_huggingface,
+        "fastembed": _load_fastembed,
+        "ollama": _load_ollama,
+        "colbert": _load_colbert,
+    }
+
+    def __init__(self):
+        self._models = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def get(self, provider, model_name):
+        """
+        Return the shared model instance, loading it on first use
+        Args:
+            provider (str): One of the keys of ModelRegistry.LOADERS
+            model_name (str): Model name passed to the loader
+        Returns:
+            The loaded model (a LangChain Embeddings object or a RAGPretrainedModel)
+        """
+        key = (provider, model_name)
+        model = self._models.get(key)
+        if model is not None:
+            return model
+
+        if provider not in self.LOADERS:
+            raise ValueError(f"Unsupported model provider: {provider}")
+
+        # One lock per model so a slow ColBERT load does not block embedding lookups
+        with self._key_lock(key):
+            model = self._models.get(key)
+            if model is not None:
+                return model
+
+            logger.info(f"Loading {provider} model {model_name}...")
+            rss_before = get_rss_bytes()
+            start_time = time.time()
+            model = self.LOADERS[provider](model_name)
+            load_seconds = time.time() - start_time
+            rss_delta = max(get_rss_bytes() - rss_before, 0)
+
+            self._stats[key] = {
+                "provider": provider,
+                "model_name": model_name,
+                "load_seconds": round(load_seconds, 2),
+                "rss_delta_mb": round(rss_delta / (1024 * 1024), 1),
+                "loaded_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            self._models[key] = model
+            logger.info(f"Loaded {provider} model {model_name} in {load_seconds:.1f}s "
+                        f"(+{rss_delta / (1024 * 1024):.0f} MB RSS)")
+            return model
+
+    def get_embeddings(self, model_name, provider="huggingface"):
+        return self.get(provider, model_name)
+
+    def get_reranker(self, model_name=reranker_model_name):
+        return self.get("colbert", model_name)
+
+    def warm_up(self, embedding_models=(), provider="huggingface", reranker=True):
+        """Load the given embedding models (and the reranker) before serving requests."""
+        for model_name in embedding_models:
+            self.get_embeddings(model_name, provider)
+        if reranker:
+            self.get_reranker()
+
+    def status(self):
+        """Return load statistics for every loaded model plus the process RSS."""
+        return {
+            "process_rss_mb": round(get_rss_bytes() / (1024 * 1024), 1),
+            "models": list(self._stats.values()),
+        }
+
+
+# Shared by every module in the process
+registry = ModelRegistry()
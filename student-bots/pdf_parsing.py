@@ -0,0 +1,169 @@
+"""
+Page-parallel PDF parsing stage.
+
+A PDF is split into page ranges that are parsed concurrently and yielded as soon as
+each range is done, so splitting and embedding can start before the whole document
+has been parsed. Each file gets a parser from a quick text-layer probe: PDFs with an
+extractable text layer are parsed locally with pypdf, scanned PDFs go to LLMSherpa with
+OCR. A range that fails on LLMSherpa, or is still running after PDF_LLMSHERPA_TIMEOUT
+seconds, is parsed with the local parser instead.
+"""
+import concurrent.futures
+import logging
+import os
+import tempfile
+import time
+
+from langchain_core.documents import Document
+from pypdf import PdfReader, PdfWriter
+
+logger = logging.getLogger(__name__)
+
+llmsherpa_api_url = "http://llmsherpa.service.consul:15001/api/parseDocument?renderFormat=all"
+
+# auto: probe the text layer; local: always pypdf; llmsherpa: always LLMSherpa with OCR
+PDF_PARSER = os.getenv("PDF_PARSER", "auto")
+PDF_PAGES_PER_RANGE = int(os.getenv("PDF_PAGES_PER_RANGE", "10"))
+PDF_PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", "4"))
+# Seconds a range may spend on LLMSherpa before it is parsed locally instead (0 waits forever)
+PDF_LLMSHERPA_TIMEOUT = float(os.getenv("PDF_LLMSHERPA_TIMEOUT", "120"))
+# Average extractable characters per probed page for a PDF to count as having a text layer
+TEXT_LAYER_MIN_CHARS = int(os.getenv("PDF_TEXT_LAYER_MIN_CHARS", "200"))
+
+
+def has_text_layer(file_path, sample_pages=5, min_chars=TEXT_LAYER_MIN_CHARS):
+    """
+    Check whether the PDF has an extractable text layer by sampling a few pages
+    Args:
+        file_path (str): Path to the PDF
+        sample_pages (int): Number of pages to sample, spread over the document
+        min_chars (int): Minimum average characters per sampled page
+    Returns:
+        bool: True if the local parser will get the text without OCR
+    """
+    reader = PdfReader(file_path)
+    num_pages = len(reader.pages)
+    if num_pages == 0:
+        return False
+    step = max(1, num_pages // sample_pages)
+    sampled = list(range(0, num_pages, step))[:sample_pages]
+    chars = sum(len((reader.pages[index].extract_text() or "").strip()) for index in sampled)
+    return chars / len(sampled) >= min_chars
+
+
+def choose_parser(file_path):
+    if PDF_PARSER in ("local", "llmsherpa"):
+        return PDF_PARSER
+    return "local" if has_text_layer(file_path) else "llmsherpa"
+
+
+def page_ranges(num_pages, pages_per_range=PDF_PAGES_PER_RANGE):
+    return [(start, min(start + pages_per_range, num_pages)) for start in range(0, num_pages, pages_per_range)]
+
+
+def parse_range_local(file_path, start, end):
+    """Parse pages [start, end) with pypdf, one document per non-empty page."""
+    reader = PdfReader(file_path)
+    docs = []
+    for index in range(start, end):
+        text = (reader.pages[index].extract_text() or "").strip()
+        if text:
+            docs.append(Document(
+                page_content=text,
+                metadata={'source': file_path, 'page': index + 1, 'parser': 'local'}
+            ))
+    return docs
+
+
+def parse_range_llmsherpa(file_path, start, end):
+    """Parse pages [start, end) with LLMSherpa (sections strategy, OCR) via a temporary sub-PDF."""
+    from langchain_community.document_loaders.llmsherpa import LLMSherpaFileLoader
+
+    reader = PdfReader(file_path)
+    writer = PdfWriter()
+    for index in range(start, end):
+        writer.add_page(reader.pages[index])
+
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+        writer.write(tmp)
+        range_path = tmp.name
+    try:
+        loader = LLMSherpaFileLoader(
+            file_path=range_path,
+            new_indent_parser=True,
+            apply_ocr=True,
+            strategy="sections",
+            llmsherpa_api_url=llmsherpa_api_url,
+        )
+        docs = loader.load()
+    finally:
+        os.remove(range_path)
+
+    for doc in docs:
+        doc.metadata.update({'source': file_path, 'page_range': f"{start + 1}-{end}", 'parser': 'llmsherpa'})
+    return docs
+
+
+def iter_pdf_ranges(file_path, parser=None, pages_per_range=PDF_PAGES_PER_RANGE, max_workers=PDF_PARSE_WORKERS,
+                    timeout=None):
+    """
+    Parse a PDF in parallel page ranges and yield results as ranges finish
+    Args:
+        file_path (str): Path to the PDF
+        parser (str, optional): "local" or "llmsherpa"; chosen by choose_parser() if None
+        pages_per_range (int): Pages per parallel unit of work
+        max_workers (int): Maximum number of ranges parsed at once
+        timeout (float, optional): Seconds an LLMSherpa range may run, from when it starts, before it
+            falls back to the local parser (PDF_LLMSHERPA_TIMEOUT)
+    Yields:
+        tuple: (start_page, docs) in completion order; sort by start_page for document order
+    """
+    parser = parser or choose_parser(file_path)
+    ranges = page_ranges(len(PdfReader(file_path).pages), pages_per_range)
+    logger.info(f"{os.path.basename(file_path)}: parsing {len(ranges)} page ranges with the {parser} parser")
+    parse_range = parse_range_local if parser == "local" else parse_range_llmsherpa
+    timeout = (PDF_LLMSHERPA_TIMEOUT if timeout is None else timeout) if parser != "local" else 0
+    started = {}
+
+    def run(start, end):
+        started[(start, end)] = time.monotonic()
+        return parse_range(file_path, start, end)
+
+    # Not a with-block: leaving it would wait for stalled LLMSherpa calls that were given up on
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        future_to_range = {executor.submit(run, start, end): (start, end) for start, end in ranges}
+        pending = set(future_to_range)
+        while pending:
+            done, pending = concurrent.futures.wait(
+                pending, timeout=min(1.0, timeout) if timeout else None,
+                return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                start, end = future_to_range[future]
+                try:
+                    docs = future.result()
+                except Exception as e:
+                    if parser == "local":
+                        raise
+                    logger.warning(f"LLMSherpa failed on pages {start + 1}-{end} of {file_path} ({str(e)}), "
+                                   f"falling back to the local parser")
+                    docs = parse_range_local(file_path, start, end)
+                yield start, docs
+            if not timeout:
+                continue
+            now = time.monotonic()
+            for future in list(pending):
+                start, end = future_to_range[future]
+                if now - started.get((start, end), now) > timeout:
+                    pending.discard(future)
+                    logger.warning(f"LLMSherpa still running after {timeout:.0f}s on pages {start + 1}-{end} "
+                                   f"of {file_path}, falling back to the local parser")
+                    yield start, parse_range_local(file_path, start, end)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def load_pdf(file_path, parser=None):
+    """Parse the whole PDF and return its documents in page order."""
+    ranges = sorted(iter_pdf_ranges(file_path, parser), key=lambda item: item[0])
+    return [doc for _, docs in ranges for doc in docs]
@@ -11,13 +11,24 @@ Usage:
     
     If output_pdf_file is not specified, it will use the same name as the input file with .pdf extension.
     If output_folder is not specified, PDFs will be saved in the same folder as the input files.
+    Files whose PDF is already newer than the PPTX are skipped unless --force is given.
+    Folders are converted by a pool of --workers LibreOffice instances, each with its own
+    user profile; a conversion running longer than --timeout seconds is killed.
 """
 
 import os
 import sys
+import argparse
+import concurrent.futures
+import functools
 import platform
+import queue
+import shutil
+import signal
 import subprocess
 import glob
+import tempfile
+import time
 from pathlib import Path
 
 
@@ -51,53 +62,158 @@ def convert_with_comtypes(input_file, output_file):
         powerpoint.Quit()
 
 
-def convert_with_libreoffice(input_file, output_file):
-    """Convert PPTX to PDF using LibreOffice (cross-platform)"""
-    # Check if LibreOffice is installed
-    libreoffice_commands = ["libreoffice", "soffice"]
-    libreoffice_path = None
-    
-    for cmd in libreoffice_commands:
-        try:
-            subprocess.run([cmd, "--version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
-            libreoffice_path = cmd
-            break
-        except FileNotFoundError:
-            continue
-    
+@functools.lru_cache(maxsize=None)
+def find_libreoffice():
+    """Locate the LibreOffice binary once per process (LIBREOFFICE_PATH overrides the search)"""
+    candidates = [os.getenv("LIBREOFFICE_PATH"), "soffice", "libreoffice",
+                  "/Applications/LibreOffice.app/Contents/MacOS/soffice",
+                  r"C:\Program Files\LibreOffice\program\soffice.exe"]
+    for candidate in candidates:
+        if candidate:
+            path = shutil.which(candidate)
+            if path:
+                return path
+    return None
+
+
+def is_up_to_date(input_file, output_file):
+    """True if the PDF exists and is newer than its source"""
+    return os.path.exists(output_file) and os.path.getmtime(output_file) >= os.path.getmtime(input_file)
+
+
+def profile_url(profile_dir):
+    """-env:UserInstallation value for a LibreOffice user profile directory"""
+    return Path(profile_dir).resolve().as_uri()
+
+
+def kill_process_tree(process):
+    """Kill soffice and the oosplash/soffice.bin children it spawns"""
+    try:
+        if platform.system() == "Windows":
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(process.pid)],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+    process.kill()
+    process.wait()
+
+
+def convert_with_libreoffice(input_file, output_file, profile_dir=None, timeout=None):
+    """
+    Convert PPTX to PDF using LibreOffice (cross-platform)
+    Args:
+        profile_dir (str): Private LibreOffice user profile, so parallel conversions don't lock each other
+        timeout (float): Seconds before a hung converter is killed (None waits forever)
+    """
+    libreoffice_path = find_libreoffice()
     if not libreoffice_path:
         print("Error: LibreOffice not found. Please install LibreOffice.")
         return False
     
     # Get absolute paths
     input_file_abs = os.path.abspath(input_file)
-    output_dir = os.path.dirname(os.path.abspath(output_file))
+    output_file_abs = os.path.abspath(output_file)
     
-    # Convert using LibreOffice
-    try:
-        subprocess.run([
-            libreoffice_path,
-            "--headless",
-            "--convert-to", "pdf",
-            "--outdir", output_dir,
-            input_file_abs
-        ], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    command = [libreoffice_path, "--headless", "--norestore", "--nolockcheck"]
+    if profile_dir:
+        command.append(f"-env:UserInstallation={profile_url(profile_dir)}")
+    
+    # Convert into a scratch directory, then move the PDF into place, so a killed
+    # conversion never leaves a truncated PDF that later looks up to date
+    with tempfile.TemporaryDirectory(prefix="pptx-to-pdf-") as scratch_dir:
+        command += ["--convert-to", "pdf", "--outdir", scratch_dir, input_file_abs]
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   start_new_session=platform.system() != "Windows")
+        try:
+            _, stderr = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            kill_process_tree(process)
+            print(f"Error converting file: {input_file} timed out after {timeout:.0f}s, converter killed")
+            return False
         
         # LibreOffice creates the PDF with the same name as the input file
-        # If the desired output name is different, rename the file
-        default_output = os.path.join(output_dir, os.path.splitext(os.path.basename(input_file))[0] + ".pdf")
-        if default_output != output_file:
-            os.rename(default_output, output_file)
-        
-        print(f"Successfully converted {input_file} to {output_file}")
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"Error converting file: {e}")
-        return False
+        default_output = os.path.join(scratch_dir, os.path.splitext(os.path.basename(input_file))[0] + ".pdf")
+        if process.returncode != 0 or not os.path.exists(default_output):
+            error = stderr.decode(errors="replace").strip() or f"exit code {process.returncode}"
+            print(f"Error converting file: {input_file}: {error}")
+            return False
+        os.makedirs(os.path.dirname(output_file_abs), exist_ok=True)
+        shutil.move(default_output, output_file_abs)
+    
+    print(f"Successfully converted {input_file} to {output_file}")
+    return True
+
+
+class ConversionPool:
+    """
+    Runs up to `workers` headless LibreOffice conversions at once.
 
+    Every worker slot owns a user profile directory that is reused across its conversions
+    (only the first conversion of a slot pays for creating the profile); a slot whose
+    converter was killed gets a fresh profile, since a killed soffice leaves its profile locked.
+    """
+
+    def __init__(self, workers=None, timeout=None):
+        self.workers = workers or int(os.getenv("PPTX_CONVERT_WORKERS", str(min(4, os.cpu_count() or 1))))
+        self.timeout = timeout or float(os.getenv("PPTX_CONVERT_TIMEOUT", "300"))
+        self.root = tempfile.mkdtemp(prefix="pptx-to-pdf-profiles-")
+        self.profiles = queue.Queue()
+        for index in range(self.workers):
+            self.profiles.put(os.path.join(self.root, f"profile-{index}"))
+
+    def convert(self, input_file, output_file):
+        profile_dir = self.profiles.get()
+        start_time = time.time()
+        try:
+            success = convert_with_libreoffice(input_file, output_file, profile_dir, self.timeout)
+            if not success and time.time() - start_time >= self.timeout:
+                shutil.rmtree(profile_dir, ignore_errors=True)
+            return success
+        finally:
+            self.profiles.put(profile_dir)
 
-def process_folder(input_folder, output_folder=None):
-    """Process all PPTX files in the input folder"""
+    def convert_all(self, jobs):
+        """
+        Convert (input_file, output_file) pairs concurrently
+        Returns:
+            dict: input_file -> success
+        """
+        results = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self.convert, input_file, output_file): input_file
+                       for input_file, output_file in jobs}
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as e:
+                    print(f"Error converting file: {futures[future]}: {e}")
+                    results[futures[future]] = False
+        return results
+
+    def close(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def convert_file(input_file, output_file, timeout=None):
+    """Convert one file with the converter for this platform"""
+    if platform.system() == "Windows":
+        try:
+            return convert_with_comtypes(input_file, output_file)
+        except ImportError:
+            print("Could not use Windows COM objects. Falling back to LibreOffice...")
+    return convert_with_libreoffice(input_file, output_file, timeout=timeout)
+
+
+def process_folder(input_folder, output_folder=None, workers=None, timeout=None, force=False):
+    """Process all PPTX files in the input folder, skipping those whose PDF is already up to date"""
     # Validate input folder
     if not os.path.isdir(input_folder):
         print(f"Error: Input folder '{input_folder}' does not exist or is not a directory.")
@@ -116,8 +232,7 @@ def process_folder(input_folder, output_folder=None):
     
     print(f"Found {len(pptx_files)} PPTX files to convert.")
     
-    # Process each file
-    success_count = 0
+    jobs = []
     for pptx_file in pptx_files:
         # Determine output file path
         if output_folder:
@@ -125,52 +240,56 @@ def process_folder(input_folder, output_folder=None):
         else:
             output_file = os.path.splitext(pptx_file)[0] + ".pdf"
         
+        if not force and is_up_to_date(pptx_file, output_file):
+            print(f"Skipping (PDF is up to date): {pptx_file}")
+            continue
         print(f"Converting: {pptx_file} -> {output_file}")
-        
-        # Convert based on platform
-        system = platform.system()
-        success = False
-        
-        if system == "Windows":
-            try:
-                success = convert_with_comtypes(pptx_file, output_file)
-            except ImportError:
-                print("Could not use Windows COM objects. Falling back to LibreOffice...")
-                success = convert_with_libreoffice(pptx_file, output_file)
-        else:
-            success = convert_with_libreoffice(pptx_file, output_file)
-        
-        if success:
-            success_count += 1
+        jobs.append((pptx_file, output_file))
+    
+    skipped_count = len(pptx_files) - len(jobs)
+    start_time = time.time()
+    if platform.system() == "Windows" and jobs:
+        # PowerPoint automation is single-instance, so files are converted one at a time
+        success_count = sum(1 for pptx_file, output_file in jobs if convert_file(pptx_file, output_file, timeout))
+    elif jobs:
+        with ConversionPool(workers, timeout) as pool:
+            print(f"Converting with {pool.workers} LibreOffice workers ({pool.timeout:.0f}s timeout per file)")
+            success_count = sum(1 for success in pool.convert_all(jobs).values() if success)
+    else:
+        success_count = 0
     
-    print(f"Conversion complete: {success_count} of {len(pptx_files)} files converted successfully.")
-    return success_count > 0
+    print(f"Conversion complete: {success_count} of {len(jobs)} files converted successfully, "
+          f"{skipped_count} up to date, in {time.time() - start_time:.1f}s.")
+    return success_count + skipped_count > 0
 
 
 def main():
-    # Check arguments
-    if len(sys.argv) < 2:
-        print("Usage: python pptx-to-pdf.py <input_pptx_file> [output_pdf_file]")
-        print("       python pptx-to-pdf.py --folder <input_folder> [output_folder]")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(
+        description="Convert PowerPoint (PPTX) files to PDF.",
+        usage="%(prog)s <input_pptx_file> [output_pdf_file]\n"
+              "       %(prog)s --folder <input_folder> [output_folder]"
+    )
+    parser.add_argument("paths", nargs="*", help="Input PPTX file and optional output PDF (or the output folder with --folder)")
+    parser.add_argument("--folder", metavar="INPUT_FOLDER", help="Convert every PPTX file in this folder")
+    parser.add_argument("--workers", type=int, help="Concurrent LibreOffice conversions (PPTX_CONVERT_WORKERS, default min(4, CPUs))")
+    parser.add_argument("--timeout", type=float, help="Seconds before a hung conversion is killed (PPTX_CONVERT_TIMEOUT, default 300)")
+    parser.add_argument("--force", action="store_true", help="Convert even if the PDF is newer than the PPTX")
+    args = parser.parse_args()
     
     # Check if folder mode is requested
-    if sys.argv[1] == "--folder":
-        if len(sys.argv) < 3:
-            print("Error: Input folder not specified.")
-            print("Usage: python pptx-to-pdf.py --folder <input_folder> [output_folder]")
-            sys.exit(1)
-        
-        input_folder = sys.argv[2]
-        output_folder = sys.argv[3] if len(sys.argv) >= 4 else None
-        
-        if process_folder(input_folder, output_folder):
+    if args.folder:
+        output_folder = args.paths[0] if args.paths else None
+        if process_folder(args.folder, output_folder, args.workers, args.timeout, args.force):
             sys.exit(0)
         else:
             sys.exit(1)
     
+    if not args.paths:
+        parser.print_usage()
+        sys.exit(1)
+    
     # Single file mode
-    input_file = sys.argv[1]
+    input_file = args.paths[0]
     
     # Validate input file
     if not os.path.exists(input_file):
@@ -181,26 +300,18 @@ def main():
         print(f"Warning: Input file '{input_file}' does not have a .pptx extension.")
     
     # Determine output file
-    if len(sys.argv) >= 3:
-        output_file = sys.argv[2]
+    if len(args.paths) >= 2:
+        output_file = args.paths[1]
     else:
         # Use the same name as input but with .pdf extension
         output_file = os.path.splitext(input_file)[0] + ".pdf"
     
-    # Convert based on platform
-    system = platform.system()
-    success = False
-    
-    if system == "Windows":
-        try:
-            success = convert_with_comtypes(input_file, output_file)
-        except ImportError:
-            print("Could not use Windows COM objects. Falling back to LibreOffice...")
-            success = convert_with_libreoffice(input_file, output_file)
-    else:
-        success = convert_with_libreoffice(input_file, output_file)
+    if not args.force and is_up_to_date(input_file, output_file):
+        print(f"PDF is up to date: {output_file}")
+        sys.exit(0)
     
-    if success:
+    timeout = args.timeout or float(os.getenv("PPTX_CONVERT_TIMEOUT", "300"))
+    if convert_file(input_file, output_file, timeout):
         print(f"Conversion complete: {output_file}")
     else:
         print("Conversion failed.")
@@ -0,0 +1,148 @@
+"""
+Per-slide PPTX parsing stage.
+
+Slide text is read straight from the PPTX with python-pptx: one document per slide with
+its title, body text (text frames, grouped shapes and tables) and speaker notes, without
+converting to PDF or running the Unstructured partitioning stack. Slides that have
+pictures or graphics but no text layer are the only ones sent to the heavy
+UnstructuredPowerPointLoader path.
+"""
+import logging
+import os
+
+from langchain_core.documents import Document
+from pptx import Presentation
+from pptx.enum.shapes import MSO_SHAPE_TYPE
+
+logger = logging.getLogger(__name__)
+
+# auto: python-pptx, Unstructured for slides without text; local: python-pptx only;
+# unstructured: the whole deck through UnstructuredPowerPointLoader
+PPTX_PARSER = os.getenv("PPTX_PARSER", "auto")
+
+
+def shape_texts(shapes):
+    """Text of every shape, in slide order, descending into groups and tables"""
+    for shape in shapes:
+        if shape.shape_type == MSO_SHAPE_TYPE.GROUP:
+            yield from shape_texts(shape.shapes)
+        elif shape.has_text_frame:
+            text = shape.text_frame.text.strip()
+            if text:
+                yield shape, text
+        elif getattr(shape, "has_table", False) and shape.has_table:
+            rows = [" | ".join(cell.text.strip() for cell in row.cells) for row in shape.table.rows]
+            text = "\n".join(row for row in rows if row.strip(" |"))
+            if text:
+                yield shape, text
+
+
+def has_graphics(shapes):
+    """Whether the slide carries pictures, charts or diagrams that may hold text python-pptx can't read"""
+    for shape in shapes:
+        if shape.shape_type == MSO_SHAPE_TYPE.GROUP:
+            if has_graphics(shape.shapes):
+                return True
+        elif shape.shape_type in (MSO_SHAPE_TYPE.PICTURE, MSO_SHAPE_TYPE.CHART, MSO_SHAPE_TYPE.DIAGRAM,
+                                  MSO_SHAPE_TYPE.EMBEDDED_OLE_OBJECT, MSO_SHAPE_TYPE.LINKED_PICTURE):
+            return True
+        elif getattr(shape, "has_chart", False) and shape.has_chart:
+            return True
+    return False
+
+
+def parse_slide(slide, slide_number, file_path):
+    """
+    Build the document of one slide
+    Returns:
+        Document or None: None if the slide has no text layer
+    """
+    title_shape = slide.shapes.title
+    title = title_shape.text_frame.text.strip() if title_shape is not None and title_shape.has_text_frame else ""
+    title_id = title_shape.shape_id if title_shape is not None else None
+    body = [text for shape, text in shape_texts(slide.shapes) if shape.shape_id != title_id]
+    notes = ""
+    if slide.has_notes_slide and slide.notes_slide.notes_text_frame is not None:
+        notes = slide.notes_slide.notes_text_frame.text.strip()
+    if not (title or body or notes):
+        return None
+
+    parts = [title] if title else []
+    parts += body
+    if notes:
+        parts.append(f"Notes: {notes}")
+    return Document(
+        page_content="\n\n".join(parts),
+        metadata={
+            'source': file_path,
+            'page': slide_number,
+            'slide_number': slide_number,
+            'title': title,
+            'has_notes': bool(notes),
+            'parser': 'python-pptx',
+        }
+    )
+
+
+def load_slides_unstructured(file_path, slide_numbers=None):
+    """
+    Parse slides with UnstructuredPowerPointLoader, one document per slide
+    Args:
+        slide_numbers (set, optional): Only keep these slides (1-based); all slides if None
+    """
+    from langchain_community.document_loaders import UnstructuredPowerPointLoader
+
+    elements = UnstructuredPowerPointLoader(file_path, mode="elements").load()
+    slides = {}
+    for element in elements:
+        slide_number = element.metadata.get('page_number')
+        if slide_numbers is not None and slide_number not in slide_numbers:
+            continue
+        if element.page_content.strip():
+            slides.setdefault(slide_number, []).append(element.page_content.strip())
+    return [
+        Document(
+            page_content="\n\n".join(texts),
+            metadata={'source': file_path, 'page': slide_number, 'slide_number': slide_number,
+                      'title': "", 'has_notes': False, 'parser': 'unstructured'}
+        )
+        for slide_number, texts in sorted(slides.items(), key=lambda item: item[0] or 0)
+    ]
+
+
+def iter_pptx_slides(file_path, fallback=None):
+    """
+    Yield one document per slide as it is parsed
+    Args:
+        file_path (str): Path to the PPTX
+        fallback (bool, optional): Send slides with graphics but no text layer to Unstructured;
+            follows PPTX_PARSER if None
+    Yields:
+        Document: Slide documents in slide order; fallback slides come last
+    """
+    fallback = PPTX_PARSER == "auto" if fallback is None else fallback
+    presentation = Presentation(file_path)
+    without_text = set()
+    for slide_number, slide in enumerate(presentation.slides, start=1):
+        doc = parse_slide(slide, slide_number, file_path)
+        if doc is not None:
+            yield doc
+        elif has_graphics(slide.shapes):
+            without_text.add(slide_number)
+
+    if without_text and fallback:
+        logger.info(f"{os.path.basename(file_path)}: {len(without_text)} slides without a text layer, "
+                    f"parsing them with Unstructured")
+        try:
+            yield from load_slides_unstructured(file_path, without_text)
+        except Exception as e:
+            logger.warning(f"Unstructured fallback failed for {file_path}: {str(e)}")
+
+
+def load_pptx(file_path, parser=None):
+    """Parse the whole PPTX and return its slide documents in slide order."""
+    parser = parser or PPTX_PARSER
+    if parser == "unstructured":
+        return load_slides_unstructured(file_path)
+    docs = list(iter_pptx_slides(file_path, fallback=parser == "auto"))
+    return sorted(docs, key=lambda doc: doc.metadata['slide_number'] or 0)
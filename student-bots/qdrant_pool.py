@@ -0,0 +1,169 @@
+"""
+Shared, thread-safe Qdrant client pool.
+
+QdrantClient keeps a keep-alive HTTP (or gRPC) connection pool internally and is
+safe to use from several threads, so the project only needs a handful of long-lived
+clients per (url, transport, timeout) instead of one new client per call. Every call
+made through a pooled client is timed; latencies are recorded in a histogram on the
+OpenTelemetry meter and summarised in-process for /status.
+"""
+import itertools
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from urllib.parse import urlparse
+
+from qdrant_client import QdrantClient
+
+POOL_SIZE = int(os.getenv("QDRANT_POOL_SIZE", "4"))
+PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "false").lower() in ("1", "true", "yes")
+# gRPC port; unset, it is the REST port of the URL + 1, as in the stock 6333/6334 layout.
+# Set it when the deployment maps the ports differently.
+GRPC_PORT = os.getenv("QDRANT_GRPC_PORT")
+DEFAULT_TIMEOUT = int(os.getenv("QDRANT_TIMEOUT_SECONDS", "30"))
+
+# Methods used by the project (directly or through langchain_qdrant) that get timed
+TIMED_METHODS = (
+    "search", "query_points", "scroll", "retrieve", "count", "upsert", "upload_points",
+    "delete", "get_collection", "get_collections", "collection_exists",
+    "create_collection", "create_payload_index",
+)
+
+_latency_histogram = None
+_latencies = defaultdict(lambda: deque(maxlen=1000))
+_latencies_lock = threading.Lock()
+
+
+def _record_latency(operation, seconds):
+    global _latency_histogram
+    if _latency_histogram is None:
+        from service_metrics import meter
+        _latency_histogram = meter.create_histogram(
+            "qdrant_pool_latency_seconds",
+            unit="s",
+            description="Latency of Qdrant calls made through the shared client pool",
+        )
+    _latency_histogram.record(seconds, {"operation": operation})
+    with _latencies_lock:
+        _latencies[operation].append(seconds)
+
+
+def _timed(method, operation):
+    def wrapper(self, *args, **kwargs):
+        start_time = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            _record_latency(operation, time.perf_counter() - start_time)
+    wrapper.__name__ = method.__name__
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+
+class PooledQdrantClient(QdrantClient):
+    """QdrantClient whose data and collection calls are timed (still passes isinstance checks in langchain_qdrant)."""
+
+
+for _name in TIMED_METHODS:
+    if hasattr(QdrantClient, _name):
+        setattr(PooledQdrantClient, _name, _timed(getattr(QdrantClient, _name), _name))
+
+
+def grpc_port(url):
+    """QDRANT_GRPC_PORT, or the REST port of the URL + 1 (6334 if the URL has no port)"""
+    if GRPC_PORT:
+        return int(GRPC_PORT)
+    rest_port = urlparse(url).port
+    return rest_port + 1 if rest_port else 6334
+
+
+class QdrantPool:
+    def __init__(self, url, api_key=None, size=POOL_SIZE, prefer_grpc=PREFER_GRPC, timeout=DEFAULT_TIMEOUT):
+        """
+        Args:
+            url (str): Qdrant URL
+            api_key (str, optional): Qdrant API key
+            size (int): Number of clients handed out round-robin
+            prefer_grpc (bool): Use the gRPC transport instead of REST
+            timeout (int): Request timeout in seconds for every call made by these clients
+        """
+        self.url = url
+        self.api_key = api_key
+        self.size = max(1, size)
+        self.prefer_grpc = prefer_grpc
+        self.timeout = timeout
+        self._clients = [None] * self.size
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+
+    def _create_client(self):
+        return PooledQdrantClient(
+            url=self.url,
+            api_key=self.api_key,
+            prefer_grpc=self.prefer_grpc,
+            grpc_port=grpc_port(self.url),
+            timeout=self.timeout,
+        )
+
+    def client(self):
+        """Return one of the pooled clients, creating it on first use."""
+        slot = next(self._next) % self.size
+        client = self._clients[slot]
+        if client is None:
+            with self._lock:
+                client = self._clients[slot]
+                if client is None:
+                    client = self._create_client()
+                    self._clients[slot] = client
+        return client
+
+    def close(self):
+        with self._lock:
+            for client in self._clients:
+                if client is not None:
+                    client.close()
+            self._clients = [None] * self.size
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(url, api_key=None, prefer_grpc=PREFER_GRPC, timeout=DEFAULT_TIMEOUT):
+    """Return the process-wide pool for (url, api_key, transport, timeout)."""
+    key = (url, api_key, prefer_grpc, timeout)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = QdrantPool(url, api_key, prefer_grpc=prefer_grpc, timeout=timeout)
+            _pools[key] = pool
+        return pool
+
+
+def get_client(url, api_key=None, timeout=DEFAULT_TIMEOUT):
+    """
+    Return a shared Qdrant client
+    Args:
+        url (str): Qdrant URL
+        api_key (str, optional): Qdrant API key
+        timeout (int): Per-call timeout in seconds; clients with different timeouts live in separate pools
+    Returns:
+        PooledQdrantClient: A long-lived client, safe to share across threads
+    """
+    return get_pool(url, api_key, timeout=timeout).client()
+
+
+def latency_summary():
+    """Return count and p50/p95/max latency in milliseconds per Qdrant operation."""
+    summary = {}
+    with _latencies_lock:
+        snapshot = {op: sorted(values) for op, values in _latencies.items() if values}
+    for operation, values in snapshot.items():
+        summary[operation] = {
+            "count": len(values),
+            "p50_ms": round(values[len(values) // 2] * 1000, 1),
+            "p95_ms": round(values[min(len(values) - 1, int(len(values) * 0.95))] * 1000, 1),
+            "max_ms": round(values[-1] * 1000, 1),
+        }
+    return summary
@@ -0,0 +1,168 @@
+"""
+Opt-in response cache for /process-message.
+
+Answers are keyed on (student_id, skill prompt hash, normalized question, collection,
+collection version). The collection version comes from the ingest manifest and is
+bumped on every re-ingestion, so cached answers for a re-ingested collection are never
+served again. Lookups go through an in-memory LRU first and then an optional shared
+backend: a local SQLite file or any Redis-compatible server.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "10000"))
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "604800"))
+# "memory", "sqlite:<path>" or a redis:// URL
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+
+
+def normalize_question(question):
+    return re.sub(r"\s+", " ", question or "").strip()
+
+
+def response_key(student_id, skill_prompt_hash, question, collection, version):
+    raw = json.dumps([student_id, skill_prompt_hash, normalize_question(question), collection, version])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class SQLiteBackend:
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, time.time() + ttl),
+            )
+            self._conn.commit()
+
+
+class RedisBackend:
+    def __init__(self, url, prefix="student-bots:response:"):
+        import redis
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def get(self, key):
+        value = self._client.get(self._prefix + key)
+        return value.decode("utf-8") if value is not None else None
+
+    def set(self, key, value, ttl):
+        self._client.set(self._prefix + key, value, ex=ttl)
+
+
+def create_backend(spec):
+    if not spec or spec == "memory":
+        return None
+    if spec.startswith("sqlite:"):
+        return SQLiteBackend(spec[len("sqlite:"):])
+    if spec.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(spec)
+    raise ValueError(f"Unsupported response cache backend: {spec}")
+
+
+class ResponseCache:
+    def __init__(self, enabled=RESPONSE_CACHE_ENABLED, maxsize=RESPONSE_CACHE_SIZE,
+                 ttl=RESPONSE_CACHE_TTL_SECONDS, backend=None):
+        """
+        Args:
+            enabled (bool): When False, get() always misses and set() does nothing
+            maxsize (int): Entries kept in the in-memory LRU
+            ttl (int): Seconds an answer stays valid
+            backend: Optional shared backend with get(key) / set(key, value, ttl)
+        """
+        self.enabled = enabled
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.backend = backend
+        self._entries = OrderedDict()  # key -> (response, expires_at)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "memory_hits": 0, "backend_hits": 0, "misses": 0, "stores": 0, "errors": 0}
+
+    def _remember(self, key, response):
+        with self._lock:
+            self._entries[key] = (response, time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        """Return the cached response dict, or None."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] >= time.time():
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                self._stats["memory_hits"] += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+
+        if self.backend is not None:
+            try:
+                value = self.backend.get(key)
+            except Exception as e:
+                logger.warning(f"Response cache backend read failed: {str(e)}")
+                value = None
+                with self._lock:
+                    self._stats["errors"] += 1
+            if value is not None:
+                response = json.loads(value)
+                self._remember(key, response)
+                with self._lock:
+                    self._stats["hits"] += 1
+                    self._stats["backend_hits"] += 1
+                return response
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def set(self, key, response):
+        if not self.enabled:
+            return
+        self._remember(key, response)
+        if self.backend is not None:
+            try:
+                self.backend.set(key, json.dumps(response), self.ttl)
+            except Exception as e:
+                logger.warning(f"Response cache backend write failed: {str(e)}")
+                with self._lock:
+                    self._stats["errors"] += 1
+        with self._lock:
+            self._stats["stores"] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = {**self._stats, "size": len(self._entries), "enabled": self.enabled}
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
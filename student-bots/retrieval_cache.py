@@ -0,0 +1,150 @@
+"""
+Retrieval result cache and query-embedding memoization for the QA retrievers.
+
+All students query the same shared collection, so the embedded question is the same for
+everyone, and the ColBERT-reranked documents for (collection, question, k) are the same for
+every query with the same filter scope (a student's own uploads plus the shared material).
+MemoizedQueryEmbeddings remembers query vectors, and CachedRetriever remembers the
+reranked document lists. Cache keys include the collection version from the ingest
+manifest, and ingestion also drops a collection's entries explicitly.
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, List
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+from response_cache import normalize_question
+
+
+class LRUCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return self._entries[key]
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, predicate):
+        """Drop every entry whose key matches predicate(key); returns the number dropped."""
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                del self._entries[key]
+            self._stats["invalidations"] += len(keys)
+        return len(keys)
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "size": len(self._entries), "maxsize": self.maxsize}
+
+
+class MemoizedQueryEmbeddings(Embeddings):
+    """Embeddings wrapper that remembers query vectors; document embedding is passed through."""
+
+    def __init__(self, embeddings, maxsize=10000):
+        self.embeddings = embeddings
+        self.cache = LRUCache(maxsize)
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        vector = self.cache.get(text)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.set(text, vector)
+        return vector
+
+
+class CachedRetriever(BaseRetriever):
+    """Serves reranked documents for (collection, version, question, k, scope) from a shared cache."""
+
+    base_retriever: BaseRetriever
+    collection_name: str
+    k: int
+    cache: Any
+    version_fn: Any = None
+    # Identifies the query filter of base_retriever; retrievers with different filters never share entries
+    scope: str = ""
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        version = self.version_fn(self.collection_name) if self.version_fn else 0
+        key = (self.collection_name, version, normalize_question(query), self.k, self.scope)
+        docs = self.cache.get(key)
+        if docs is None:
+            docs = self.base_retriever.invoke(query, {"callbacks": run_manager.get_child()})
+            self.cache.set(key, docs)
+        # Copies, so chains that annotate metadata cannot alter the cached documents
+        return [Document(page_content=doc.page_content, metadata=dict(doc.metadata)) for doc in docs]
+
+
+class RetrievalCache:
+    def __init__(self, maxsize=2000, query_embedding_maxsize=10000):
+        """
+        Args:
+            maxsize (int): Reranked document lists kept in memory
+            query_embedding_maxsize (int): Query vectors kept per embedding model
+        """
+        self.documents = LRUCache(maxsize)
+        self.query_embedding_maxsize = query_embedding_maxsize
+        self._query_embeddings = {}
+        self._lock = threading.Lock()
+
+    def query_embeddings(self, embeddings):
+        """Return the shared memoizing wrapper for this embeddings object."""
+        with self._lock:
+            wrapper = self._query_embeddings.get(id(embeddings))
+            if wrapper is None:
+                wrapper = MemoizedQueryEmbeddings(embeddings, self.query_embedding_maxsize)
+                self._query_embeddings[id(embeddings)] = wrapper
+            return wrapper
+
+    def wrap(self, retriever, collection_name, k, version_fn=None, scope=""):
+        return CachedRetriever(
+            base_retriever=retriever,
+            collection_name=collection_name,
+            k=k,
+            cache=self.documents,
+            version_fn=version_fn,
+            scope=scope,
+        )
+
+    def invalidate(self, collection_name):
+        """Drop the cached document lists of a collection (called after ingesting into it)."""
+        return self.documents.invalidate(lambda key: key[0] == collection_name)
+
+    def stats(self):
+        with self._lock:
+            wrappers = list(self._query_embeddings.values())
+        query_stats = [wrapper.cache.stats() for wrapper in wrappers]
+        return {
+            "documents": self.documents.stats(),
+            "query_embeddings": {
+                "hits": sum(stats["hits"] for stats in query_stats),
+                "misses": sum(stats["misses"] for stats in query_stats),
+                "size": sum(stats["size"] for stats in query_stats),
+            },
+        }
@@ -0,0 +1,42 @@
+"""
+Application-level metrics for the student bots service.
+
+MetricsExporter pushes OpenTelemetry metrics to the OTLP collector, so anything
+registered on the global meter here is exported alongside the Flask metrics.
+"""
+from opentelemetry import metrics
+
+meter = metrics.get_meter("student-bots-service")
+
+
+def register_counters(prefix, stats_fn, names, description=""):
+    """
+    Export monotonically increasing values from a stats dict as observable counters
+    Args:
+        prefix (str): Metric name prefix, e.g. "agent_cache"
+        stats_fn (callable): Returns a dict holding the current values
+        names (list): Keys of the stats dict to export, e.g. ["hits", "misses"]
+        description (str): Description shared by the counters
+    """
+    for name in names:
+        def callback(options, name=name):
+            yield metrics.Observation(stats_fn().get(name, 0))
+
+        meter.create_observable_counter(
+            f"{prefix}_{name}",
+            callbacks=[callback],
+            description=f"{description} ({name})".strip(),
+        )
+
+
+def register_gauges(prefix, stats_fn, names, description=""):
+    """Export point-in-time values (sizes, memory) from a stats dict as observable gauges."""
+    for name in names:
+        def callback(options, name=name):
+            yield metrics.Observation(stats_fn().get(name, 0))
+
+        meter.create_observable_gauge(
+            f"{prefix}_{name}",
+            callbacks=[callback],
+            description=f"{description} ({name})".strip(),
+        )
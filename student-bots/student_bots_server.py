@@ -3,24 +3,28 @@ from adhoc_metrics.metrics_exporter import MetricsExporter
 import os
 from threading import Thread
 from werkzeug.utils import secure_filename
-from langchain_community.document_loaders.llmsherpa import LLMSherpaFileLoader
 from langchain_qdrant import QdrantVectorStore
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import FastEmbedEmbeddings
-from langchain_qdrant import Qdrant
 from langchain.chains import RetrievalQA
 from langchain_openai import ChatOpenAI
 from langchain.retrievers import ContextualCompressionRetriever
 from langchain.prompts import PromptTemplate
-from functools import lru_cache
-import hashlib
 import logging
+import time
 import traceback
-from ragatouille import RAGPretrainedModel
-from qdrant_client import QdrantClient
+import uuid
 from qdrant_client.http import models as rest
-from langchain_huggingface import HuggingFaceEmbeddings
 from langfuse.callback import CallbackHandler
+from model_registry import registry
+from qdrant_pool import get_client, latency_summary
+from ingest_manifest import IngestManifest, file_hash, point_ids, stale_point_ids
+from collection_routing import ensure_collection, file_key as upload_file_key, routing_metadata, student_filter, student_key_prefix
+from ingest_jobs import IngestJobQueue
+from pdf_parsing import load_pdf
+from chunking import chunk_documents
+from agent_cache import AgentCache, prompt_hash
+from retrieval_cache import RetrievalCache
+from response_cache import ResponseCache, RESPONSE_CACHE_BACKEND, create_backend, response_key
+from service_metrics import register_counters, register_gauges
 
 # Set up logging at the top of the file
 logging.basicConfig(
@@ -29,16 +33,27 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-llmsherpa_api_url = "http://llmsherpa.service.consul:15001/api/parseDocument?renderFormat=all"
 qdrant_url = "http://qdrant.service.consul:16333"
 qdrant_api_key = "qdrant"
 embedding_model_name = "BAAI/bge-base-en-v1.5"
 embedding_dimension = 768
-collection_prefix = "student_bots"
 model_name_HuggingFace_768 = "sentence-transformers/all-mpnet-base-v2"
+search_timeout_seconds = int(os.getenv("QDRANT_SEARCH_TIMEOUT_SECONDS", "10"))
+ingest_timeout_seconds = int(os.getenv("QDRANT_INGEST_TIMEOUT_SECONDS", "120"))
+# Every upload and the shared course material, filtered per student at query time (see collection_routing)
+qa_collection_name = os.getenv("QA_COLLECTION_NAME", "student-bots-pdf-20250112")
 
-# Add this at the top level with other global variables
-qa_cache = {}
+# Answers per (student, prompt, question, collection version); opt-in with RESPONSE_CACHE_ENABLED
+response_cache = ResponseCache(backend=create_backend(RESPONSE_CACHE_BACKEND))
+
+# Query embeddings and reranked documents shared across agents
+retrieval_cache = RetrievalCache(maxsize=int(os.getenv("RETRIEVAL_CACHE_SIZE", "2000")))
+
+# QA agents per (student_id, skill_prompt), bounded and expiring
+agent_cache = AgentCache(
+    maxsize=int(os.getenv("AGENT_CACHE_SIZE", "100")),
+    ttl=float(os.getenv("AGENT_CACHE_TTL_SECONDS", "3600"))
+)
 
 app, metrics_exporter, tracer = MetricsExporter.initialize_flask_app(
     service_key="student-bots-service",
@@ -47,6 +62,19 @@ app, metrics_exporter, tracer = MetricsExporter.initialize_flask_app(
     push_interval=10
 )
 
+ingest_manifest = IngestManifest()
+
+register_counters("agent_cache", agent_cache.stats,
+                  ["hits", "misses", "evictions", "expirations", "invalidations"], "QA agent cache")
+register_gauges("agent_cache", agent_cache.stats, ["size"], "QA agent cache")
+register_counters("response_cache", response_cache.stats,
+                  ["hits", "misses", "stores", "errors"], "Response cache")
+register_gauges("response_cache", response_cache.stats, ["size", "hit_rate"], "Response cache")
+register_counters("retrieval_cache", lambda: retrieval_cache.stats()["documents"],
+                  ["hits", "misses", "evictions", "invalidations"], "Retrieval cache")
+register_counters("query_embedding_cache", lambda: retrieval_cache.stats()["query_embeddings"],
+                  ["hits", "misses"], "Query embedding cache")
+
 def get_langfuse_callback() -> CallbackHandler:
     """Get a configured Langfuse callback handler."""
     return CallbackHandler(
@@ -61,55 +89,96 @@ if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
-def fast_embedding(model_name):
-    embeddings = FastEmbedEmbeddings(model_name=model_name)
-    return embeddings
+# Processed uploads are moved here (or deleted when INGEST_ARCHIVE_UPLOADS=false)
+ARCHIVE_FOLDER = os.path.join(UPLOAD_FOLDER, 'archive')
+ARCHIVE_UPLOADS = os.getenv("INGEST_ARCHIVE_UPLOADS", "true").lower() in ("1", "true", "yes")
 
-model_name_HuggingFace_768 = "sentence-transformers/all-mpnet-base-v2"
+def fast_embedding(model_name):
+    return registry.get_embeddings(model_name, provider="fastembed")
 
 def get_embedding_HuggingFace(model_name):
-    model_name = model_name
-    model_kwargs = {'device': 'cpu'}
-    encode_kwargs = {'normalize_embeddings': False}
-    embeddings = HuggingFaceEmbeddings(
-        model_name=model_name,
-        model_kwargs=model_kwargs,
-        encode_kwargs=encode_kwargs
-    )
-    return embeddings
-
-def store_to_qdrant(docs, embeddings, metadata):
-    client = QdrantClient(url=qdrant_url, api_key=qdrant_api_key)
-    collection_name = f"{collection_prefix}_{metadata['id']}_{metadata['lecture_id']}_{metadata['student_id']}"
-
-    # Check if collection exists, if not, create it
-    collections = client.get_collections().collections
-    if not any(collection.name == collection_name for collection in collections):
-        client.create_collection(
-            collection_name=collection_name,
-            vectors_config=rest.VectorParams(size=embedding_dimension, distance=rest.Distance.COSINE),
-        )
+    # Models are loaded once per process and shared across threads
+    return registry.get_embeddings(model_name, provider="huggingface")
 
-    qdrant = Qdrant(
-        client=client,
-        collection_name=collection_name,
-        embeddings=embeddings,
-    )
+def store_to_qdrant(docs, vectors, metadata, file_key, content_hash):
+    client = get_client(qdrant_url, qdrant_api_key, timeout=ingest_timeout_seconds)
+    collection_name = qa_collection_name
+    ensure_collection(client, collection_name, embedding_dimension)
 
-    # Add metadata to each document
+    # Add metadata to each document; student_id/lecture_id/file_id are payload-indexed
     for doc in docs:
-        doc.metadata.update({
-            'file_id': metadata['id'],
-            'lecture_id': metadata['lecture_id'],
-            'student_id': metadata['student_id'],
-            'filename': metadata['filename']
-        })
-    
+        doc.metadata.update(routing_metadata(metadata, content_hash))
+
+    # Deterministic IDs make re-uploads of the same file overwrite instead of duplicate,
+    # and points of a previous version of the file are removed afterwards. IDs are scoped
+    # by the file key, so the same PDF uploaded by two students is stored for each.
+    # The payload layout matches langchain_qdrant so the retrievers read these points unchanged
+    points = [
+        rest.PointStruct(
+            id=point_id,
+            vector=vector,
+            payload={'page_content': doc.page_content, 'metadata': doc.metadata}
+        )
+        for point_id, doc, vector in zip(point_ids(content_hash, len(docs), scope=file_key), docs, vectors)
+    ]
+    for start in range(0, len(points), 256):
+        client.upsert(collection_name=collection_name, points=points[start:start + 256])
+    stale_ids = stale_point_ids(ingest_manifest.get(collection_name, file_key), content_hash, len(docs), scope=file_key)
+    if stale_ids:
+        client.delete(collection_name=collection_name, points_selector=rest.PointIdsList(points=stale_ids))
+    ingest_manifest.record(collection_name, file_key, content_hash, len(docs), scope=file_key)
+    retrieval_cache.invalidate(collection_name)
+    # Agents built before the student's first upload only search the shared material
+    if metadata.get('student_id'):
+        agent_cache.invalidate(student_id=metadata['student_id'])
+    print(f"Upserted {len(docs)} documents to collection {collection_name} ({len(stale_ids)} stale removed)")
+
+def archive_upload(file_path, filename):
+    """Move a processed upload to the archive folder, or delete it if archiving is disabled."""
+    if not os.path.exists(file_path):
+        return
+    if ARCHIVE_UPLOADS:
+        if not os.path.exists(ARCHIVE_FOLDER):
+            os.makedirs(ARCHIVE_FOLDER)
+        os.replace(file_path, os.path.join(ARCHIVE_FOLDER, f"{time.strftime('%Y%m%d_%H%M%S')}_{filename}"))
+    else:
+        os.remove(file_path)
+
+def run_ingest_job(job, report):
+    """Ingest one upload and archive it, whatever the outcome (runs on an ingestion worker)."""
+    try:
+        return ingest_upload(job['file_path'], job['filename'], job['metadata'], report)
+    finally:
+        archive_upload(job['file_path'], job['filename'])
+
+def ingest_upload(file_path, filename, metadata, report):
+    """Parse, split, embed and store one uploaded PDF."""
+    content_hash = file_hash(file_path)
+    file_key = upload_file_key(metadata, filename)
+    if ingest_manifest.is_unchanged(qa_collection_name, file_key, content_hash, scope=file_key):
+        return {"message": f"File {filename} unchanged since last ingestion, skipped", "metadata": metadata}
 
-    # Add documents if the collection is empty
-    if client.get_collection(collection_name).points_count == 0 or client.get_collection(collection_name).points_count is None:
-        qdrant.add_documents(docs)
-    print(f"Added {len(docs)} documents to collection {collection_name}")
+    # Page ranges are parsed in parallel, locally or with LLMSherpa depending on the text layer
+    docs = load_pdf(file_path)
+    report("parsed")
+
+    # Sized in tokens of the embedding model, along page/section boundaries
+    docs = chunk_documents(docs, model_name_HuggingFace_768)
+    report("chunked")
+
+    embeddings = get_embedding_HuggingFace(model_name_HuggingFace_768)
+    vectors = embeddings.embed_documents([doc.page_content for doc in docs])
+    report("embedded")
+
+    store_to_qdrant(docs, vectors, metadata, file_key, content_hash)
+    report("stored")
+    return {
+        "message": f"File {filename} uploaded and processed successfully",
+        "metadata": metadata,
+        "chunks": len(docs)
+    }
+
+ingest_jobs = IngestJobQueue(run_ingest_job, "student-bots-server")
 
 # Flask routes
 @app.route("/ingest-file", methods=['POST'])
@@ -123,7 +192,8 @@ def ingest_file():
     
     if file and file.filename.lower().endswith('.pdf'):
         filename = secure_filename(file.filename)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        # Unique name, so an upload with the same filename queued before this job runs can't replace it
+        file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{uuid.uuid4().hex}_{filename}")
         file.save(file_path)
         
         # Get metadata from form data
@@ -134,46 +204,53 @@ def ingest_file():
             'student_id': request.form.get('student_id', '')
         }
         
-        # Convert PDF to text using LLMSherpa
-        try:
-            loader = LLMSherpaFileLoader(
-                file_path=file_path,
-                new_indent_parser=True,
-                apply_ocr=True,
-                strategy="sections",
-                llmsherpa_api_url=llmsherpa_api_url,
-            )
-            docs = loader.load()
-            text_splitter = RecursiveCharacterTextSplitter(chunk_size=2048, chunk_overlap=128)
-            docs = text_splitter.split_documents(docs)
-            store_to_qdrant(docs, get_embedding_HuggingFace(model_name_HuggingFace_768), metadata)
-            # Here you would typically process the extracted text and metadata
-            # For now, we'll just return a success message with the metadata and a preview of the text
-            return jsonify({ 
-                "message": f"File {filename} uploaded and processed successfully",
-                "metadata": metadata
-            }), 200
-        except Exception as e:
-            return jsonify({"error": f"Error processing PDF: {str(e)}"}), 500
+        # Parsing and embedding run on the ingestion workers; poll /ingest-jobs/<job_id>
+        job_id = ingest_jobs.submit(file_path, filename, metadata)
+        return jsonify({
+            "message": f"File {filename} uploaded and queued for processing",
+            "job_id": job_id,
+            "status_url": f"/ingest-jobs/{job_id}",
+            "metadata": metadata
+        }), 202
     else:
         return jsonify({"error": "Invalid file format. Please upload a PDF file."}), 400
 
-RAG = RAGPretrainedModel.from_pretrained("colbert-ir/colbertv2.0")
+@app.route("/ingest-jobs/<job_id>")
+def ingest_job_status(job_id):
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job {job_id}"}), 404
+    return jsonify(job)
 
-def create_compression_retriever(collection_name, embeddings):
-    client = QdrantClient(url=qdrant_url, api_key=qdrant_api_key)
+def create_compression_retriever(collection_name, embeddings, k=5, student_id=None):
+    """
+    Reranking retriever over the collection
+    Args:
+        student_id (str, optional): Retrieve this student's uploads besides the shared material
+            (an indexed payload filter); only the shared material if None
+    """
+    client = get_client(qdrant_url, qdrant_api_key, timeout=search_timeout_seconds)
+    ensure_collection(client, collection_name, embedding_dimension)
     qdrant = QdrantVectorStore(
         client=client,
         collection_name=collection_name,
-        embedding=embeddings,
+        # Query vectors are shared by every agent that embeds with the same model
+        embedding=retrieval_cache.query_embeddings(embeddings),
     )
-    compressor = RAG.as_langchain_document_compressor()
+    compressor = registry.get_reranker().as_langchain_document_compressor()
     
-    retriever = qdrant.as_retriever(search_kwargs={"k": 5})
+    # Students without uploads of their own see exactly the shared material, so they share
+    # one retrieval cache scope; only students with uploads get a scope of their own
+    if student_id and ingest_manifest.has_files(collection_name, student_key_prefix(student_id)):
+        qdrant_filter, scope = student_filter(student_id), f"student:{student_id}"
+    else:
+        qdrant_filter, scope = student_filter(), ""
+    retriever = qdrant.as_retriever(search_kwargs={"k": k, "filter": qdrant_filter})
     compression_retriever = ContextualCompressionRetriever(
         base_compressor=compressor, base_retriever=retriever
     )
-    return compression_retriever
+    # Reranked documents per (collection, version, question, k, filter scope)
+    return retrieval_cache.wrap(compression_retriever, collection_name, k, ingest_manifest.collection_version, scope)
 
 # Get OpenAI API key from environment
 api_key_gpt = os.getenv('OPENAI_API_KEY')
@@ -202,15 +279,12 @@ Question: {question}
 {skill_prompt}
 """
 
-@lru_cache(maxsize=100)
 def get_qa_agent(student_id, skill_prompt):
     if skill_prompt is None:
         skill_prompt = ""
-    cache_key = f"{student_id}_{hashlib.md5(skill_prompt.encode()).hexdigest()}"
-    
-    if cache_key in qa_cache:
-        return qa_cache[cache_key]
-    
+    return agent_cache.get_or_create(student_id, skill_prompt, lambda: build_qa_agent(student_id, skill_prompt))
+
+def build_qa_agent(student_id, skill_prompt):
     llmGPT = ChatOpenAI(
         model="gpt-4o",
         temperature=0,
@@ -234,14 +308,28 @@ def get_qa_agent(student_id, skill_prompt):
         input_variables=["context", "question"]
     )
 
-    # studentCollectionName = '12345_CS101_123459'
-    collection_name = "student-bots-pdf-20250112"
-    compression_retriever = create_compression_retriever(collection_name, get_embedding_HuggingFace(model_name_HuggingFace_768))
+    compression_retriever = create_compression_retriever(
+        qa_collection_name, get_embedding_HuggingFace(model_name_HuggingFace_768), student_id=student_id
+    )
     qa = create_AI_agent(llmGPT, compression_retriever, prompt, verbose=True)
-    
-    qa_cache[cache_key] = qa
     return qa
 
+@app.route("/invalidate-agents", methods=['POST'])
+def invalidate_agents():
+    data = request.get_json(silent=True) or {}
+    skill_prompt_hash = data.get('skill_prompt_hash')
+    if skill_prompt_hash is None and data.get('skill_prompt') is not None:
+        skill_prompt_hash = prompt_hash(data['skill_prompt'])
+    # Dropping every agent must be asked for explicitly, not by an empty or malformed body
+    if data.get('student_id') is None and skill_prompt_hash is None and data.get('all') is not True:
+        return jsonify({"error": "Provide student_id, skill_prompt or skill_prompt_hash, or {\"all\": true}"}), 400
+    removed = agent_cache.invalidate(
+        student_id=data.get('student_id'),
+        skill_prompt_hash=skill_prompt_hash
+    )
+    logger.info(f"Invalidated {removed} QA agents")
+    return jsonify({"invalidated": removed, "agent_cache": agent_cache.stats()})
+
 @app.route("/process-message", methods=['POST'])
 def process_message():
     try:
@@ -258,6 +346,23 @@ def process_message():
             return jsonify({"error": "Missing required fields"}), 400
         
         try:
+            # Identical (student, prompt, question) against an unchanged collection gives the
+            # same temperature-0 answer; the version changes whenever the collection is re-ingested
+            cache_key = response_key(
+                student_id, prompt_hash(skill_prompt), question,
+                qa_collection_name, ingest_manifest.collection_version(qa_collection_name)
+            )
+            use_cache = data.get('use_cache', True)
+            cached = response_cache.get(cache_key) if use_cache else None
+            if cached is not None:
+                logger.info(f"Serving cached response for student_id: {student_id}")
+                return jsonify({
+                    'student_id': student_id,
+                    'question': question,
+                    'output': cached['output'],
+                    'cached': True
+                })
+
             # Get or create QA agent from cache
             logger.info(f"Getting QA agent for student_id: {student_id}")
             qa = get_qa_agent(student_id, skill_prompt)
@@ -265,6 +370,8 @@ def process_message():
             # Get response
             logger.info(f"Invoking QA with question: {question}")
             response = qa.invoke(question, {"callbacks": [get_langfuse_callback()]})
+            if use_cache:
+                response_cache.set(cache_key, {'output': response['result']})
             
             logger.info(f"Successfully generated response for student_id: {student_id}")
             return jsonify({
@@ -291,9 +398,17 @@ def process_message():
 
 @app.route("/status")
 def status():
-    return {"status": "Service is running!"}
+    return {"status": "Service is running!", **registry.status(), "agent_cache": agent_cache.stats(),
+            "response_cache": response_cache.stats(), "retrieval_cache": retrieval_cache.stats(),
+            "qdrant_latency": latency_summary()}
 
 if __name__ == "__main__":
+    # Load the embedding model and ColBERT reranker before accepting requests
+    registry.warm_up([model_name_HuggingFace_768])
+
+    # Resume ingestion jobs queued or interrupted before the restart
+    ingest_jobs.start()
+
     # Run the metrics collection in a separate thread
     Thread(daemon=True, target=metrics_exporter.start_collect_and_push_metrics).start()
 